@@ -37,24 +37,30 @@ from __future__ import division
 from __future__ import unicode_literals
 # XXX add floating point
 
+# Only modules needed by every run, or too cheap to matter, are imported
+# here. Those which measurably slow down --version, --list_tools, etc.
+# (1ms or more each, eg, hashlib, subprocess, shutil, uuid, ctypes) are
+# imported by the functions using them, as are OS-specific ones.
 import sys
 import os
-import subprocess
 import argparse
 import platform
-import hashlib
-import base64
-import textwrap
-import uuid
-import ctypes
-import site
 import time
 import errno
 import stat
-import pwd
-import grp
+import threading
+import json
+import struct
+import binascii
+import mmap
+import textwrap
 import getpass
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # Python 2
+
 EVENTLOG_AVAILABLE = True
 try:
     import windows_eventlog  # XXX proper module name
@@ -67,6 +73,12 @@ try:
 except ImportError:
     SYSLOG_AVAILABLE = False
 
+FCNTL_AVAILABLE = True
+try:
+    import fcntl
+except ImportError:
+    FCNTL_AVAILABLE = False
+
 ############################################################
 
 
@@ -176,6 +188,13 @@ app_state = {
     'version_mode': False,  # --version
     'list_tools_mode': False,  # --list_tools
     'list_profiles_mode': False,  # --list_profiles
+    'plan_mode': False,  # --plan
+    'diff_acpi': None,  # --diff_acpi <PRD_A> <PRD_B>
+    'diff_pci': None,  # --diff_pci <PRD_A> <PRD_B>
+    'benchmark_mode': False,  # --benchmark
+    'benchmark_spec': '',  # --benchmark [spec], see benchmark.py
+    'benchmark': None,  # state of the --benchmark run, see run_benchmark()
+    'self_profiler': None,  # (mode, profiler) while --self_profile is running
     'user_tools': None,  # --tool=<tool_name> (can specify >1)
     'user_profiles': None,  # --profile=<profile_name> (can specify >1)
     'new_profiles': None,  # --new_profile=<json_string>
@@ -183,10 +202,37 @@ app_state = {
     'selected_profile': None,
     'max_profiles': '1000',
     'meta_profile': [],
+    'meta_profile_origins': {},  # toolns: list of tool/profile(s) selecting it
     'zip_results': False,  # --zip_results
     'output_dir': None,  # --output_dir dir string  (aka 'PD')
     'output_dir_specified': False,  # user specifed explicit PD using --output_dir
     'per_run_directory': None,
+    'staging_dir': None,  # --staging_dir (eg, /dev/shm)
+    'published_prd': None,  # final PRD under PD, if staging was used
+    'tool_seconds': {},  # toolns: wall-clock seconds of tool run
+    'tool_rusage': {},  # toolns: resource usage of tool's child process
+    'tool_parsed': {},  # toolns: verdicts/findings parsed from output, see parsers.py
+    'results': [],  # list of results records, one per tool run
+    'timings_mode': False,  # --timings
+    'output_spill_bytes': 16 * 1024 * 1024,  # --output_spill, per-stream output kept in memory
+    'output_limit_bytes': 1024 * 1024 * 1024,  # --output_limit, per-stream output saved
+    'start_time': None,  # monotonic_seconds() at start of main()
+    'timings': {},  # phase: total seconds spent in phase, see timings.py
+    'hashed_bytes': 0,  # bytes read by return_hash_str_of_file(), see timings.py
+    'sysfs_root': '/sys',  # --sysfs_root, read by sysfs collectors, see sysfs.py
+    'fingerprint': None,  # hardware/firmware fingerprint of this run, see fingerprint.py
+    'incremental': False,  # --incremental, reuse cached output of cacheable tools
+    'cache_max_age': 14,  # --cache_max_age, days an unused cache entry is kept
+    'cache_max_bytes': 512 * 1024 * 1024,  # --cache_max_size, of all cache entries
+    'cache_keys': {},  # toolns: cache key of this run, see cache.py
+    'module_digests': {},  # Python module: SHA256 of its files, see cache.py
+    'artifacts': {},  # artifact name: path of file produced by a tool this run
+    'user_artifacts': [],  # --artifact NAME=PATH (can specify >1)
+    'jobs': 4,  # --jobs, max offline tools to run concurrently
+    'corroborate': False,  # --corroborate, run all producers of an artifact
+    'tool_availability': {},  # toolns: None if tool can run, else reason why not
+    'probe_cache': None,  # cached binary/module probe results, see probe.py
+    'probe_cache_dirty': False,  # probe_cache needs saving to PD
     'colorize': False,  # --colorize
     'omit_pii': False,  # --omit_pii
     'output_mode': 'merged',  # --output_mode
@@ -194,10 +240,16 @@ app_state = {
     'manifest_mode': True,  # --manifest, --nomanifest
     'tools_and_profiles': None,  # sum of all tools + profiles + new_profiles
     'timestamp': None,  # timestamp of run, used to create target dir
+    'run_id': None,  # unique id of run: timestamp, host, UUID; PRD name
+    'run_lock': None,  # open lock file in PD, held for duration of run
     'switchar': '-',  # OS switch character
     'max_buf': 50000,  # XXX add way to override. Proper value?
     'shell_script_redir_string': None,
     'sudo_based_usage': False,
+    'split_privs': True,  # --nosplit_privs
+    'post_processor_pid': None,  # pid of unprivileged post-processing child
+    'post_processor_fd': None,  # write end of pipe to post-processing child
+    'post_processor_reply_fd': None,  # read end of pipe from post-processing child
 }
 
 ############################################################
@@ -214,10 +266,28 @@ app_state = {
 # User can view list of available tools using '--list-tools'.
 # Dict schema: { name:'x', tool:'x', desc:'x' }
 # Name -- is more of a namespace of this variance of tool run.
-# Tool -- is proper name of tool.
+# Tool -- is proper name of tool. 'sysfs' is built in: fwaudit reads
+#         the data itself, nothing is spawned, see sysfs.py.
 # Desc -- is description of tool.
 # mode -- mode of tool, valid modes: ('all', 'live', 'offline')
 #         'all' means could be live or offline, used by get_version code.
+# access -- how tool uses the hardware, valid values: ('shared', 'exclusive')
+#           'shared' tools only read OS-provided data (sysfs, etc.) and can
+#           run concurrently with other fwaudit runs. 'exclusive' tools
+#           (eg, CHIPSEC, with its kernel driver) poke the hardware, runs
+#           using them are serialized against all other runs in the PD.
+# root -- True if tool needs root privileges.
+# produces -- list of artifacts (files) the tool creates in its PTD.
+# consumes -- list of artifacts the tool needs as input. Tools producing
+#             them are run first, in the same run, see schedule_waves(),
+#             unless given with --artifact (eg, from an archived PRD).
+#             When several tools produce the same artifact, only the
+#             cheapest is run, see select_artifact_producers().
+# cacheable -- optional, True if, with --incremental, a previous run's
+#              output can be reused, when the tool, its binary and the
+#              hardware/firmware fingerprint are unchanged, see cache.py.
+# cache_inputs -- optional, list of other inputs which must also be
+#                 unchanged to reuse output (eg, 'usb', the USB devices).
 # exrc -- expected_rc of tool.
 # Args -- is list of tool options/arguments, and their defaults,
 #         to be updated if user specifies new values on command line.
@@ -256,6 +326,49 @@ TOOLS = [
         'tool': 'acpidump',
         'desc': 'acpidump -z -b',
         'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': ['acpi_tables'],
+        'consumes': [],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {}
+    }, {
+        'name': 'acpidump_text',
+        'tool': 'acpidump',
+        'desc': 'acpidump -o acpidump.out (text dump, for acpixtract)',
+        'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': ['acpidump.out'],
+        'consumes': [],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {}
+    }, {
+        'name': 'acpixtract',
+        'tool': 'acpixtract',
+        'desc': 'acpixtract -a acpidump.out',
+        'mode': 'offline',
+        'access': 'shared',
+        'root': False,
+        'produces': [],
+        'consumes': ['acpidump.out'],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {}
+    }, {
+        'name': 'acpixtract_batch',
+        'tool': 'acpixtract',
+        'desc': 'acpixtract -a, for each acpidump.out archived in a PD',
+        'mode': 'offline',
+        'access': 'shared',
+        'root': False,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -265,6 +378,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.bios_kbrd_buffer',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -274,6 +391,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.bios_smi',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -283,6 +404,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.bios_ts',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -292,6 +417,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.bios_wp',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -301,6 +430,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.ia32cfg',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -310,6 +443,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m memconfig',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -319,6 +456,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m remap',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -328,6 +469,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.rtclock',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -337,6 +482,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.secureboot.variables [-a modify]',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -346,6 +495,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.smm',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -355,6 +508,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m smm_dma',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -364,6 +521,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.smrr',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -373,6 +534,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.spi_desc',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -382,6 +547,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.spi_fdopss',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -391,6 +560,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.spi_lock',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -400,6 +573,10 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.uefi.access_uefispec',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -409,25 +586,37 @@ TOOLS = [
         'tool': 'chipsec_main',
         'desc': 'chipsec_main -m common.uefi.s3bootscript [-a <script_address>]',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
         'args': {}
-#    }, {
-#        'name': 'chipsec_uefi_blacklist',
-#        'tool': 'chipsec_main',
-#        'desc': 'chipsec_main -i -n -m tools.uefi.blacklist -a uefi.rom,blacklist.json',
-#        'mode': 'offline',
-#        'exrc': 0,
-#        'expected': [],
-#        'actual': [],
-#        'args': {
-#            'rom_bin_file': 'rom.bin'}
+    }, {
+        'name': 'chipsec_uefi_blacklist',
+        'tool': 'chipsec_main',
+        'desc': 'chipsec_main -i -n -m tools.uefi.blacklist -a rom.bin,blacklist.json',
+        'mode': 'offline',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': ['rom.bin'],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {
+            'rom_bin_file': 'rom.bin'}
     }, {
         'name': 'chipsec_acpi_list',
         'tool': 'chipsec_util',
         'desc': 'chipsec_util acpi list',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -437,6 +626,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util acpi table acpi_table.bin',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': ['acpi_tables.bin'],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -446,6 +639,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util cmos dump',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -455,6 +652,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util cpu info',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -464,24 +665,37 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util cpu pt',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
         'args': {}
-#    }, {
-#        'name': 'chipsec_decode',
-#        'tool': 'chipsec_util',
-#        'desc': 'chipsec_util decode spi.bin',
-#        'mode': 'offline',
-#        'exrc': 0,
-#        'expected': [],
-#        'actual': [],
-#        'args': {'chipsec_decode_fw_type': None}
+    }, {
+        'name': 'chipsec_decode',
+        'tool': 'chipsec_util',
+        'desc': 'chipsec_util decode rom.bin',
+        'mode': 'offline',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': ['rom.bin'],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {'chipsec_decode_fw_type': None}
     }, {
         'name': 'chipsec_decode_types',
         'tool': 'chipsec_util',
         'desc': 'chipsec_util decode types',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
+        'cacheable': True,
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -491,6 +705,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util ec dump',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -500,6 +718,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util io list',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -509,6 +731,10 @@ TOOLS = [
 #        'tool': 'chipsec_util',
 #        'desc': 'chipsec_util iommu config',
 #        'mode': 'live',
+#        'access': 'exclusive',
+#        'root': True,
+#        'produces': [],
+#        'consumes': [],
 #        'exrc': 0,
 #        'expected': [],
 #        'actual': [],
@@ -518,6 +744,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util iommu list',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -527,6 +757,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util iommu pt',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -536,6 +770,10 @@ TOOLS = [
 #        'tool': 'chipsec_util',
 #        'desc': 'chipsec_util iommu status',
 #        'mode': 'live',
+#        'access': 'exclusive',
+#        'root': True,
+#        'produces': [],
+#        'consumes': [],
 #        'exrc': 0,
 #        'expected': [],
 #        'actual': [],
@@ -545,6 +783,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util mmio list',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -554,6 +796,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util pci dump',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -563,6 +809,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util pci enumerate',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -572,6 +822,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util pci xrom',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -581,6 +835,11 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util platform',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
+        'cacheable': True,
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -590,6 +849,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util spd detect',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -599,6 +862,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util spd dump',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -608,6 +875,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util spidesc spi.bin',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -617,6 +888,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util spi dump rom.bin',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': ['rom.bin'],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -626,6 +901,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util spi info',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -635,24 +914,36 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util ucode id',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
         'args': {}
-#    }, {
-#        'name': 'chipsec_uefi_decode',
-#        'tool': 'chipsec_util',
-#        'desc': 'chipsec_util uefi decode uefi.rom',
-#        'mode': 'offline',
-#        'exrc': 0,
-#        'expected': [],
-#        'actual': [],
-#        'args': {'uefi_rom_bin_file': 'uefi.rom'}
+    }, {
+        'name': 'chipsec_uefi_decode',
+        'tool': 'chipsec_util',
+        'desc': 'chipsec_util uefi decode rom.bin',
+        'mode': 'offline',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': ['rom.bin'],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {'rom_bin_file': 'rom.bin'}
     }, {
         'name': 'chipsec_uefi_keys',
         'tool': 'chipsec_util',
         'desc': 'chipsec_util uefi keys uefi_keyvar.bin',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -662,6 +953,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util uefi nvram-auth rom.bin',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -671,6 +966,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util uefi nvram rom.bin',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -680,6 +979,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util uefi s3bootscript',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -689,6 +992,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util uefi tables',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -698,6 +1005,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util uefi types',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -707,6 +1018,10 @@ TOOLS = [
         'tool': 'chipsec_util',
         'desc': 'chipsec_util uefi var-list',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -716,24 +1031,37 @@ TOOLS = [
         'tool': 'dmidecode',
         'desc': 'Use DMIdecode to save data to dmidecode.bin',
         'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': ['dmidecode.bin'],
+        'consumes': [],
+        'cacheable': True,
         'exrc': 0,
         'expected': [],
         'actual': [],
         'args': {}
-#    }, {
-#        'name': 'dmidecode_decode',
-#        'tool': 'dmidecode',
-#        'desc': 'Use DMIdecode to view a previously-saved dmidecode.bin',
-#        'mode': 'offline',
-#        'exrc': 0,
-#        'expected': [],
-#        'actual': [],
-#        'args': {'dmidecode_bin_file', 'dmidecode.bin'}
+    }, {
+        'name': 'dmidecode_decode',
+        'tool': 'dmidecode',
+        'desc': 'Use DMIdecode to view a previously-saved dmidecode.bin',
+        'mode': 'offline',
+        'access': 'shared',
+        'root': False,
+        'produces': [],
+        'consumes': ['dmidecode.bin'],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {'dmidecode_bin_file': 'dmidecode.bin'}
 #    }, {
 #        'name': 'flashrom_rom_dump',
 #        'tool': 'flashrom',
 #        'desc': 'FlashROM to dump platform ROM to rom.bin',
 #        'mode': 'live',
+#        'access': 'exclusive',
+#        'root': True,
+#        'produces': ['rom.bin'],
+#        'consumes': [],
 #        'exrc': 0,
 #        'expected': [],
 #        'actual': [],
@@ -743,6 +1071,11 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS version',
         'mode': 'live',
+        'access': 'shared',
+        'root': False,
+        'produces': [],
+        'consumes': [],
+        'cacheable': True,
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -752,6 +1085,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS cpyfreq',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -761,6 +1098,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS maxfreq',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -770,6 +1111,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS msr',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -779,6 +1124,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS mtrr',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -788,6 +1137,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS nx',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -797,6 +1150,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS virt',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -806,6 +1163,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS aspm',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -815,6 +1176,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS dmicheck',
         'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -824,6 +1189,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS apicedge',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -833,6 +1202,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS klog',
         'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -842,6 +1215,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS oops',
         'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -851,6 +1228,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS esrt',
         'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -860,6 +1241,23 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS --acpi_tests',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {}
+    }, {
+        'name': 'fwts_acpi_dump',
+        'tool': 'fwts',
+        'desc': 'FWTS --dump, then acpixtract -a acpidump.log',
+        'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': ['acpi_tables'],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -869,6 +1267,10 @@ TOOLS = [
         'tool': 'fwts',
         'desc': 'FWTS --uefi_tests',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -878,6 +1280,10 @@ TOOLS = [
         'tool': 'INTEL-SA-00075-Discovery-Tool',
         'desc': 'INTEL-SA-00075-Discovery-Tool',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 254,
         'expected': [],
         'actual': [],
@@ -887,6 +1293,10 @@ TOOLS = [
         'tool': 'intel_sa00086.py',
         'desc': 'INTEL-SA-00086-Detection-Tool',
         'mode': 'live',
+        'access': 'exclusive',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 254,
         'expected': [],
         'actual': [],
@@ -897,6 +1307,12 @@ TOOLS = [
         'tool': 'lsusb',
         'desc': 'lsusb -v -t',
         'mode': 'live',
+        'access': 'shared',
+        'root': False,
+        'produces': [],
+        'consumes': [],
+        'cacheable': True,
+        'cache_inputs': ['usb'],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -906,6 +1322,10 @@ TOOLS = [
         'tool': 'lshw',
         'desc': 'lshw -businfo -sanitize -notime',
         'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -915,6 +1335,11 @@ TOOLS = [
         'tool': 'lspci',
         'desc': 'lspci -vvnn',
         'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': [],
+        'cacheable': True,
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -924,6 +1349,36 @@ TOOLS = [
         'tool': 'lspci',
         'desc': 'lspci -xxx',
         'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': [],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {}
+    }, {
+        'name': 'sysfs_usb',
+        'tool': 'sysfs',
+        'desc': 'Read USB devices and descriptors from sysfs, no subprocess',
+        'mode': 'live',
+        'access': 'shared',
+        'root': False,
+        'produces': [],
+        'consumes': [],
+        'exrc': 0,
+        'expected': [],
+        'actual': [],
+        'args': {}
+    }, {
+        'name': 'sysfs_pci',
+        'tool': 'sysfs',
+        'desc': 'Read PCI devices and config space from sysfs, no subprocess',
+        'mode': 'live',
+        'access': 'shared',
+        'root': True,
+        'produces': [],
+        'consumes': [],
         'exrc': 0,
         'expected': [],
         'actual': [],
@@ -933,6 +1388,10 @@ TOOLS = [
  #       'tool': 'pawn',
  #       'desc': 'Google pawn to dump platform ROM to rom.bin',
  #       'mode': 'live',
+ #       'access': 'exclusive',
+ #       'root': True,
+ #       'produces': ['rom.bin'],
+ #       'consumes': [],
  #       'exrc': 0,
  #       'expected': [],
  #       'actual': [],
@@ -940,6 +1399,9 @@ TOOLS = [
     }
 ]
 
+# TOOL_INDEX: dict of {toolns: TOOLS entry}, see get_tool_index().
+TOOL_INDEX = None
+
 ############################################################
 
 # profiles.py
@@ -950,7 +1412,8 @@ TOOLS = [
 # Dict schema: { name:'x', desc:'x' tools:['x','x',x'] }
 # Name is the name of the profile.
 # Desc is description of profile.
-# Tools is a list of tools used by this profile.
+# Tools is a list of tools used by this profile. It may also include the
+#   names of other profiles, whose tools are included in this profile.
 # XXX move into external file, JSON or INI.
 # XXX CHIPSEC and FWTS suported tag lists, use proper subset
 
@@ -979,7 +1442,7 @@ PROFILES = [
         'name': 'live_acpi_dump_chipsec',
         'desc': 'Dump ACPI tables using CHIPSEC.',
         'mode': 'live',
-        'tools': ['chipsec_acpi_dump']
+        'tools': ['chipsec_acpi_table']
     }, {
         'name': 'live_acpi_dump_fwts',
         'desc': 'Dump ACPI tables using FWTS.',
@@ -1023,6 +1486,29 @@ PROFILES = [
                   'chipsec_test_spi_fdopss',
                   'chipsec_test_spi_lock',
                   'chipsec_test_uefi_access_spec']
+    }, {
+        'name': 'inventory',
+        'desc': 'Gather hardware/firmware inventory, read-only tools.',
+        'mode': 'live',
+        'tools': ['lshw',
+                  'lspci_vvnn',
+                  'lsusb',
+                  'dmidecode_dump',
+                  'acpidump',
+                  'fwts_version']
+    }, {
+        'name': 'sysfs_inventory',
+        'desc': 'Gather hardware inventory from sysfs, without spawning tools.',
+        'mode': 'live',
+        'tools': ['sysfs_pci',
+                  'sysfs_usb']
+    }, {
+        'name': 'full_audit',
+        'desc': 'Run inventory, fwts recommended, and chipsec security profiles.',
+        'mode': 'live',
+        'tools': ['inventory',
+                  'fwts_recommended',
+                  'chipsec_all_security_tests']
     }
 ]
 
@@ -1040,8 +1526,11 @@ def main():
     # Check if stdio redirected, remove colors?
     # Check if not a TTY?
 
+    app_state['start_time'] = monotonic_seconds()
     app_state['switchar'] = switch_character()
+    start = monotonic_seconds()
     parse_args()
+    add_phase_time('parse_args', start)
 
     # The modes that display one thing and then exit.
     # Defer to argparse to handle the help/?/h options.
@@ -1057,6 +1546,10 @@ def main():
     if app_state['list_profiles_mode']:
         list_profiles()  # list_profiles
         return 0
+    if app_state['diff_acpi'] is not None:
+        return diff_acpi(app_state['diff_acpi'][0], app_state['diff_acpi'][1])  # --diff_acpi
+    if app_state['diff_pci'] is not None:
+        return diff_pci(app_state['diff_pci'][0], app_state['diff_pci'][1])  # --diff_pci
 
     startup_message()
 
@@ -1072,6 +1565,9 @@ def main():
         # return os.OK  # USAGE NOINPUT NOTFOUND NOPERM
         return 1  # XXX generate exception
 
+    if app_state['benchmark_mode']:
+        return run_benchmark()  # --benchmark, all tools if none selected
+
     if (is_none_or_null(app_state['user_profiles']) and
        is_none_or_null(app_state['user_tools'])):
         error('No tool(s) or profile selected, use --tool or --profile.')
@@ -1082,6 +1578,11 @@ def main():
         # return os.OK  # USAGE NOINPUT NOTFOUND NOPERM
         return 1  # XXX generate exception
 
+    if app_state['plan_mode']:
+        if is_user_root() and (os.getenv('SUDO_UID') is not None):
+            app_state['sudo_based_usage'] = True
+        return show_plan()  # --plan
+
     # XXX If only doing offline analysis, don't need to be root.
     # Defer root check until after determined what tools are selected,
     # if each can be run as non-root, then proceed, else this error path.
@@ -1098,44 +1599,119 @@ def main():
         # debug('Configuring for SUDO usage')
         app_state['sudo_based_usage'] = True
 
+    tool_status = run_audit()
+
+    # Cleanup and terminate.
+    shutdown_message(tool_status)
+    return tool_status
+
+
+def run_audit():
+    '''Build the tool selection, create directories, and run the tools.
+
+    Returns 0 if successful, 1 if not, as main()'s exit status.
+    '''
+    tool_status = 0
     status = None
     pd = None
     prd = None
     # Build the list of tools to run, then run them.
     # debug('Generating list of selected tools..')
+    start = monotonic_seconds()
     (status, tool_count, _) = build_meta_profile()
+    add_phase_time('build_meta_profile', start)
     if status is False:
         error('Unable to build tool selection, exiting')
         tool_status = 1
     if tool_count > 0:
         # Defer creating any dirs until determine there are tools to run.
+        start = monotonic_seconds()
         status, pd, prd = create_directories()
+        add_phase_time('create_directories', start)
         if status is False:
             error('Unable to create directories, exiting')
             return 1
         # At this point, PD and PRD should be ready to use.
+        save_probe_cache(pd)
+
+        # Serialize against other runs in the PD, if touching hardware.
+        start = monotonic_seconds()
+        if not acquire_run_lock(pd, run_needs_exclusive_access()):
+            error('Unable to lock parent directory, exiting')
+            return 1
+        add_phase_time('run_lock', start)
+
+        start_results()
+        get_fingerprint()
 
-        # start_results()  # XXX
+        # With sudo, hand derived-file generation to an unprivileged child.
+        start = monotonic_seconds()
+        if not start_post_processor():
+            error('Unable to start unprivileged post-processor, exiting')
+            return 1
+        add_phase_time('start_post_processor', start)
 
-        start_cpu = time.clock()
+        start_times = os.times()
         start_real = time.time()
         # Run the tools!
         run_meta_profile(pd, prd)
-        end_cpu = time.clock()
+        end_times = os.times()
         end_real = time.time()
-        # XXX save this in per-run stats. Also create per-tool time stats elsewhere.
-        cpu_seconds = end_cpu - start_cpu
+        # Per-tool resource usage is in the results records.
+        cpu_seconds = (end_times[0] - start_times[0]) + (end_times[1] - start_times[1])
+        child_cpu_seconds = (end_times[2] - start_times[2]) + (end_times[3] - start_times[3])
         real_seconds = end_real - start_real
         debug('Total CPU seconds: ' + str(cpu_seconds))
+        debug('Total tool CPU seconds: ' + str(child_cpu_seconds))
         debug('Total Seconds: ' + str(real_seconds))
-
-        # Post-processing, after running the tools
-        if is_sudo_root():
+        start = monotonic_seconds()
+        if not finish_results(prd):
+            tool_status = 1
+        add_phase_time('results', start)
+
+        # Every file in the PRD is written before it is published, only
+        # files in the PD (history, cache) are updated after.
+        finish_timings(prd)
+        if app_state['benchmark'] is not None:
+            finish_benchmark(prd)
+        if not finish_self_profile():
+            tool_status = 1
+
+        # If staged, publish the completed run into the PD.
+        start = monotonic_seconds()
+        if not request_publish_staged_run():
+            tool_status = 1
+        if not stop_post_processor():
+            tool_status = 1
+            error('Error occurred during unprivileged post-processing')
+        if not finish_publish_staged_run():
+            tool_status = 1
+        add_phase_time('finish_post_processing', start)
+        prd = app_state['per_run_directory']
+
+        # Post-processing, after running the tools.
+        # Only needed if derived files were generated as root.
+        if app_state['sudo_based_usage'] and not app_state['split_privs']:
             # XXX need to fix PD dir perms, on first creation?
             debug('Changing SUDO root ownership/permissions to generated files..')
+            start = monotonic_seconds()
             if not change_generated_file_perms(prd):
                 tool_status = 1
                 error('Error occurred during chmod/chgrop post-processing')
+            add_phase_time('chown_generated_files', start)
+
+        start = monotonic_seconds()
+        if not record_run_history(pd, prd):
+            warning('Unable to update tool history')
+        add_phase_time('history', start)
+        if app_state['incremental']:
+            start = monotonic_seconds()
+            evict_cache(pd)
+            save_probe_cache(pd)  # binary digests, see get_binary_digest()
+            add_phase_time('cache', start)
+        if app_state['timings_mode']:
+            show_timings(get_timings())
+        release_run_lock()
 
         # create_shellscript()  # XXX
         # XXX create index file, with header, records, and footer of metadata.
@@ -1148,8 +1724,6 @@ def main():
         #    debug('Creating ZIP file of results..')  # XXX
         #    zip_results()  # XXX
 
-    # Cleanup and terminate.
-    shutdown_message(tool_status)
     return tool_status
 
 ############################################################
@@ -1194,6 +1768,9 @@ def parse_args():
     p.add_argument('--list_profiles',
                    action='store_true', default=False,
                    help='Show available tool profiles, then exit.')
+    p.add_argument('--plan',
+                   action='store_true', default=False,
+                   help='Show schedule and estimated cost of selected tools, then exit. Does not need root.')
     p.add_argument(c+'t', '--tool',
                    action='append', default=None,
                    help='Specify <toolname> to run.')
@@ -1212,6 +1789,9 @@ def parse_args():
     p.add_argument('--output_dir',
                    action='store', default=None,
                    help='Specify target directory to store generated files. Not compatible with sudo case, use as root or with su.')
+    p.add_argument('--staging_dir',
+                   action='store', default=None,
+                   help='Run tools in a per-run directory under this (eg, /dev/shm), then publish into the parent directory.')
     p.add_argument('--output_mode',
                    choices=('merged', 'out_first', 'err_first'),
                    action='store', default=app_state['output_mode'],
@@ -1234,8 +1814,55 @@ def parse_args():
     p.add_argument('--nohash',
                    action='store_true', default=False,
                    help='Do not generate sidecar hash files.')
+    p.add_argument('--jobs',
+                   action='store', type=int, default=app_state['jobs'],
+                   help='Max number of offline tools to run concurrently.')
+    p.add_argument('--corroborate',
+                   action='store_true', default=False,
+                   help='Run every selected tool producing the same data, not just the cheapest.')
+    p.add_argument('--output_spill',
+                   action='store', default=None, metavar='SIZE',
+                   help='Per-tool output kept in memory (eg, 16M), rest is streamed to its log file.')
+    p.add_argument('--output_limit',
+                   action='store', default=None, metavar='SIZE',
+                   help='Per-tool output saved (eg, 1G), rest is discarded.')
+    p.add_argument('--timings',
+                   action='store_true', default=False,
+                   help='Show time spent in each phase of fwaudit itself.')
+    p.add_argument('--self_profile',
+                   choices=get_self_profile_modes(), action='store', default=None,
+                   help='Profile fwaudit itself, save fwaudit.pstats or fwaudit.memory.txt in the per-run directory. memory is Python 3 only.')
+    p.add_argument('--benchmark',
+                   nargs='?', const='', default=None, metavar='SPEC',
+                   help='Run tools against synthetic stand-ins, report fwaudit costs. No root needed.')
+    p.add_argument('--artifact',
+                   action='append', default=None, metavar='NAME=PATH',
+                   help='Use an existing artifact (file, or a PRD containing it) instead of running its producer.')
+    p.add_argument('--acpixtract_batch',
+                   action='store', default=None, metavar='PD',
+                   help='Run acpixtract on every acpidump.out archived in PD (default: the output directory).')
+    p.add_argument('--incremental',
+                   action='store_true', default=False,
+                   help='Reuse output of cacheable tools from a previous run, if nothing changed.')
+    p.add_argument('--cache_max_age',
+                   action='store', type=float, default=None, metavar='DAYS',
+                   help='With --incremental, remove cache entries unused for this long (default 14).')
+    p.add_argument('--cache_max_size',
+                   action='store', default=None, metavar='SIZE',
+                   help='With --incremental, remove least recently used cache entries above this size (default 512M).')
+    p.add_argument('--sysfs_root',
+                   action='store', default=None, metavar='DIR',
+                   help='Directory sysfs collectors read instead of /sys (eg, a copy from another host).')
+    p.add_argument('--diff_acpi',
+                   nargs=2, action='store', default=None, metavar=('PRD_A', 'PRD_B'),
+                   help='Show which ACPI tables differ between two runs, then exit.')
+    p.add_argument('--diff_pci',
+                   nargs=2, action='store', default=None, metavar=('PRD_A', 'PRD_B'),
+                   help='Show which PCI config space registers differ between two runs, then exit.')
+    p.add_argument('--nosplit_privs',
+                   action='store_true', default=False,
+                   help='With sudo, do post-processing as root, then chown results.')
     # tool-specific options:
-#    # XXX no acpidump or acpixtract option!
 #    p.add_argument('--chipsec_uefi_blacklist', action='store',
 #                   default=get_tool_arg('chipsec_uefi_blacklist', 'rom_bin_file'),
 #                   help='Rom.bin for UEFI blacklist.')
@@ -1270,6 +1897,41 @@ def parse_args():
         app_state['manifest_mode'] = True
     if args.nomanifest:
         app_state['manifest_mode'] = False
+    if args.nosplit_privs:
+        app_state['split_privs'] = False
+    if args.timings:
+        app_state['timings_mode'] = True
+    if args.corroborate:
+        app_state['corroborate'] = True
+    if args.incremental:
+        app_state['incremental'] = True
+    if args.cache_max_age is not None:
+        app_state['cache_max_age'] = args.cache_max_age
+    if args.cache_max_size is not None:
+        size = parse_size(args.cache_max_size)
+        if size is None:
+            warning('Invalid --cache_max_size value, using default')
+        else:
+            app_state['cache_max_bytes'] = size
+    if args.output_spill is not None:
+        size = parse_size(args.output_spill)
+        if size is None:
+            warning('Invalid --output_spill value, using default')
+        else:
+            app_state['output_spill_bytes'] = size
+    if args.output_limit is not None:
+        size = parse_size(args.output_limit)
+        if size is None:
+            warning('Invalid --output_limit value, using default')
+        else:
+            app_state['output_limit_bytes'] = size
+    if app_state['output_limit_bytes'] < app_state['output_spill_bytes']:
+        app_state['output_spill_bytes'] = app_state['output_limit_bytes']
+    if args.jobs is not None:
+        if args.jobs < 1:
+            warning('Invalid --jobs value, using 1')
+            args.jobs = 1
+        app_state['jobs'] = args.jobs
     if args.version:
         app_state['version_mode'] = True
     if args.diags:
@@ -1278,6 +1940,15 @@ def parse_args():
         app_state['list_tools_mode'] = True
     if args.list_profiles:
         app_state['list_profiles_mode'] = True
+    if args.plan:
+        app_state['plan_mode'] = True
+    if args.diff_acpi:
+        app_state['diff_acpi'] = args.diff_acpi
+    if args.diff_pci:
+        app_state['diff_pci'] = args.diff_pci
+    if args.benchmark is not None:
+        app_state['benchmark_mode'] = True
+        app_state['benchmark_spec'] = args.benchmark
     # XXX all below option require user input validation
 #    if args.no_profile:
 #        app_state['no_profile'] = args.no_profile
@@ -1295,6 +1966,10 @@ def parse_args():
         app_state['output_dir'] = args.output_dir
         app_state['output_dir_specified'] = True
         info('User has specified explicit parent directory of: ' + app_state['output_dir'])
+    if args.staging_dir:
+        app_state['staging_dir'] = args.staging_dir
+    if args.sysfs_root:
+        app_state['sysfs_root'] = args.sysfs_root
 #    if args.omit_pii:
 #        app_state['omit_pii'] = True
     app_state['omit_pii'] = False
@@ -1303,7 +1978,13 @@ def parse_args():
 
     # XXX replace set_tool_arg(x, y) with: TOOLS['x']['args'] = args.y
     # XXX user input validation for all tool strings
-    # XXX MISSING acpidump/acpixtract file args!
+    if args.artifact:
+        app_state['user_artifacts'] = args.artifact
+    if args.acpixtract_batch:
+        set_tool_arg('acpixtract_batch', 'batch_pd', args.acpixtract_batch)
+        if app_state['user_tools'] is None:
+            app_state['user_tools'] = []
+        app_state['user_tools'].append('acpixtract_batch')
 
 #    # XXX user input validation for all tool strings
 #    if args.chipsec_uefi_blacklist:
@@ -1522,7 +2203,8 @@ def critical(e, msg):
     # e.__traceback__ # Python 3-only
     # # IOError errno (d), strerror (s), filename (?)
     if e is not None:
-        log('Exception ' + str(e.errno) + ': ' + str(e.message),
+        # e.message is Python 2-only, and not all exceptions have errno.
+        log('Exception ' + str(getattr(e, 'errno', None)) + ': ' + str(e),
             prefix_fg_color=COLOR_DEFAULTS['error_pre_fg'],
             prefix_bg_color=COLOR_DEFAULTS['error_pre_bg'],
             msg_fg_color=COLOR_DEFAULTS['error_msg_fg'],
@@ -1650,10 +2332,41 @@ def syslog_send(msg):
 
 # XXX rename function
 def log_stdio_func(buf_to_log, log_file_name):
-    '''TBW'''
+    '''Save a child process stdio buffer to a log file.
+
+    If the unprivileged post-processor is running, the buffer is handed
+    to it, so the log file is created by (and owned by) the sudo user.
+    '''
+    if post_processor_running():
+        if not post_processor_send('log', {'path': log_file_name}, [buf_to_log]):
+            error('Unable to send stdio log to post-processor: ' + log_file_name)
+        return
+    write_stdio_file(buf_to_log, log_file_name)
+
+
+def write_derived_file(buf, path):
+    '''Save a file derived from the run (eg, results.json), and its hash.
+
+    Like log_stdio_func(), the file is written by the post-processor,
+    if running. A sidecar hash file is created if --hash.
+    '''
+    if post_processor_running():
+        if not post_processor_send('write', {'path': path, 'hash': app_state['hash_mode']}, [buf]):
+            error('Unable to send file to post-processor: ' + path)
+        return
+    write_stdio_file(buf, path)
+    if app_state['hash_mode']:
+        create_sidecar_hash_file(path)
+
+
+def write_stdio_file(buf_to_log, log_file_name):
+    '''Write a child process stdio buffer to a file.'''
+    file_mode = 'w'
+    if isinstance(buf_to_log, bytes):
+        file_mode = 'wb'
     try:
         _ = warn_if_overwriting_file('', log_file_name)
-        log_file = open(log_file_name, 'w')
+        log_file = open(log_file_name, file_mode)
         log_file.write(buf_to_log)
         log_file.close()
     except:
@@ -1665,11 +2378,14 @@ def log_stdio_func(buf_to_log, log_file_name):
 
 # hash.py
 
+HASH_READ_BYTES = 1024 * 1024
+
 
 def return_hash_str_of_file(path):
     '''For a given file, return the sha256 hash string.
     
     Returns a SHA256 hash string if successful, None if unsuccessful.'''
+    import hashlib
     if is_none_or_null(path):
         error('Filename to hash unspecified')
         return None
@@ -1679,13 +2395,20 @@ def return_hash_str_of_file(path):
     debug('file to hash: ' + path)
     hash_str = None
     try:
+        # Read in chunks, tool output files can be larger than memory.
+        h = hashlib.sha256()
+        size = 0
         with open(path, 'rb') as f:
-            buf = f.read()
-            h = hashlib.sha256(buf)
-            h.update(buf)
-            hash_str = h.hexdigest()
-            debug('hash: ' + hash_str)
-    except OSError as e:
+            while True:
+                buf = f.read(HASH_READ_BYTES)
+                if not buf:
+                    break
+                h.update(buf)
+                size += len(buf)
+        hash_str = h.hexdigest()
+        add_hashed_bytes(size)
+        debug('hash: ' + hash_str)
+    except (IOError, OSError) as e:
         critical(e, 'failed to hash file')
         hash_str = None
         sys.exc_info()
@@ -1767,7 +2490,7 @@ def create_sidecar_hash_files(path):
         for root, dirs, files in os.walk(path):
             debug('root dir = ' + root)
             for fn in files:
-                fqfn = path + os.sep + fn
+                fqfn = os.path.join(root, fn)
                 debug('file loop: filename = ' + fn)
                 debug('file loop: fully-qualified filename = ' + fqfn)
                 create_sidecar_hash_file(fqfn)
@@ -1901,7 +2624,9 @@ def set_tool_arg(toolns, key, value):
     UGLY HACK until I can get this to work:
     TOOLS['chipsec_util_spi_dump']['args'] = args.chipsec_rom_bin_file
     aka:
-    set_tool_arg('chipsec_util_spi_dump', 'chipsec_rom_bin_file')
+    set_tool_arg('chipsec_util_spi_dump', 'chipsec_rom_bin_file', value)
+
+    Returns True if set, False if not.
     '''
     if value is None:
         error('No arg value specified, cannot set arg value')
@@ -1912,38 +2637,27 @@ def set_tool_arg(toolns, key, value):
     if toolns is None:
         error('No tool name specified, cannot lookup arg value')
         return False
-    for i, t in enumerate(TOOLS):
-        tool_ns = t['name']
-        tool_args = t['args']
-        if tool_ns != toolns:
-            debug('Valid tool ' + tool_ns)
-            try:
-                value = tool_args[key]
-                debug('Toolns=' + toolns + ', key=' + key + ', value=' + value)
-                return value
-            except KeyError:
-                debug('KeyError exception, key not valid: ' + key)
-                return None
-    error('Invalid tool ' + toolns)
-    return None
+    entry = get_tool_entry(toolns)
+    if entry is None:
+        error('Invalid tool ' + toolns)
+        return False
+    entry['args'][key] = value
+    debug('Toolns=' + toolns + ', key=' + key + ', value=' + value)
+    return True
 
 
 def is_valid_tool(lookup_name):
     '''
     Is specified lookup_name a valid tool name?
 
-    Traverse 'TOOLS', comparing lookup_name to tools[i].name.
+    Looks up lookup_name in the TOOLS index, see get_tool_index().
 
     lookup_name -- Tool name to validate.
 
     Returns True if valid, False if not.
     '''
-    for i, t in enumerate(TOOLS):
-        tool_ns = t['name']
-        # debug('is_valid_tool(): tool_name = ' + tool_ns)
-        if tool_ns == lookup_name:
-            # debug('Valid tool ' + lookup_name)
-            return True
+    if lookup_name in get_tool_index():
+        return True
     error('Invalid tool ' + lookup_name)
     return False
 
@@ -2077,6 +2791,7 @@ def spawn_process(args, start_dir, expected_rc, toolns,
 
     Returns returncode of child process.
     '''
+    import subprocess
     # XXX Create logfiles based on log_file_prefix.
     # XXX Test on macOS, FreeBSD for single shared UNIX codepath.
     # XXX Create related functions for Windows and UEFI.
@@ -2152,6 +2867,7 @@ def spawn_process(args, start_dir, expected_rc, toolns,
             error('Start_dir is empty or none')
             return -7
         debug('Start_dir: ' + start_dir)
+        spawn_start = time.time()
         process = subprocess.Popen(args,
                                    stdin=child_stdin,
                                    stdout=child_stdout,
@@ -2159,7 +2875,13 @@ def spawn_process(args, start_dir, expected_rc, toolns,
                                    cwd=start_dir)
         # shell=False)
         # universal_newlines=True)
-        stdout_buf, stderr_buf = process.communicate(input=None)
+        # Past --output_spill, output is streamed to its log file.
+        stdout_spill = None
+        stderr_spill = None
+        if log_stdio:
+            (stdout_spill, stderr_spill) = get_stdio_log_paths(start_dir, toolns)
+        (stdout_buf, stderr_buf, spilled) = communicate_and_reap(process, toolns, spawn_start,
+                                                                 stdout_spill, stderr_spill)
         # stdout_buf = bytes.decode(stdout_buf)
         # stderr_buf = bytes.decode(stderr_buf)
         # XXX what is max buf size of Python lib? What if tests generate more?
@@ -2189,17 +2911,25 @@ def spawn_process(args, start_dir, expected_rc, toolns,
                  ', out=' + str(len(stdout_buf)) +
                  ', err=' + str(len(stderr_buf)))
 
-    # XXX check for access denied and file not found.
+    except OSError as e:
+        # Eg, ENOENT if tool binary is missing, EACCES if not executable.
+        critical(e, 'Unable to invoke process: ' + args[0])
+        sys.exc_info()
+        return -8
     except subprocess.CalledProcessError as e:
         critical(e, 'Unexpected exception invoking process')
         sys.exc_info()
+        return -9
 
     # Log stdout/stderr, based on user preference.
     # debug('Post-exec, about to show child stdio..')
+    start = monotonic_seconds()
     if not show_tool_stdio(start_dir, toolns, stdout_buf, stderr_buf,
-                           show_stdio, log_stdio, hash_stdio):
+                           show_stdio, log_stdio, hash_stdio, spilled):
         error('Unable to save post-exec child process output')
+    add_phase_time('stdio', start)
     # XXX need to move this upstream where they have hash?
+    start = monotonic_seconds()
     if app_state['eventlog_mode']:
         # XXX add hashes to results
         debug('Logging exec results to eventlog')
@@ -2208,10 +2938,206 @@ def spawn_process(args, start_dir, expected_rc, toolns,
         # XXX add hashes to results
         debug('Logging exec results to syslog')
         log_exec_results(args, toolns, process.returncode, status_string)
+    add_phase_time('os_logging', start)
     debug('Exiting exec code, rc=' + str(process.returncode))
     return process.returncode
 
 
+OUTPUT_READ_BYTES = 64 * 1024
+
+
+def communicate_and_reap(process, toolns, start, stdout_spill=None, stderr_spill=None):
+    '''Like process.communicate(), but reap the child with os.wait4().
+
+    Saves the child's resource usage in app_state['tool_rusage'][toolns].
+    Without os.wait4 (eg, on Windows), falls back to communicate(), which
+    does not bound memory use.
+
+    start -- time.time() the process was spawned.
+    stdout_spill -- path of file to stream stdout to, past --output_spill.
+    stderr_spill -- path of file to stream stderr to, past --output_spill.
+                    If None, output past --output_spill is discarded.
+
+    Returns a tuple of (stdout_buf, stderr_buf, spilled), where the buffers
+    hold at most --output_spill bytes, and spilled is a list of the spill
+    files written, which hold the complete (up to --output_limit) output.
+    '''
+    if not hasattr(os, 'wait4'):
+        (stdout_buf, stderr_buf) = process.communicate(input=None)
+        return (stdout_buf, stderr_buf, [])
+    if process.stdin is not None:
+        process.stdin.close()
+    # Drain stderr in a thread, so neither pipe can fill and block the child.
+    stderr_capture = new_output_capture(toolns, stderr_spill)
+    reader = None
+    if process.stderr is not None:
+        reader = threading.Thread(target=read_pipe, args=(process.stderr, stderr_capture))
+        reader.daemon = True
+        reader.start()
+    stdout_capture = new_output_capture(toolns, stdout_spill)
+    stdout_capture['parser'] = new_output_parser(toolns)
+    if process.stdout is not None:
+        read_pipe(process.stdout, stdout_capture)
+    if reader is not None:
+        reader.join()
+    while True:
+        try:
+            (_, status, usage) = os.wait4(process.pid, 0)
+            break
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+            sys.exc_info()
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    record_rusage(toolns, usage, time.time() - start)
+    spilled = []
+    for capture in (stdout_capture, stderr_capture):
+        if capture['spilled']:
+            spilled.append(capture['spill_path'])
+    stderr_buf = None
+    if process.stderr is not None:
+        stderr_buf = b''.join(stderr_capture['head'])
+    return (b''.join(stdout_capture['head']), stderr_buf, spilled)
+
+
+def new_output_capture(toolns, spill_path):
+    '''Returns a new capture, for read_pipe() to save a child's output to.'''
+    return {
+        'toolns': toolns,
+        'head': [],  # chunks of the first --output_spill bytes
+        'head_bytes': 0,
+        'spill_path': spill_path,  # all output, once past --output_spill
+        'spill_file': None,
+        'spilled': False,
+        'total_bytes': 0,  # all output read, including discarded
+        'dropped_bytes': 0,  # output discarded, past --output_limit
+        'parser': None,  # see parsers.py
+    }
+
+
+def read_pipe(pipe, capture):
+    '''Read pipe until EOF, saving the data to capture, then close it.
+
+    At most --output_spill bytes are kept in memory. Past that, output
+    is streamed to the capture's spill file, if any. Past --output_limit
+    (or --output_spill if no spill file), output is read and discarded,
+    so the child does not block, and a truncation marker is added.
+    '''
+    fd = pipe.fileno()
+    while True:
+        try:
+            chunk = os.read(fd, OUTPUT_READ_BYTES)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                sys.exc_info()
+                continue
+            critical(e, 'Unable to read output of: ' + capture['toolns'])
+            sys.exc_info()
+            break
+        if not chunk:
+            break
+        capture_output(capture, chunk)
+    pipe.close()
+    finish_output_capture(capture)
+
+
+def capture_output(capture, chunk):
+    '''Save chunk of output to capture, see read_pipe().'''
+    if capture['parser'] is not None:
+        feed_output_parser(capture['parser'], chunk)
+    limit = app_state['output_limit_bytes']
+    if capture['spill_path'] is None:
+        limit = min(limit, app_state['output_spill_bytes'])
+    total = capture['total_bytes']
+    capture['total_bytes'] += len(chunk)
+    if total >= limit:
+        capture['dropped_bytes'] += len(chunk)
+        return
+    if total + len(chunk) > limit:
+        capture['dropped_bytes'] += total + len(chunk) - limit
+        chunk = chunk[:limit - total]
+    room = app_state['output_spill_bytes'] - capture['head_bytes']
+    if room > 0:
+        capture['head'].append(chunk[:room])
+        capture['head_bytes'] += len(capture['head'][-1])
+    if (capture['spill_file'] is None) and (len(chunk) <= room):
+        return
+    if room > 0:
+        chunk = chunk[room:]
+    if capture['spill_file'] is None:
+        try:
+            capture['spill_file'] = open(capture['spill_path'], 'wb')
+            # The head, including the start of this chunk, goes first.
+            for head_chunk in capture['head']:
+                capture['spill_file'].write(head_chunk)
+        except (IOError, OSError) as e:
+            critical(e, 'Unable to spill output to: ' + capture['spill_path'])
+            sys.exc_info()
+            # Keep only the head, as if there was no spill file.
+            capture['spill_file'] = None
+            capture['spill_path'] = None
+            capture['dropped_bytes'] += len(chunk)
+            return
+        capture['spilled'] = True
+        debug('Spilling output of ' + capture['toolns'] + ' to: ' + capture['spill_path'])
+    try:
+        capture['spill_file'].write(chunk)
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to spill output to: ' + capture['spill_path'])
+        sys.exc_info()
+
+
+def finish_output_capture(capture):
+    '''Finish parsing, add truncation marker if output was discarded, close spill file.'''
+    if capture['parser'] is not None:
+        finish_output_parser(capture['toolns'], capture['parser'])
+    if capture['dropped_bytes'] > 0:
+        kept = capture['total_bytes'] - capture['dropped_bytes']
+        marker = ('\n[fwaudit: output truncated after ' + str(kept) + ' bytes, ' +
+                  str(capture['dropped_bytes']) + ' bytes discarded]\n').encode('utf-8')
+        warning('Output of ' + capture['toolns'] + ' truncated after ' + format_bytes(kept) +
+                ', ' + format_bytes(capture['dropped_bytes']) + ' discarded')
+        if capture['spill_file'] is not None:
+            capture['spill_file'].write(marker)
+        else:
+            capture['head'].append(marker)
+    if capture['spill_file'] is not None:
+        capture['spill_file'].close()
+        capture['spill_file'] = None
+
+
+def get_stdio_log_paths(start_dir, toolns):
+    '''Returns tuple of (stdout_file, stderr_file) paths, per --output_mode.
+
+    stderr_file is None if stderr is not logged (merged mode).
+    '''
+    if app_state['output_mode'] == 'merged':
+        return (os.path.join(start_dir, toolns + '.output.txt'), None)
+    return (os.path.join(start_dir, toolns + '.stdout.txt'),
+            os.path.join(start_dir, toolns + '.stderr.txt'))
+
+
+def record_rusage(toolns, usage, wall_seconds):
+    '''Save resource usage of a tool's child process, from os.wait4().'''
+    # ru_maxrss is in KiB on Linux, in bytes on macOS.
+    max_rss = usage.ru_maxrss
+    if not os_is_macos():
+        max_rss = max_rss * 1024
+    app_state['tool_rusage'][toolns] = {
+        'wall_seconds': wall_seconds,
+        'user_seconds': usage.ru_utime,
+        'sys_seconds': usage.ru_stime,
+        'max_rss': max_rss,
+        'block_in': usage.ru_inblock,
+        'block_out': usage.ru_oublock,
+        'voluntary_switches': usage.ru_nvcsw,
+        'involuntary_switches': usage.ru_nivcsw,
+    }
+
+
 def init_stdio_streams():
     '''Initialize child process stdio handles, based on user input.
 
@@ -2221,6 +3147,7 @@ def init_stdio_streams():
 
     Returns a tuple of (stdin, stdout, stderr).
     '''
+    import subprocess
     # The default mode: merged stdout and stderr buffers (all PIPE)
     child_stdin = subprocess.PIPE
     child_stdout = subprocess.PIPE
@@ -2246,7 +3173,8 @@ def init_stdio_streams():
     return (child_stdin, child_stdout, child_stderr)
 
 
-def show_tool_stdio(start_dir, toolns, stdout_buf, stderr_buf, show_stdio, log_stdio, hash_stdio):
+def show_tool_stdio(start_dir, toolns, stdout_buf, stderr_buf, show_stdio, log_stdio, hash_stdio,
+                    spilled=None):
     '''Display and/or log tool stdout/stderr, based on user config.
 
     After child process has been executed, depending on user config options,
@@ -2258,6 +3186,8 @@ def show_tool_stdio(start_dir, toolns, stdout_buf, stderr_buf, show_stdio, log_s
     show_stdio -- should child tool output be displayed to parent output?
     log_stdio -- should output be logged to a file?
     hash_stdio -- generate sidecar hash files for all output file(s)?
+    spilled -- list of log files already written while reading the output,
+               see read_pipe(). The buffers only hold the start of these.
 
     The app_state['output_mode'] that control if stdout or stderr is shown
     first or second only applies to console output. For syslog and
@@ -2340,13 +3270,19 @@ def show_tool_stdio(start_dir, toolns, stdout_buf, stderr_buf, show_stdio, log_s
                 debug('Internal error, unexpected mode: ' + mode)
                 return False
 
+        if spilled is None:
+            spilled = []
+        if show_stdio:
+            for path in spilled:
+                info('Output too large to show, see: ' + path)
+
         if log_stdio:
             # debug('Logging stdout to syslog..')
-            if not is_none_or_null(stdout_buf):
+            if (not is_none_or_null(stdout_buf)) and (stdout_file not in spilled):
                 log_stdio_func(stdout_buf, stdout_file)
             if mode != 'merged':
-                if not is_none_or_null(stderr_buf):
-                    log_stdio_func(stderr_file, stderr_buf, stderr_file)
+                if (not is_none_or_null(stderr_buf)) and (stderr_file not in spilled):
+                    log_stdio_func(stderr_buf, stderr_file)
 
     except OSError as e:
         critical(e, 'Unexpected exception occurred')
@@ -2547,6 +3483,7 @@ def get_default_directory_name():
 
 def sudo_user_diags():
     '''For Unix SUDO use case, get pre-SUDO username.'''
+    import pwd
     # What is FSB/POSIX standard for '/home/' + username?
     # win32api: GetUserName() and GetUserNameEx()
     # Is root always 0 (EUID==0?) on all modern *nix systems?
@@ -2635,9 +3572,11 @@ def change_file_owner_group(path, new_uid, new_gid):
         error('No GID specified')
         return False
     debug('Changing file owner/group/mode: ' + path + ',' + str(new_uid) + ', ' + str(new_gid))
+    # os.chown() sets both owner and group. Don't call set_groups() here,
+    # it changes the credentials of this (root) process, not of the file,
+    # and the post-processor needs the parent to still be fully root.
     owner_status = set_owner(path, new_uid, new_gid)
-    group_status = set_groups(path, new_uid, new_gid)
-    if (not owner_status) or (not group_status):
+    if not owner_status:
         debug('Unable to set file ownership/group')  # XXX error()
         return False
     return True
@@ -2743,89 +3682,148 @@ def build_meta_profile(verbose=True):
     they must specify new profiles via --new_profile. Available tools are
     in the built-in TOOLS list, and are not user-extensible.
 
-    If user's selection of tool(s)/profile(s) includes duplicate entries
-    -- multiple copies of the same tool -- that will fail -- the PTD will
-    have already been created for 2nd-subsequent uses. Need to check for
-    duplicates. For now, document to not run multiple copies of the same
-    tool.
+    A profile's tools list may also name other profiles, which are
+    expanded in place. Each toolns is only selected once, at the position
+    it was first selected, no matter how many times (and via how many
+    tools/profiles) it was selected. Tools which cannot run (eg, binary
+    not installed) are removed, see probe.py. Tools producing artifacts
+    consumed by selected tools are added (unless given with --artifact),
+    and redundant producers of the same artifact are removed, see
+    schedule.py. Where each
+    toolns was selected from is saved in app_state['meta_profile_origins'].
 
     Returns a tuple of (status, count, skipped), where:
     status -- True if code worked, False if it failed.
     count -- count of selected tools in meta_profile
-    skipped -- count of selected unrecognized tools skipped.
+    skipped -- count of selected tools skipped (unrecognized or unavailable).
     '''
-    # XXX check for duplicate tool entries, warn and skip dups
-    # XXX can also check for dup tools when creating ptd, check if already exists.
     # XXX Remove verbose arg, or at least sync with global.
     app_state['meta_profile'] = []
-    tools = 0
-    skipped = 0
+    app_state['meta_profile_origins'] = {}
     if (app_state['user_profiles'] is None) and (app_state['user_tools'] is None):
         error('No profile(s) or tool(s) selected, nothing to do')
-        return (False, tools, skipped)
+        return (False, 0, 0)
+    if not start_artifacts():
+        error('Unable to use artifact(s) given with --artifact')
+        return (False, 0, 0)
     if (app_state['no_profile']) and (app_state['new_profiles'] is None):
         warning('Profiles are disabled')
         # XXX this codepath previously returned False. Does any below code presume the previous return?
+    if verbose and app_state['user_tools'] is not None:
+        output_wrapped(app_state['user_tools'])
+    if app_state['user_profiles'] is not None:
+        output_wrapped(app_state['user_profiles'])
 
-    # Enumerate user selected tool(s) list.
-    if app_state['user_tools'] is not None:
-        if verbose:
-            output_wrapped(app_state['user_tools'])
-        for t in app_state['user_tools']:
-            if is_valid_tool(t):
-                debug('Adding tool to meta_profile: ' + t)
-                app_state['meta_profile'].append(t)
-                tools += 1
+    (selected, origins, skipped) = resolve_selection(app_state['user_tools'],
+                                                     app_state['user_profiles'])
+    skipped += prune_unavailable_tools(selected, origins)
+    skipped += add_artifact_producers(selected, origins)
+    select_artifact_producers(selected, origins)
+    app_state['meta_profile'] = selected
+    app_state['meta_profile_origins'] = origins
+    for toolns in selected:
+        info('Selected ' + toolns + ' via: ' + ', '.join(origins[toolns]))
+    debug('Tool count: ' + str(len(selected)))
+    debug('Skipped count: ' + str(skipped))
+    if skipped > 0:
+        warning('Total skipped tool count: ' + str(skipped))
+    return (True, len(selected), skipped)
+
+
+def resolve_selection(user_tools, user_profiles):
+    '''Expand user-selected tools and (nested) profiles into toolns list.
+
+    user_tools -- list of toolns from --tool, or None.
+    user_profiles -- list of profile names from --profile, or None.
+
+    Returns a tuple of (selected, origins, skipped), where:
+    selected -- ordered, deduplicated list of toolns.
+    origins -- dict of {toolns: [origin, ...]}, where an origin is 'tool'
+               for --tool, or 'profile:<name>[/<nested_name>...]'.
+    skipped -- count of unrecognized tool/profile names skipped.
+    '''
+    selected = []
+    origins = {}
+    skipped = 0
+    tools = get_tool_index()
+    if user_tools is not None:
+        for t in user_tools:
+            if t in tools:
+                add_to_selection(t, 'tool', selected, origins)
             else:
                 warning('Ignoring unrecognized tool: ' + t)
                 skipped += 1
-                # return False   XXX?
+    if user_profiles is not None:
+        for p in user_profiles:
+            skipped += expand_profile(p, [], selected, origins)
+    return (selected, origins, skipped)
 
-    # Enumerate user-selected profile(s) list.
-    if app_state['user_profiles'] is not None:
-        output_wrapped(app_state['user_profiles'])
-        if app_state['no_profile']:
-            debug('Examining user-defined profiles')
-            for p in app_state['user_profiles']:
-                debug('User profile: ' + str(type(p['name'])))  # XXX
-                debug('User profile: ' + p['name'])
-                if p in enumerate(app_state['user_profiles']):  # XXX .keys()?
-                    debug('Matches profile: ' + p['name'])
-                    for t in enumerate(p['tools']):
-                        if is_valid_tool(t):
-                            debug('Adding tool to meta_profile: ' + t)
-                            app_state['meta_profile'].append(t)
-                            tools += 1
-                        else:
-                            skipped += 1
-                            warning('Ignoring unrecognized tool: ' + str(t))
-                            # return False   XXX?
+
+def expand_profile(name, chain, selected, origins):
+    '''Add the tools of profile name (and of any nested profiles) to selected.
+
+    chain -- list of names of the profiles which included this one, used
+             for origins and to detect include cycles.
+
+    Returns count of unrecognized tool/profile names skipped.
+    '''
+    profiles = get_profile_index()
+    tools = get_tool_index()
+    if name not in profiles:
+        warning('Ignoring unrecognized profile: ' + name)
+        return 1
+    if name in chain:
+        warning('Ignoring recursive profile: ' + '/'.join(chain + [name]))
+        return 1
+    chain = chain + [name]
+    origin = 'profile:' + '/'.join(chain)
+    skipped = 0
+    for t in profiles[name]['tools']:
+        if t in tools:
+            add_to_selection(t, origin, selected, origins)
+        elif t in profiles:
+            skipped += expand_profile(t, chain, selected, origins)
         else:
-            info('Examining built-in profiles')
-            # for p in enumerate(app_state['user_profiles']):
-            for p in app_state['user_profiles']:
-                if verbose:
-                    info('Profile: ' + str(type(p['name'])))
-                info('Profile: ' + p['name'])
-                if p in enumerate(PROFILES):  # XXX .keys()?
-                    if verbose:
-                        info('Matches profile: ' + p['name'])
-                    for t in enumerate(p['tools']):
-                        if is_valid_tool(t):
-                            if verbose:
-                                info('Adding tool to meta_profile: ' + t)
-                            tools += 1
-                            app_state['meta_profile'].append(t)
-                        else:
-                            skipped += 1
-                            warning('Ignoring unrecognized tool: ' + str(t))
-                            # return False   XXX?
-
-    debug('Tool count: ' + str(tools))
-    debug('Skipped count: ' + str(skipped))
-    if skipped > 0:
-        warning('Total skipped tool count: ' + str(skipped))
-    return (True, tools, skipped)
+            warning('Ignoring unrecognized tool: ' + t + ' (' + origin + ')')
+            skipped += 1
+    return skipped
+
+
+def add_to_selection(toolns, origin, selected, origins):
+    '''Add toolns to selected, unless already there; record the origin.'''
+    if toolns in origins:
+        debug('Already selected, not adding again: ' + toolns + ' (' + origin + ')')
+        origins[toolns].append(origin)
+        return
+    debug('Adding tool to meta_profile: ' + toolns)
+    origins[toolns] = [origin]
+    selected.append(toolns)
+
+
+def get_tool_index():
+    '''Return dict of {toolns: TOOLS entry}, built on first use.'''
+    global TOOL_INDEX
+    if TOOL_INDEX is None:
+        TOOL_INDEX = {}
+        for t in TOOLS:
+            TOOL_INDEX[t['name']] = t
+    return TOOL_INDEX
+
+
+def get_profile_index():
+    '''Return dict of {name: profile}, of built-in and user-defined profiles.
+
+    Built-in PROFILES are omitted if --no_profile. User-defined profiles
+    override built-in profiles of the same name.
+    '''
+    index = {}
+    if not app_state['no_profile']:
+        for p in PROFILES:
+            index[p['name']] = p
+    if isinstance(app_state['new_profiles'], list):
+        for p in app_state['new_profiles']:
+            index[p['name']] = p
+    return index
 
 
 def create_directories():
@@ -2851,10 +3849,21 @@ def create_directories():
 
     # Part 2 of 3:
     # Setup Per-Run Directory (PRD), after PD is setup, before PTDs used.
-    if not setup_per_run_directory(pd, new_dir_mode, new_uid, new_gid):
+    # If staging, the PRD is created in the staging area, and published
+    # into the PD after the run.
+    run_parent = pd
+    if not is_none_or_null(app_state['staging_dir']):
+        run_parent = setup_staging_directory(pd, new_uid, new_gid)
+        if run_parent is None:
+            warning('Not staging, running tools in parent directory')
+            run_parent = pd
+    if not setup_per_run_directory(run_parent, new_dir_mode, new_uid, new_gid):
         error('Cannot create per-run directory (PRD), exiting')
         return False, None, None
     prd = app_state['per_run_directory']
+    if run_parent != pd:
+        app_state['published_prd'] = os.path.join(pd, os.path.basename(prd))
+        info('Staging per-run directory: ' + prd)
     # debug('PRD setup: ' + prd)
 
     # Part 3 of 3: the Per-Tool-Directories (PTDs), happens elsewhere.
@@ -2875,11 +3884,29 @@ def setup_per_run_directory(pd, new_dir_mode, new_uid, new_gid):
     ts = time.gmtime()
     timestamp = time.strftime(stamp_format, ts)
     app_state['timestamp'] = timestamp
-    prd = os.path.join(pd, timestamp)
-    os.mkdir(prd)
+    # Concurrent runs may start in the same second, so the PRD name also
+    # has the host name and a random UUID. Retry if it still collides.
+    prd = None
+    for attempt in range(3):
+        run_id = generate_run_id(timestamp)
+        if run_id is None:
+            error('Unable to generate run ID')
+            return False
+        prd = os.path.join(pd, run_id)
+        try:
+            os.mkdir(prd)
+            break
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                critical(e, 'Unable to create per-run directory: ' + prd)
+                sys.exc_info()
+                return False
+            warning('Per-run directory already exists, retrying: ' + prd)
+            prd = None
     if is_none_or_null(prd):
         error('Per-run directory name unspecified')
         return False
+    app_state['run_id'] = run_id
     if not dir_exists(prd):
         error('Per-run directory does not exist: ' + prd)
         return False
@@ -2893,18 +3920,38 @@ def setup_per_run_directory(pd, new_dir_mode, new_uid, new_gid):
     return True
 
 
+def generate_run_id(timestamp):
+    '''Return a unique run ID: <timestamp>_<host>_<uuid>, or None if error.
+
+    The timestamp keeps PRDs sorted by time, the host name keeps runs
+    of different systems apart in a shared PD, and the UUID makes
+    concurrent runs on the same host in the same second unique.
+    '''
+    u = generate_uuid(uuid4=True)
+    if is_none_or_null(u):
+        return None
+    host = ''
+    for c in platform.node().split('.')[0]:
+        if c.isalnum() or (c == '-'):
+            host += c
+    if host == '':
+        host = 'localhost'
+    return timestamp + '_' + host + '_' + u
+
+
 def get_sudo_user_group_mode():
     '''TBW'''
     # XXX only need uid, gid, and file mode for sudo case...
-    new_uid = int(os.environ.get('SUDO_UID'))
-    if new_uid is None:
-        error('Unable to obtain SUDO_UID')
-        return False
+    # Without sudo (eg, --benchmark), keep the current user and group.
+    if os.environ.get('SUDO_UID') is None:
+        new_uid = os.getuid()
+    else:
+        new_uid = int(os.environ.get('SUDO_UID'))
     #debug('new UID via SUDO_UID: ' + str(new_uid))
-    new_gid = int(os.environ.get('SUDO_GID'))
-    if new_gid is None:
-        error('Unable to obtain SUDO_GID')
-        return False
+    if os.environ.get('SUDO_GID') is None:
+        new_gid = os.getgid()
+    else:
+        new_gid = int(os.environ.get('SUDO_GID'))
     #debug('new GID via SUDO_GID: ' + str(new_gid))
     # new_dir_mode = (stat.S_IRUSR|stat.S_IWUSR|stat.S_IRGRP|stat.S_IWGRP|stat.S_IROTH|stat.S_IWOTH)
     rwx_mode = (stat.S_IRWXU|stat.S_IRWXG|stat.S_IRWXO)
@@ -3003,43 +4050,95 @@ def run_meta_profile(pd, prd):
     if is_none_or_null(prd):
         error('Unable to obtain PRD')
         return False
-    # For each tool to run, create it's target per-tool-directory.
-    for toolns in app_state['meta_profile']:
-        try:
-            ptd = os.path.join(prd, toolns)
-            if not setup_per_tool_directory(pd, prd, ptd, toolns):
-                error('Unable to create per-tool-directory')
-                return False
-            else:
-                debug('Created per-tool directory: ' + ptd)
-            # At this point, we should have a PRD/PTD dir setup to run tool in.
-        except OSError as e:
-            critical(e, 'OSError trying to create tool directory')
-            sys.exc_info()
-            # XXX: check if OSError is File Not Found
-            # except FileNotFoundError as e:
-            # error('File Not Found: tool needs to be installed in PATH')
-            return False
-        # Call tool resolver, to determine which variation (namespace) of a tool to run
-        rc = tool_resolver(toolns, pd, prd, ptd)
-        # XXX Confirm failure rc is logged in tool_resolver() or finish_results()
-        debug('Post-tool-resolution, rc = ' + str(rc))
-        if app_state['hash_mode']:
-            if not create_sidecar_hash_files(ptd):
-                error('Unable to create side-car hash file(s) in PTD directory: ' + ptd)
+    # Validate all the PTDs up front, skipping tools whose PTD is in use.
+    start = monotonic_seconds()
+    (status, toolns_list) = preflight_per_tool_directories(prd, app_state['meta_profile'])
+    if not status:
+        warning('Skipping tool(s) with unusable per-tool directories')
+    (status, waves) = schedule_waves(toolns_list)
+    add_phase_time('preflight', start)
+    if not status:
+        warning('Skipping tool(s) with unresolvable artifact dependencies')
+    for wave in waves:
+        # Live tools use the hardware, run them one at a time.
+        offline = []
+        for toolns in wave:
+            if get_tool_entry(toolns)['mode'] == 'offline':
+                offline.append(toolns)
+            elif not run_tool(pd, prd, toolns):
                 return False
-        if app_state['manifest_mode']:
-            debug('***** MANIFEST MODE:.....')
-            if not create_manifest_file(ptd):
-                error('Unable to create PTD manifest file in directory: ' + ptd)
+        if (len(offline) > 1) and (app_state['jobs'] > 1):
+            if not run_tools_concurrently(pd, prd, offline, app_state['jobs']):
                 return False
-    # finish_results()
+        else:
+            for toolns in offline:
+                if not run_tool(pd, prd, toolns):
+                    return False
+    # finish_results()
     # XXX propogate error upstream
     return True
 
 
+def run_tool(pd, prd, toolns):
+    '''Create the PTD of toolns, run the tool in it, and post-process it.
+
+    If any artifacts the tool consumes are missing (eg, their producer
+    failed), the tool is skipped.
+
+    Returns True if successful (or skipped), False if the run should stop.
+    '''
+    if not tool_inputs_available(toolns):
+        error('Skipping tool, input artifact(s) unavailable: ' + toolns)
+        return True
+    ptd = os.path.join(prd, toolns)
+    start = monotonic_seconds()
+    try:
+        if not setup_per_tool_directory(pd, prd, ptd, toolns):
+            error('Unable to create per-tool-directory')
+            return False
+        else:
+            debug('Created per-tool directory: ' + ptd)
+        # At this point, we should have a PRD/PTD dir setup to run tool in.
+    except OSError as e:
+        critical(e, 'OSError trying to create tool directory')
+        sys.exc_info()
+        # XXX: check if OSError is File Not Found
+        # except FileNotFoundError as e:
+        # error('File Not Found: tool needs to be installed in PATH')
+        return False
+    if not link_tool_inputs(toolns, ptd):
+        error('Unable to link input artifact(s) into PTD: ' + ptd)
+        return False
+    add_phase_time('setup_ptd', start)
+    # Call tool resolver, to determine which variation (namespace) of a tool to run
+    tool_start = time.time()
+    if restore_cached_tool(pd, ptd, toolns):
+        # Not a run of the tool, keep it out of the history's estimates.
+        rc = 0
+    else:
+        rc = tool_resolver(toolns, pd, prd, ptd)
+        store_cached_tool(pd, ptd, toolns)
+        app_state['tool_seconds'][toolns] = time.time() - tool_start
+    # XXX Confirm failure rc is logged in tool_resolver() or finish_results()
+    debug('Post-tool-resolution, rc = ' + str(rc))
+    start = monotonic_seconds()
+    register_tool_artifacts(toolns, ptd)
+    if not post_process_per_tool_directory(ptd, toolns):
+        error('Unable to post-process PTD directory: ' + ptd)
+        return False
+    add_phase_time('post_process_ptd', start)
+    return True
+
+
 def get_pass_fail_status(toolns, tool, rc, erc):
     debug('Expected_rc=' + str(erc) + ', rc=' + str(rc))
+    # Verdicts parsed from the tool's output, if any, override rc.
+    parsed = app_state['tool_parsed'].get(toolns)
+    if parsed is not None:
+        status = get_verdict_status(parsed['verdicts'])
+        if status is not None:
+            debug('tool=' + tool + ', ns=' + toolns + ', status=' + status + ' (parsed)')
+            return status
     erc = rc  # XXX mock success, fix properly!
     if rc == erc:
         status = 'PASS'
@@ -3086,7 +4185,6 @@ def tool_resolver(toolns, pr, prd, ptd):
     # XXX expected RC for chipsec code!
     # XXX integrate below 3 lists, ('built-in', native exec, and Python module
     # load), then alphabetize
-    # XXX resolve acpidump live output not working as acpixtract offline input.
     rc = 1
     if is_none_or_null(prd):
         error('No per-run directory specified')
@@ -3142,13 +4240,15 @@ def tool_resolver(toolns, pr, prd, ptd):
         rc = lshw(toolns, tool, prd, ptd, erc)
     elif tool == 'pawn':
         rc = pawn(toolns, tool, prd, ptd, erc)
+    elif tool == 'sysfs':
+        rc = sysfs(toolns, tool, prd, ptd, erc)
     else:
         error('Unknown tool name, unable to resolve: ' + toolns)
         return -1  # XXX ?
     debug(tool + ' post-exec: rc=' + str(rc) + ', expected=' + str(erc))
     status = get_pass_fail_status(toolns, tool, rc, erc)
 
-    # add_results_record(tool, ptd, toolns, rc, erc, status)
+    add_results_record(tool, ptd, toolns, rc, erc, status)
     # XXX more to add to results record:
     # hashes of generated files
     # spawn code needs to add some results to results_record,
@@ -3159,6 +4259,11 @@ def tool_resolver(toolns, pr, prd, ptd):
     return rc
 
 
+def get_tool_entry(toolns):
+    '''Return the TOOLS dict for a toolns, or None if not found.'''
+    return get_tool_index().get(toolns)
+
+
 def get_tool_info(toolns):
     '''Return info about a tool, given a toolns.
 
@@ -3372,6 +4477,7 @@ def is_windows_user_administrator():
 
     :return: True if Administrator, False if not.
     '''
+    import ctypes
     # XXX Which Windows versions support this API?
     if not os_is_windows():
         error('Windows-centric code should not be called from this OS')
@@ -3430,6 +4536,8 @@ def is_user_root():
 
 def diagnose_groups(uid_name_string, gid_name_string):
     '''TBW'''
+    import grp
+    import pwd
     # XXX test when user and/or root is a member of multiple groups
     # test if macOS/FreeBSD behavior is the same as Linux. See the Python
     # documentation Note for os.getgroups() and os.setgrups().
@@ -3496,6 +4604,7 @@ def show_sudo_vars():
 
 def show_user_group_process_info():
     '''TBW'''
+    import pwd
     # XXX environment variable stuff is Unix-centric
     # XXX UID/GID/EGID is Unix-centric.
     try:
@@ -3598,6 +4707,8 @@ def show_python_environment_variables():
 
 def show_diagnostics():
     '''Show information to aid in bug reporting and debugging.'''
+    import hashlib
+    import site
     # sys.implementation
     # sys.implementation.name
     # platform.python_implementation())
@@ -3802,6 +4913,7 @@ def generate_uuid(hex_style=True, urn_style=False, uuid1=False, uuid4=False,
 
     Returns specified UUID string, or None if there was an error.
     '''
+    import uuid
     if uuid1:
         if verbose:
             info('Generating type1 UUID, based on host ID and current time')
@@ -3832,14 +4944,12 @@ def generate_uuid(hex_style=True, urn_style=False, uuid1=False, uuid4=False,
 def is_dir_empty(root):
     '''Checks if a directory is empty (no files or subdirs).
 
-    Traverses a directory, counting the number of files and subdirs
-    it contains. An empty directory has no subdirs or files in it.
+    Stops at the first directory entry found, instead of walking the whole
+    tree. Any entry, including a zero-byte file, makes a directory nonempty.
 
     Returns True if no files or subdirs, False if nonempty or some
-    other problem with directory traversal.
+    other problem reading the directory.
     '''
-    # XXX Init code checks returning False conflicts with empty logic
-    # XXX Downream traverse_dir() code does not handle errors.
     # XXX TOCTOU issues.
     if is_none_or_null(root):
         error('Directory name unspecified')
@@ -3847,24 +4957,102 @@ def is_dir_empty(root):
     if not dir_exists(root):
         error('Directory does not exist: ' + root)
         return False
-    status, dir_count, file_count, file_bytes = traverse_dir(root)
-    if (is_none_or_nonbool(status)) and (status is False):
-        error('Directory traversal failed')
+    try:
+        name = first_dir_entry(root)
+    except OSError as e:
+        critical(e, 'Unexpected exception reading directory: ' + root)
+        sys.exc_info()
         return False
-    # XXX dir_count and file_count are Lists, not Ints.
-    if dir_count is None:
-        dir_count = 0
-    if file_count is None:
-        file_count = 0
-    debug('Directory count: ' + str(dir_count))
-    debug('File count: ' + str(file_count))
-    debug('Bytes used: ' + str(file_bytes))
-    if file_bytes > 0:
-        error('Directory non-empty: ' + str(file_bytes) + ' bytes used')
+    if name is not None:
+        debug('Directory non-empty, contains: ' + name)
         return False
     debug('Directory appears usable')
     return True
 
+
+def first_dir_entry(path):
+    '''Return the name of the first entry in directory path, or None if empty.
+
+    Uses os.scandir() where available (Python 3.5+), which reads the
+    directory incrementally, so this returns after the first entry. Older
+    Pythons fall back to os.listdir(). Raises OSError on failure.
+    '''
+    scandir = getattr(os, 'scandir', None)
+    if scandir is None:
+        names = os.listdir(path)
+        if len(names) > 0:
+            return names[0]
+        return None
+    it = scandir(path)
+    name = None
+    try:
+        for entry in it:
+            name = entry.name
+            break
+    finally:
+        if hasattr(it, 'close'):
+            it.close()
+    return name
+
+
+def list_dir_entries(path):
+    '''Return a dict of {name: is_dir} for all entries in directory path.
+
+    A single directory listing, using os.scandir() where available so
+    no extra stat() call is needed per entry. Raises OSError on failure.
+    '''
+    entries = {}
+    scandir = getattr(os, 'scandir', None)
+    if scandir is None:
+        for name in os.listdir(path):
+            entries[name] = os.path.isdir(os.path.join(path, name))
+        return entries
+    it = scandir(path)
+    try:
+        for entry in it:
+            entries[entry.name] = entry.is_dir()
+    finally:
+        if hasattr(it, 'close'):
+            it.close()
+    return entries
+
+
+def preflight_per_tool_directories(prd, toolns_list):
+    '''Check all planned per-tool directories (PTDs) in one pass.
+
+    Lists the PRD once; only PTD names which already exist are examined
+    further (an existing PTD must be an empty directory to be reused).
+
+    prd -- per-run directory the PTDs will be created in.
+    toolns_list -- list of toolns names, one PTD per toolns.
+
+    Returns a tuple of (status, usable), where:
+    status -- True if all PTDs are usable, False if any are not.
+    usable -- list of toolns whose PTD is usable, in original order.
+    '''
+    usable = []
+    try:
+        existing = list_dir_entries(prd)
+    except OSError as e:
+        critical(e, 'Unable to list per-run directory: ' + prd)
+        sys.exc_info()
+        return (False, usable)
+    status = True
+    for toolns in toolns_list:
+        if toolns not in existing:
+            usable.append(toolns)
+            continue
+        ptd = os.path.join(prd, toolns)
+        if not existing[toolns]:
+            error('Per-tool-directory name in use by a file: ' + ptd)
+            status = False
+        elif not is_dir_empty(ptd):
+            error('Skipping non-empty per-tool-directory: ' + ptd)
+            status = False
+        else:
+            usable.append(toolns)
+    return (status, usable)
+
 #####################################################################
 
 # chipsec.py
@@ -3873,42 +5061,42 @@ def is_dir_empty(root):
 def chipsec(toolns, tool, prd, ptd, erc):
     '''Entry point for different toolns values for tool name.'''
     debug('chipsec resolver: toolns=' + toolns + ', tool=' + tool)
-    if toolns == 'chipsec_test.bios_keyboard_buffer':
+    if toolns == 'chipsec_test_bios_keyboard_buffer':
         rc = chipsec_test_bios_kbrd_buffer(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.bios_smi':
+    elif toolns == 'chipsec_test_bios_smi':
         rc = chipsec_test_bios_smi(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.bios_ts':
+    elif toolns == 'chipsec_test_bios_ts':
         rc = chipsec_test_bios_ts(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.bios_wp':
+    elif toolns == 'chipsec_test_bios_wp':
         rc = chipsec_test_bios_wp(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.ia32cfg':
+    elif toolns == 'chipsec_test_ia32cfg':
         rc = chipsec_test_ia32cfg(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.memconfig':
+    elif toolns == 'chipsec_test_memconfig':
         rc = chipsec_test_memconfig(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.remap':
+    elif toolns == 'chipsec_test_remap':
         rc = chipsec_test_remap(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.rtclock':
+    elif toolns == 'chipsec_test_rtclock':
         rc = chipsec_test_rtclock(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.secureboot_variables':
+    elif toolns == 'chipsec_test_secureboot_variables':
         rc = chipsec_test_secureboot_variables(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.smm':
+    elif toolns == 'chipsec_test_smm':
         rc = chipsec_test_smm(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.smm_dma':
+    elif toolns == 'chipsec_test_smm_dma':
         rc = chipsec_test_smm_dma(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.smrr':
+    elif toolns == 'chipsec_test_smrr':
         rc = chipsec_test_smrr(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.spi_desc':
+    elif toolns == 'chipsec_test_spi_desc':
         rc = chipsec_test_spi_desc(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.spi_fdopss':
+    elif toolns == 'chipsec_test_spi_fdopss':
         rc = chipsec_test_spi_fdopss(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.spi_lock':
+    elif toolns == 'chipsec_test_spi_lock':
         rc = chipsec_test_spi_lock(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.uefi_access_spec':
+    elif toolns == 'chipsec_test_uefi_access_spec':
         rc = chipsec_test_uefi_access_uefispec(toolns, tool, prd, ptd, erc)
-    elif toolns == 'chipsec_test.uefi_s3_bootscript':
+    elif toolns == 'chipsec_test_uefi_s3_bootscript':
         rc = chipsec_test_uefi_s3bootscript(toolns, tool, prd, ptd, erc)
-#    elif toolns == 'chipsec_uefi_blacklist':
-#        rc = chipsec_uefi_blacklist(toolns, tool, prd, ptd, erc, get_tool_arg(toolns, 'rom_bin_file'))
+    elif toolns == 'chipsec_uefi_blacklist':
+        rc = chipsec_uefi_blacklist(toolns, tool, prd, ptd, erc, get_tool_input(ptd, 'rom.bin'))
     elif toolns == 'chipsec_acpi_list':
         rc = chipsec_acpi_list(toolns, tool, prd, ptd, erc)
     elif toolns == 'chipsec_acpi_table':
@@ -3919,8 +5107,8 @@ def chipsec(toolns, tool, prd, ptd, erc):
         rc = chipsec_cpu_info(toolns, tool, prd, ptd, erc)
     elif toolns == 'chipsec_cpu_pt':
         rc = chipsec_cpu_pt(toolns, tool, prd, ptd, erc)
-#    elif toolns == 'chipsec_decode':
-#        rc = chipsec_decode(toolns, tool, prd, ptd, erc, get_tool_arg(toolns, 'spi_bin_file'))
+    elif toolns == 'chipsec_decode':
+        rc = chipsec_decode(toolns, tool, prd, ptd, erc, None, get_tool_input(ptd, 'rom.bin'))
     elif toolns == 'chipsec_decode_types':
         rc = chipsec_decode_types(toolns, tool, prd, ptd, erc)
     elif toolns == 'chipsec_ec_dump':
@@ -3957,8 +5145,8 @@ def chipsec(toolns, tool, prd, ptd, erc):
         rc = chipsec_spi_info(toolns, tool, prd, ptd, erc)
     elif toolns == 'chipsec_ucode_id':
         rc = chipsec_ucode_id(toolns, tool, prd, ptd, erc)
-#    elif toolns == 'chipsec_uefi_decode':
-#        rc = chipsec_uefi_decode(toolns, tool, prd, ptd, erc, get_tool_arg(toolns, 'rom_bin_file'))
+    elif toolns == 'chipsec_uefi_decode':
+        rc = chipsec_uefi_decode(toolns, tool, prd, ptd, erc, get_tool_input(ptd, 'rom.bin'))
     elif toolns == 'chipsec_uefi_nvram_auth':
         rc = chipsec_uefi_nvram_auth(toolns, tool, prd, ptd, erc)
     elif toolns == 'chipsec_uefi_nvram':
@@ -4097,29 +5285,28 @@ def chipsec_test_spi_lock(toolns, tool, prd, ptd, erc):
 
 
 def chipsec_uefi_blacklist(toolns, tool, prd, ptd, erc, rom_bin):
-    '''Call chipsec_main -i -n -m tools.uefi.blacklist -a uefi.rom,blacklist.json
+    '''Call chipsec_main -i -n -m tools.uefi.blacklist -a rom.bin,blacklist.json
 
     The offline version of chipsec_uefi_blacklist uses an existing rom.bin,
     previously generated by a live tool, and checks it against blacklist.
-    We don't use the online version. Instead, call chipsec_util SPI Dump
-    to gather the live rom.bin, the pass it to this offline code.
+    We don't use the online version. Instead, chipsec_spi_dump gathers
+    the live rom.bin, which is then passed to this offline code.
 
-    rom_bin -- name of rom.bin file this function creates.
+    rom_bin -- path of rom.bin file to check, see consumes in TOOLS.
     '''
     # XXX pass 'blacklist.json' file as arg, don't hardcode.
     # XXX Enable way for user to specify their own custom blacklist file.
     # XXX check if chipsec's blacklist file exists. Where?
     # XXX check if any user-specifed blacklist files exist.
-    warning('SLOW, calling SPI Dump..')
     blacklist_file = 'blacklist.json'
     if is_none_or_null(rom_bin):
         error('no rom.bin file, needed by blacklist tool')
-        # XXX enable live use of blacklist, which creates it's own rom.bin.
         return 1
     if fail_if_missing('chipsec_uefi_blacklist_offline', rom_bin):
         return 1
     info('Executing ' + toolns + ' variation of tool: ' + tool)
-    cmd = ['python', '-i', '-m', 'chipsec_main', '-i', '-n', '-m', 'tools.uefi.blacklist', '-a', ',' + blacklist_file]
+    cmd = ['python', '-i', '-m', 'chipsec_main', '-i', '-n', '-m', 'tools.uefi.blacklist',
+           '-a', rom_bin + ',' + blacklist_file]
     return spawn_process(cmd, ptd, erc, toolns)
 
 
@@ -4198,7 +5385,7 @@ def chipsec_decode(toolns, tool, prd, ptd, erc, fw_type, spi_bin):
     # XXX append ' ' + fw_type suffix, if specified
     # XXX need a list of valid NVRAM types (static or dynamic)?
     # XXX validate input/output file
-    if not path_exists(spi_bin):
+    if is_none_or_null(spi_bin) or not path_exists(spi_bin):
         error('Decode failed, file "' + spi_bin + '" missing')
         return 1
     info('Executing ' + toolns + ' variation of tool: ' + tool)
@@ -4372,15 +5559,14 @@ def chipsec_uefi_var_list(toolns, tool, prd, ptd, erc):
 
 
 def chipsec_uefi_decode(toolns, tool, prd, ptd, erc, rom_bin):
-    '''Call chipsec_util uefi decode uefi.rom [fw_type]'''
+    '''Call chipsec_util uefi decode rom.bin [fw_type]'''
     # XXX validate input/output file
     # Need FW_TYPE input
-    filename = 'uefi.rom'
-    if fail_if_missing('chipsec_util uefi decode', filename):
-        error('File ' + filename + ' missing, skipping')
+    if is_none_or_null(rom_bin) or fail_if_missing('chipsec_util uefi decode', rom_bin):
+        error('File rom.bin missing, skipping')
         return 1  # XXX  mark as SKIPPED
     info('Executing ' + toolns + ' variation of tool: ' + tool)
-    cmd = ['python', '-i', '-m', 'chipsec_util', 'uefi', 'decode', filename]
+    cmd = ['python', '-i', '-m', 'chipsec_util', 'uefi', 'decode', rom_bin]
     return spawn_process(cmd, ptd, erc, toolns)
 
 
@@ -4439,21 +5625,640 @@ def chipsec_uefi_nvram_auth(toolns, tool, prd, ptd, erc):
 #####################################################################
 
 # acpica-tools.py
-# XXX acpixtract()
+#
+# acpidump -b writes one binary <sig>.dat file per ACPI table, which is
+# what the acpi_tables.py index and --diff_acpi use. acpixtract can't
+# read those, it needs acpidump's text (hex dump) output, so acpidump_text
+# saves that as the acpidump.out artifact. acpixtract extracts the tables
+# from it, offline, either from this run or, with --artifact, from an
+# archived PRD. acpixtract_batch runs acpixtract on the acpidump.out of
+# every PRD in a PD (eg, one collected from a fleet of hosts), up to
+# --jobs at a time, one subdirectory of its PTD per source PRD.
+
+ACPIXTRACT_BATCH_FILENAME = 'acpixtract_batch.json'
 
 
 def acpidump(toolns, tool, prd, ptd, erc):
     '''Run live command: 'acpidump'.
 
     Generates multiple <XXXX>.dat files, one per each ACPI table on target
-    system. Use acpixtract to do offline analysis of these generated files.
+    system, or for acpidump_text, the acpidump.out text dump, which
+    acpixtract uses as input.
+    '''
+    info('Executing ' + toolns + ' variation of tool: ' + tool)
+    if toolns == 'acpidump_text':
+        cmd = [tool, '-o', 'acpidump.out']
+    else:
+        cmd = [tool, '-z', '-b']
+    return spawn_process(cmd, ptd, erc, toolns)
+
+
+def acpixtract(toolns, tool, prd, ptd, erc):
+    '''Run offline command: 'acpixtract -a acpidump.out'.
+
+    Generates one <sig>.dat file per ACPI table in acpidump.out, in ptd.
     '''
-    # XXX Remove -b, so acpiextract can input them?
     info('Executing ' + toolns + ' variation of tool: ' + tool)
-    cmd = [tool, '-z', '-b']
+    if toolns == 'acpixtract_batch':
+        return acpixtract_batch(toolns, tool, prd, ptd, erc)
+    path = get_tool_input(ptd, 'acpidump.out')
+    if path is None:
+        error('No acpidump.out input in: ' + ptd)
+        return -1
+    cmd = [tool, '-a', path]
     return spawn_process(cmd, ptd, erc, toolns)
 
 
+def acpixtract_batch(toolns, tool, prd, ptd, erc):
+    '''Run acpixtract on each acpidump.out archived in a PD.
+
+    The PD is --acpixtract_batch, else the output directory. Each source
+    PRD's tables are extracted into ptd/<PRD name>/, and the list of
+    sources and their rc is saved in acpixtract_batch.json.
+
+    Returns count of sources acpixtract failed on, 0 if none.
+    '''
+    pd = get_tool_arg(toolns, 'batch_pd')
+    if pd is None:
+        pd = app_state['output_dir']
+    if not dir_exists(pd):
+        error('Batch directory does not exist: ' + str(pd))
+        return -1
+    sources = find_acpidump_outputs(pd, prd)
+    if len(sources) == 0:
+        warning('No acpidump.out found in any PRD of: ' + pd)
+    work = queue.Queue()
+    for (name, path) in sources:
+        job_dir = os.path.join(ptd, name)
+        try:
+            os.mkdir(job_dir)
+        except OSError as e:
+            critical(e, 'Unable to create batch directory: ' + job_dir)
+            sys.exc_info()
+            return -1
+        work.put((name, path, job_dir))
+    results = {}
+    threads = []
+    for i in range(min(app_state['jobs'], len(sources))):
+        t = threading.Thread(target=acpixtract_batch_worker,
+                             args=(toolns, tool, erc, work, results))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    failed = 0
+    jobs = []
+    for (name, path) in sources:
+        rc = results.get(name, -1)
+        if rc != erc:
+            failed += 1
+        jobs.append({'prd': name, 'source': path, 'rc': rc})
+    merge_batch_rusage(toolns, sources)
+    log(toolns + ': ' + str(len(sources)) + ' source(s), ' + str(failed) + ' failed')
+    batch = {
+        'toolns': toolns,
+        'pd': os.path.abspath(pd),
+        'count': len(sources),
+        'failed': failed,
+        'jobs': jobs,
+    }
+    if not save_json_file(os.path.join(ptd, ACPIXTRACT_BATCH_FILENAME), batch):
+        return -1
+    return failed
+
+
+def acpixtract_batch_worker(toolns, tool, erc, work, results):
+    '''Thread body of acpixtract_batch(), run jobs until none left.'''
+    while True:
+        try:
+            (name, path, job_dir) = work.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            results[name] = spawn_process([tool, '-a', path], job_dir, erc,
+                                          toolns + '.' + name, show_stdio=False)
+        except Exception as e:
+            critical(e, 'Unexpected exception running ' + tool + ' on: ' + path)
+            sys.exc_info()
+            results[name] = -1
+
+
+def find_acpidump_outputs(pd, prd):
+    '''Returns list of (PRD name, path) of acpidump.out in each PRD of pd.
+
+    The current PRD (prd) is skipped. Only the first acpidump.out of a
+    PRD is used.
+    '''
+    sources = []
+    try:
+        names = sorted(os.listdir(pd))
+    except OSError as e:
+        critical(e, 'Unable to list directory: ' + pd)
+        sys.exc_info()
+        return sources
+    current = os.path.abspath(prd)
+    for name in names:
+        path = os.path.join(pd, name)
+        if (not os.path.isdir(path)) or (os.path.abspath(path) == current):
+            continue
+        try:
+            subdirs = sorted(os.listdir(path))
+        except OSError as e:
+            warning('Skipping unreadable directory: ' + path + ': ' + str(e))
+            sys.exc_info()
+            continue
+        for d in subdirs:
+            candidate = os.path.join(path, d, 'acpidump.out')
+            if os.path.isfile(candidate):
+                sources.append((name, os.path.abspath(candidate)))
+                break
+    debug('Found ' + str(len(sources)) + ' acpidump.out source(s) in: ' + pd)
+    return sources
+
+
+def merge_batch_rusage(toolns, sources):
+    '''Replace the batch jobs' resource usage with a total for toolns.
+
+    Seconds, block I/O and context switches are summed; max_rss is the
+    largest of any one job.
+    '''
+    total = None
+    for (name, path) in sources:
+        usage = app_state['tool_rusage'].pop(toolns + '.' + name, None)
+        if usage is None:
+            continue
+        if total is None:
+            total = dict(usage)
+            continue
+        for key in usage:
+            if key == 'max_rss':
+                total[key] = max(total[key], usage[key])
+            else:
+                total[key] += usage[key]
+    if total is not None:
+        app_state['tool_rusage'][toolns] = total
+
+
+def index_acpixtract_batch(ptd, toolns):
+    '''Index the ACPI tables of each source PRD of an acpixtract_batch.
+
+    Returns True if all were indexed, False if not.
+    '''
+    status = True
+    for name in sorted(os.listdir(ptd)):
+        path = os.path.join(ptd, name)
+        if os.path.isdir(path) and not index_acpi_tables(path, toolns):
+            status = False
+    return status
+
+#####################################################################
+
+# acpi_tables.py
+#
+# In-process parser for the binary ACPI tables that 'acpidump -b' leaves
+# in its PTD (<sig><n>.dat, eg dsdt.dat, ssdt2.dat, rsdp.dat). Each file
+# is memory-mapped, and only its header is decoded: signature, length,
+# revision, OEM ID, OEM table ID, OEM revision, creator ID and revision.
+# The checksum and SHA256 are computed from the mapping, a chunk at a
+# time. AML bodies are not decoded. The result is acpi_index.json in the
+# PTD, so table-level comparisons don't need to reopen every table.
+
+ACPI_INDEX_FILENAME = 'acpi_index.json'
+ACPI_TABLE_SUFFIX = '.dat'
+ACPI_HEADER_FORMAT = '<4sIBB6s8sI4sI'
+ACPI_HEADER_LENGTH = 36
+ACPI_RSDP_SIGNATURE = b'RSD PTR '
+ACPI_RSDP_V1_LENGTH = 20
+ACPI_CHECKSUM_CHUNK = 64 * 1024
+
+
+def acpi_string(raw):
+    '''Returns ACPI header bytes field as a string, NUL/space-trimmed.'''
+    return raw.decode('ascii', 'replace').rstrip('\x00 ')
+
+
+def acpi_checksum(mm, length):
+    '''Returns (sum of first length bytes of mm) mod 256.'''
+    total = 0
+    offset = 0
+    while offset < length:
+        end = min(offset + ACPI_CHECKSUM_CHUNK, length)
+        total += sum(bytearray(mm[offset:end]))
+        offset = end
+    return total % 256
+
+
+def acpi_sha256(mm, length):
+    '''Returns SHA256 hash string of first length bytes of mm.'''
+    import hashlib
+    h = hashlib.sha256()
+    offset = 0
+    while offset < length:
+        end = min(offset + ACPI_CHECKSUM_CHUNK, length)
+        h.update(mm[offset:end])
+        offset = end
+    return h.hexdigest()
+
+
+def expected_acpi_signature(filename):
+    '''Returns table signature implied by acpidump filename, eg 'SSDT'.'''
+    # acpidump appends an instance number after the 4-character signature,
+    # eg ssdt1.dat, and names the FADT 'facp', and the RSDP 'rsdp'.
+    name = filename[:-len(ACPI_TABLE_SUFFIX)][:4].upper()
+    if name == 'RSDP':
+        return 'RSD PTR '
+    return name
+
+
+def parse_acpi_rsdp(entry, mm, size):
+    '''Fill in index entry for the RSDP, which has no standard header.'''
+    if size < ACPI_RSDP_V1_LENGTH:
+        entry['errors'].append('truncated RSDP')
+        return
+    (_, checksum, oem_id, revision) = struct.unpack('<8sB6sB', mm[0:16])
+    entry['checksum'] = checksum
+    entry['oem_id'] = acpi_string(oem_id)
+    entry['revision'] = revision
+    entry['length'] = ACPI_RSDP_V1_LENGTH
+    entry['checksum_valid'] = (acpi_checksum(mm, ACPI_RSDP_V1_LENGTH) == 0)
+    if (revision >= 2) and (size >= 36):
+        # ACPI 2.0+: length, and an extended checksum over all of it.
+        (length,) = struct.unpack('<I', mm[20:24])
+        entry['length'] = length
+        if length > size:
+            entry['errors'].append('length exceeds file size')
+            entry['checksum_valid'] = False
+        elif acpi_checksum(mm, length) != 0:
+            entry['checksum_valid'] = False
+    if not entry['checksum_valid']:
+        entry['errors'].append('bad checksum')
+
+
+def parse_acpi_header(entry, mm, size):
+    '''Fill in index entry from the standard 36-byte ACPI table header.'''
+    if entry['signature'] == 'FACS':
+        # The FACS has a signature and length, but no checksum.
+        if size < 8:
+            entry['errors'].append('truncated FACS')
+            return
+        (length,) = struct.unpack('<I', mm[4:8])
+        entry['length'] = length
+        if length > size:
+            entry['errors'].append('length exceeds file size')
+        return
+    if size < ACPI_HEADER_LENGTH:
+        entry['errors'].append('truncated header')
+        return
+    (_, length, revision, checksum, oem_id, oem_table_id, oem_revision,
+     creator_id, creator_revision) = struct.unpack(ACPI_HEADER_FORMAT, mm[0:ACPI_HEADER_LENGTH])
+    entry['length'] = length
+    entry['revision'] = revision
+    entry['checksum'] = checksum
+    entry['oem_id'] = acpi_string(oem_id)
+    entry['oem_table_id'] = acpi_string(oem_table_id)
+    entry['oem_revision'] = oem_revision
+    entry['creator_id'] = acpi_string(creator_id)
+    entry['creator_revision'] = creator_revision
+    if length < ACPI_HEADER_LENGTH:
+        entry['errors'].append('length shorter than header')
+        return
+    if length > size:
+        entry['errors'].append('length exceeds file size')
+        return
+    entry['checksum_valid'] = (acpi_checksum(mm, length) == 0)
+    if not entry['checksum_valid']:
+        entry['errors'].append('bad checksum')
+
+
+def parse_acpi_table_file(path):
+    '''Parse the header of one binary ACPI table file.
+
+    Returns an index entry dict. entry['errors'] lists problems found,
+    it is empty if the table is valid.
+    '''
+    filename = os.path.basename(path)
+    entry = {
+        'file': filename,
+        'file_size': 0,
+        'signature': None,
+        'length': None,
+        'revision': None,
+        'checksum': None,
+        'checksum_valid': None,
+        'oem_id': None,
+        'oem_table_id': None,
+        'oem_revision': None,
+        'creator_id': None,
+        'creator_revision': None,
+        'sha256': None,
+        'errors': [],
+    }
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            entry['file_size'] = size
+            if size < 4:
+                entry['errors'].append('file too short for signature')
+                return entry
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if mm[0:8] == ACPI_RSDP_SIGNATURE:
+                    entry['signature'] = acpi_string(mm[0:8])
+                    parse_acpi_rsdp(entry, mm, size)
+                else:
+                    entry['signature'] = acpi_string(mm[0:4])
+                    parse_acpi_header(entry, mm, size)
+                entry['sha256'] = acpi_sha256(mm, size)
+            finally:
+                mm.close()
+    except (IOError, OSError, ValueError, struct.error) as e:
+        critical(e, 'Unable to parse ACPI table: ' + path)
+        sys.exc_info()
+        entry['errors'].append('unreadable')
+        return entry
+    expected = expected_acpi_signature(filename)
+    if entry['signature'] != expected.rstrip():
+        entry['errors'].append('signature ' + str(entry['signature']) +
+                               ' does not match filename')
+    return entry
+
+
+def index_acpi_tables(ptd, toolns):
+    '''Parse the ACPI tables in ptd, and save acpi_index.json there.
+
+    Returns True if successful, False if not.
+    '''
+    try:
+        names = sorted(os.listdir(ptd))
+    except OSError as e:
+        critical(e, 'Unable to list ACPI tables in: ' + ptd)
+        sys.exc_info()
+        return False
+    tables = []
+    invalid = 0
+    for name in names:
+        if not name.lower().endswith(ACPI_TABLE_SUFFIX):
+            continue
+        entry = parse_acpi_table_file(os.path.join(ptd, name))
+        if entry['errors']:
+            invalid += 1
+            warning('ACPI table ' + name + ': ' + ', '.join(entry['errors']))
+        tables.append(entry)
+    index = {
+        'toolns': toolns,
+        'count': len(tables),
+        'invalid': invalid,
+        'tables': tables,
+    }
+    info('Indexed ' + str(len(tables)) + ' ACPI table(s), ' + str(invalid) + ' invalid')
+    return save_json_file(os.path.join(ptd, ACPI_INDEX_FILENAME), index)
+
+
+#####################################################################
+
+# acpi_diff.py
+#
+# --diff_acpi A B compares the ACPI tables of two runs, eg before and
+# after a firmware update. A and B are PRDs (or acpidump/acpixtract PTDs,
+# or any directory of .dat files, eg one host of an acpixtract_batch). Headers and SHA256s come from
+# acpi_index.json, if present, else from parsing the table headers, so
+# identical tables are never read in full. Tables are first matched by
+# SHA256 (so renumbered but identical SSDTs are unchanged), then by
+# signature and OEM table ID, then by file name. Only tables which
+# differ are byte-compared, and disassembled with iasl, if in PATH,
+# showing the disassembly diff if --verbose.
+
+ACPI_DIFF_HEADER_FIELDS = ('length', 'revision', 'oem_id', 'oem_table_id', 'oem_revision',
+                           'creator_id', 'creator_revision')
+ACPI_DIFF_CHUNK = 1024 * 1024
+
+
+def find_acpi_table_dir(path):
+    '''Returns dir of ACPI tables, given a PRD or table dir, or None.'''
+    if not dir_exists(path):
+        return None
+    for d in (path, os.path.join(path, 'acpidump'), os.path.join(path, 'acpixtract'),
+              os.path.join(path, 'fwts_acpi_dump')):
+        if not dir_exists(d):
+            continue
+        if path_exists(os.path.join(d, ACPI_INDEX_FILENAME)):
+            return d
+        for name in os.listdir(d):
+            if name.lower().endswith(ACPI_TABLE_SUFFIX):
+                return d
+    return None
+
+
+def load_acpi_index(table_dir):
+    '''Returns list of index entries of tables in table_dir.
+
+    Uses acpi_index.json if present, else parses the table headers.
+    '''
+    path = os.path.join(table_dir, ACPI_INDEX_FILENAME)
+    if path_exists(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)['tables']
+        except (IOError, OSError, ValueError, KeyError) as e:
+            warning('Ignoring unreadable ' + path + ': ' + str(e))
+            sys.exc_info()
+    tables = []
+    for name in sorted(os.listdir(table_dir)):
+        if name.lower().endswith(ACPI_TABLE_SUFFIX):
+            tables.append(parse_acpi_table_file(os.path.join(table_dir, name)))
+    return tables
+
+
+def get_acpi_table_key(entry):
+    '''Returns (signature, OEM table ID) of an index entry.'''
+    return (entry['signature'], entry['oem_table_id'])
+
+
+def match_acpi_tables(tables_a, tables_b):
+    '''Pair up tables of two runs.
+
+    Returns tuple of (pairs, removed, added), where pairs is a list of
+    (entry_a, entry_b), removed are only in A, added only in B.
+    '''
+    pairs = []
+    remaining_a = list(tables_a)
+    remaining_b = list(tables_b)
+    # Pass 1: identical content, pass 2: same signature and OEM table ID,
+    # pass 3: same file name.
+    for key_func in ('sha256', 'key', 'file'):
+        unmatched_a = []
+        for a in remaining_a:
+            match = None
+            for b in remaining_b:
+                if key_func == 'key':
+                    same = ((a['signature'] is not None) and
+                            (get_acpi_table_key(a) == get_acpi_table_key(b)))
+                else:
+                    same = (a[key_func] is not None) and (a[key_func] == b[key_func])
+                if same:
+                    match = b
+                    break
+            if match is None:
+                unmatched_a.append(a)
+            else:
+                pairs.append((a, match))
+                remaining_b.remove(match)
+        remaining_a = unmatched_a
+    return (pairs, remaining_a, remaining_b)
+
+
+def compare_acpi_table_bytes(path_a, path_b):
+    '''Byte-compare two tables.
+
+    Returns tuple of (first differing offset, count of differing bytes),
+    counting bytes past the end of the shorter table as differing, or
+    (None, None) if either file is unreadable.
+    '''
+    first = None
+    count = 0
+    try:
+        with open(path_a, 'rb') as fa:
+            with open(path_b, 'rb') as fb:
+                offset = 0
+                while True:
+                    chunk_a = bytearray(fa.read(ACPI_DIFF_CHUNK))
+                    chunk_b = bytearray(fb.read(ACPI_DIFF_CHUNK))
+                    if (not chunk_a) and (not chunk_b):
+                        break
+                    if chunk_a != chunk_b:
+                        common = min(len(chunk_a), len(chunk_b))
+                        for i in range(common):
+                            if chunk_a[i] != chunk_b[i]:
+                                count += 1
+                                if first is None:
+                                    first = offset + i
+                        extra = max(len(chunk_a), len(chunk_b)) - common
+                        if (extra > 0) and (first is None):
+                            first = offset + common
+                        count += extra
+                    offset += max(len(chunk_a), len(chunk_b))
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to compare ' + path_a + ' and ' + path_b)
+        sys.exc_info()
+        return (None, None)
+    return (first, count)
+
+
+def disassemble_acpi_table(iasl, path, out_dir, prefix):
+    '''Disassemble table at path with iasl into out_dir.
+
+    Returns list of lines of the disassembly, or None if it failed.
+    '''
+    import subprocess
+    out_prefix = os.path.join(out_dir, prefix)
+    try:
+        with open(os.devnull, 'w') as devnull:
+            rc = subprocess.call([iasl, '-p', out_prefix, '-d', path],
+                                 stdout=devnull, stderr=devnull)
+    except OSError as e:
+        critical(e, 'Unable to run ' + iasl)
+        sys.exc_info()
+        return None
+    dsl_path = out_prefix + '.dsl'
+    if (rc != 0) or not path_exists(dsl_path):
+        warning('iasl was unable to disassemble: ' + path)
+        return None
+    with open(dsl_path, 'r') as f:
+        lines = f.readlines()
+    # Skip iasl's comment header, it has the file name and date.
+    for i, line in enumerate(lines):
+        if not (line.startswith('/*') or line.startswith(' *') or line.strip() == ''):
+            return lines[i:]
+    return lines
+
+
+def diff_acpi_disassembly(iasl, temp_dir, path_a, path_b):
+    '''Returns list of unified diff lines of the disassemblies, or None.'''
+    import difflib
+    name_a = os.path.basename(path_a)[:-len(ACPI_TABLE_SUFFIX)]
+    name_b = os.path.basename(path_b)[:-len(ACPI_TABLE_SUFFIX)]
+    lines_a = disassemble_acpi_table(iasl, path_a, temp_dir, 'a_' + name_a)
+    lines_b = disassemble_acpi_table(iasl, path_b, temp_dir, 'b_' + name_b)
+    if (lines_a is None) or (lines_b is None):
+        return None
+    return list(difflib.unified_diff(lines_a, lines_b, 'A/' + name_a + '.dsl', 'B/' + name_b + '.dsl'))
+
+
+def diff_acpi(path_a, path_b):
+    '''Compare ACPI tables of two runs, for --diff_acpi.
+
+    Returns 0 if no tables differ, 1 if any do, 2 if unable to compare.
+    '''
+    import shutil
+    import tempfile
+    dir_a = find_acpi_table_dir(path_a)
+    dir_b = find_acpi_table_dir(path_b)
+    for (path, table_dir) in ((path_a, dir_a), (path_b, dir_b)):
+        if table_dir is None:
+            error('No ACPI tables (acpidump -b output) found in: ' + path)
+            return 2
+    start = monotonic_seconds()
+    (pairs, removed, added) = match_acpi_tables(load_acpi_index(dir_a), load_acpi_index(dir_b))
+    iasl = find_executable('iasl', get_path_dirs())
+    temp_dir = None
+    unchanged = 0
+    changed = 0
+    try:
+        for (a, b) in pairs:
+            if (a['sha256'] is not None) and (a['sha256'] == b['sha256']):
+                unchanged += 1
+                if a['file'] != b['file']:
+                    log('renamed   ' + a['file'] + ' -> ' + b['file'])
+                continue
+            changed += 1
+            name = a['file']
+            if a['file'] != b['file']:
+                name = a['file'] + ' -> ' + b['file']
+            fields = []
+            for field in ACPI_DIFF_HEADER_FIELDS:
+                if a.get(field) != b.get(field):
+                    fields.append(field + ' ' + str(a.get(field)) + ' -> ' + str(b.get(field)))
+            path_ta = os.path.join(dir_a, a['file'])
+            path_tb = os.path.join(dir_b, b['file'])
+            (first, count) = compare_acpi_table_bytes(path_ta, path_tb)
+            if first is not None:
+                fields.append(str(count) + ' byte(s) differ, first at offset 0x%x' % first)
+            log('changed   ' + name + ': ' + '; '.join(fields))
+            if iasl is None:
+                continue
+            if temp_dir is None:
+                temp_dir = tempfile.mkdtemp(prefix='fwaudit.acpidiff.')
+            diff = diff_acpi_disassembly(iasl, temp_dir, path_ta, path_tb)
+            if diff is not None:
+                removed_lines = 0
+                added_lines = 0
+                for line in diff:
+                    if line.startswith('-') and not line.startswith('---'):
+                        removed_lines += 1
+                    elif line.startswith('+') and not line.startswith('+++'):
+                        added_lines += 1
+                log('          disassembly: -' + str(removed_lines) + ' +' + str(added_lines) + ' line(s)')
+                if app_state['verbose']:
+                    output(''.join(diff))
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    for entry in removed:
+        log('removed   ' + entry['file'] + ' (' + str(entry['signature']) + ' ' +
+            str(entry['oem_table_id']) + ')')
+    for entry in added:
+        log('added     ' + entry['file'] + ' (' + str(entry['signature']) + ' ' +
+            str(entry['oem_table_id']) + ')')
+    log('ACPI diff: %d unchanged, %d changed, %d removed, %d added, in %.3fs' %
+        (unchanged, changed, len(removed), len(added), monotonic_seconds() - start))
+    if iasl is None and changed > 0:
+        info('iasl not found in PATH, not disassembling changed tables')
+    if changed or removed or added:
+        return 1
+    return 0
+
+
 #####################################################################
 
 # dmidecode.py
@@ -4471,24 +6276,25 @@ def dmidecode(toolns, tool, prd, ptd, erc):
     # elif toolns == 'dmidecode_get_help':
     #     rc = dmidecode_get_help(toolns, tool, prd, ptd, erc)
     if toolns == 'dmidecode_decode':
-        rc = dmidecode_decode(toolns, tool, prd, ptd, erc)
+        rc = dmidecode_decode(toolns, tool, prd, ptd, erc, get_tool_input(ptd, 'dmidecode.bin'))
     elif toolns == 'dmidecode_dump':
         rc = dmidecode_dump(toolns, tool, prd, ptd, erc)
-        # get_tool_arg(toolns, 'dmidecode_bin_file'))
     else:
         error(tool + ' resolver: no entry found for: ' + toolns)
         return -1
     return rc
 
 
-def dmidecode_decode(toolns, tool, prd, ptd, erc):
-    '''Run 'dmidecode' offline command.'''
-    filename = 'dmidecode.bin'
+def dmidecode_decode(toolns, tool, prd, ptd, erc, dmidecode_bin):
+    '''Run 'dmidecode' offline command.
+
+    dmidecode_bin -- path of dmidecode.bin file, see consumes in TOOLS.
+    '''
     info('Executing ' + toolns + ' variation of tool: ' + tool)
-    if not is_none_or_null(filename):
+    if is_none_or_null(dmidecode_bin):
         error('dmidecode_bin_file not specified')
         return -1  # XXX generate exception
-    cmd = [tool, '-from-dump', filename]
+    cmd = [tool, '--from-dump', dmidecode_bin]
     return spawn_process(cmd, ptd, erc, toolns)
 
 
@@ -4496,10 +6302,320 @@ def dmidecode_dump(toolns, tool, prd, ptd, erc):
     '''Run 'dmidecode' live command.'''
     filename = 'dmidecode.bin'
     info('Executing ' + toolns + ' variation of tool: ' + tool)
-    cmd = [tool, '-dump-bin', filename]
+    cmd = [tool, '--dump-bin', filename]
     return spawn_process(cmd, ptd, erc, toolns)
 
 
+#####################################################################
+
+# smbios.py
+#
+# In-process decoder for the SMBIOS (DMI) data that 'dmidecode --dump-bin'
+# saves as dmidecode.bin: the entry point (_SM3_, _SM_ or legacy _DMI_) at
+# offset 0, and the structure table at offset 32. Types 0 (BIOS),
+# 1 (system), 2 (baseboard), 3 (chassis), 4 (processor) and 17 (memory
+# device) are decoded, in one pass over the table, into
+# smbios_inventory.json in the PTD; other types are only counted. Use
+# dmidecode_decode for dmidecode's full text output.
+
+SMBIOS_INVENTORY_FILENAME = 'smbios_inventory.json'
+SMBIOS_DUMP_FILENAME = 'dmidecode.bin'
+SMBIOS_DUMP_TABLE_OFFSET = 32
+SMBIOS_END_OF_TABLE = 127
+SMBIOS_MEMORY_TYPES = {
+    0x12: 'DDR',
+    0x13: 'DDR2',
+    0x18: 'DDR3',
+    0x1A: 'DDR4',
+    0x1B: 'LPDDR',
+    0x1C: 'LPDDR2',
+    0x1D: 'LPDDR3',
+    0x1E: 'LPDDR4',
+    0x22: 'DDR5',
+    0x23: 'LPDDR5',
+}
+
+
+def decode_smbios_entry_point(data):
+    '''Decode an SMBIOS entry point.
+
+    Returns a dict of anchor, version (tuple of major, minor),
+    table_address, table_length and structure_count (None for _SM3_,
+    which only gives a maximum table length), or None if data is not a
+    known entry point.
+    '''
+    data = bytes(data)
+    if (data[0:5] == b'_SM3_') and (len(data) >= 24):
+        (major, minor, length, address) = struct.unpack_from('<BBxxxIQ', data, 7)
+        return {'anchor': '_SM3_', 'version': (major, minor), 'table_address': address,
+                'table_length': length, 'structure_count': None}
+    if (data[0:4] == b'_SM_') and (len(data) >= 31):
+        (major, minor) = struct.unpack_from('<BB', data, 6)
+        (length, address, count) = struct.unpack_from('<HIH', data, 22)
+        return {'anchor': '_SM_', 'version': (major, minor), 'table_address': address,
+                'table_length': length, 'structure_count': count}
+    if (data[0:5] == b'_DMI_') and (len(data) >= 15):
+        (length, address, count, bcd) = struct.unpack_from('<HIHB', data, 6)
+        return {'anchor': '_DMI_', 'version': (bcd >> 4, bcd & 0x0F), 'table_address': address,
+                'table_length': length, 'structure_count': count}
+    return None
+
+
+def smbios_field(formatted, offset, size):
+    '''Returns little-endian integer field of a structure, or None if absent.'''
+    if offset + size > len(formatted):
+        return None
+    value = 0
+    for i in range(size - 1, -1, -1):
+        value = (value << 8) | formatted[offset + i]
+    return value
+
+
+def smbios_string(formatted, strings, offset):
+    '''Returns string referenced by the byte at offset, or None.'''
+    n = smbios_field(formatted, offset, 1)
+    if (n is None) or (n == 0) or (n > len(strings)):
+        return None
+    return strings[n - 1].decode('ascii', 'replace').strip()
+
+
+def smbios_uuid(formatted, offset, version):
+    '''Returns system UUID string, or None if not present or not set.
+
+    Since SMBIOS 2.6, the first three fields are little-endian.
+    '''
+    raw = bytearray(formatted[offset:offset + 16])
+    if len(raw) < 16:
+        return None
+    if (raw == bytearray(b'\xff' * 16)) or (raw == bytearray(16)):
+        return None
+    if version >= (2, 6):
+        for (start, end) in ((0, 4), (4, 6), (6, 8)):
+            raw[start:end] = raw[start:end][::-1]
+    digits = ''
+    for b in raw:
+        digits += '%02X' % b
+    return '-'.join((digits[0:8], digits[8:12], digits[12:16], digits[16:20], digits[20:32]))
+
+
+def decode_smbios_bios(f, strings):
+    '''Returns dict of a type 0 (BIOS information) structure.'''
+    bios = {
+        'vendor': smbios_string(f, strings, 0x04),
+        'version': smbios_string(f, strings, 0x05),
+        'release_date': smbios_string(f, strings, 0x08),
+        'rom_size': None,
+        'release': None,
+    }
+    rom_size = smbios_field(f, 0x09, 1)
+    if (rom_size is not None) and (rom_size != 0xFF):
+        bios['rom_size'] = (rom_size + 1) * 64 * 1024
+    major = smbios_field(f, 0x14, 1)
+    minor = smbios_field(f, 0x15, 1)
+    if (major is not None) and (minor is not None) and (major != 0xFF):
+        bios['release'] = str(major) + '.' + str(minor)
+    return bios
+
+
+def decode_smbios_system(f, strings, version):
+    '''Returns dict of a type 1 (system information) structure.'''
+    return {
+        'manufacturer': smbios_string(f, strings, 0x04),
+        'product': smbios_string(f, strings, 0x05),
+        'version': smbios_string(f, strings, 0x06),
+        'serial': smbios_string(f, strings, 0x07),
+        'uuid': smbios_uuid(f, 0x08, version),
+        'sku': smbios_string(f, strings, 0x19),
+        'family': smbios_string(f, strings, 0x1A),
+    }
+
+
+def decode_smbios_baseboard(f, strings):
+    '''Returns dict of a type 2 (baseboard information) structure.'''
+    return {
+        'manufacturer': smbios_string(f, strings, 0x04),
+        'product': smbios_string(f, strings, 0x05),
+        'version': smbios_string(f, strings, 0x06),
+        'serial': smbios_string(f, strings, 0x07),
+        'asset_tag': smbios_string(f, strings, 0x08),
+    }
+
+
+def decode_smbios_chassis(f, strings):
+    '''Returns dict of a type 3 (system enclosure) structure.'''
+    chassis_type = smbios_field(f, 0x05, 1)
+    if chassis_type is not None:
+        chassis_type &= 0x7F
+    return {
+        'manufacturer': smbios_string(f, strings, 0x04),
+        'type': chassis_type,
+        'version': smbios_string(f, strings, 0x06),
+        'serial': smbios_string(f, strings, 0x07),
+        'asset_tag': smbios_string(f, strings, 0x08),
+    }
+
+
+def decode_smbios_processor(f, strings):
+    '''Returns dict of a type 4 (processor information) structure.'''
+    signature = smbios_field(f, 0x08, 4)
+    if signature is not None:
+        signature = '0x%08x' % signature
+    populated = smbios_field(f, 0x18, 1)
+    if populated is not None:
+        populated = bool(populated & 0x40)
+    return {
+        'socket': smbios_string(f, strings, 0x04),
+        'family': smbios_field(f, 0x06, 1),
+        'manufacturer': smbios_string(f, strings, 0x07),
+        'signature': signature,
+        'version': smbios_string(f, strings, 0x10),
+        'max_speed_mhz': smbios_field(f, 0x14, 2),
+        'current_speed_mhz': smbios_field(f, 0x16, 2),
+        'populated': populated,
+        'cores': smbios_field(f, 0x23, 1),
+        'threads': smbios_field(f, 0x25, 1),
+    }
+
+
+def decode_smbios_memory_device(f, strings):
+    '''Returns dict of a type 17 (memory device) structure.
+
+    size is in bytes, 0 if no module is installed, None if unknown.
+    '''
+    size = smbios_field(f, 0x0C, 2)
+    if size == 0xFFFF:
+        size = None
+    elif size == 0x7FFF:
+        size = smbios_field(f, 0x1C, 4)
+        if size is not None:
+            size = (size & 0x7FFFFFFF) * 1024 * 1024
+    elif size is not None:
+        if size & 0x8000:
+            size = (size & 0x7FFF) * 1024
+        else:
+            size = size * 1024 * 1024
+    memory_type = smbios_field(f, 0x12, 1)
+    return {
+        'locator': smbios_string(f, strings, 0x10),
+        'bank_locator': smbios_string(f, strings, 0x11),
+        'size': size,
+        'type': SMBIOS_MEMORY_TYPES.get(memory_type, memory_type),
+        'speed_mts': smbios_field(f, 0x15, 2),
+        'manufacturer': smbios_string(f, strings, 0x17),
+        'serial': smbios_string(f, strings, 0x18),
+        'part_number': smbios_string(f, strings, 0x1A),
+    }
+
+
+def decode_smbios(entry_data, table_data):
+    '''Decode an SMBIOS entry point and structure table into an inventory.
+
+    entry_data -- bytes of the entry point.
+    table_data -- bytes of the structure table.
+
+    Returns an inventory dict. inventory['errors'] lists problems found,
+    it is empty if the whole table was decoded.
+    '''
+    inventory = {
+        'entry_point': None,
+        'version': None,
+        'structure_count': 0,
+        'type_counts': {},
+        'bios': None,
+        'system': None,
+        'baseboards': [],
+        'chassis': [],
+        'processors': [],
+        'memory_devices': [],
+        'memory_total': 0,
+        'errors': [],
+    }
+    entry = decode_smbios_entry_point(entry_data)
+    if entry is None:
+        inventory['errors'].append('no SMBIOS entry point')
+        return inventory
+    inventory['entry_point'] = entry['anchor']
+    inventory['version'] = str(entry['version'][0]) + '.' + str(entry['version'][1])
+    table = bytearray(table_data[0:entry['table_length']])
+    if len(table) < entry['table_length']:
+        inventory['errors'].append('table truncated at ' + str(len(table)) + ' bytes')
+    counts = inventory['type_counts']
+    offset = 0
+    while offset + 4 <= len(table):
+        if inventory['structure_count'] == entry['structure_count']:
+            break
+        stype = table[offset]
+        length = table[offset + 1]
+        if (length < 4) or (offset + length > len(table)):
+            inventory['errors'].append('invalid structure length at offset ' + str(offset))
+            break
+        f = table[offset:offset + length]
+        end = table.find(b'\x00\x00', offset + length)
+        if end < 0:
+            inventory['errors'].append('unterminated strings at offset ' + str(offset))
+            break
+        strings = []
+        if end > offset + length:
+            strings = table[offset + length:end].split(b'\x00')
+        offset = end + 2
+        inventory['structure_count'] += 1
+        counts[str(stype)] = counts.get(str(stype), 0) + 1
+        if stype == 0 and inventory['bios'] is None:
+            inventory['bios'] = decode_smbios_bios(f, strings)
+        elif stype == 1 and inventory['system'] is None:
+            inventory['system'] = decode_smbios_system(f, strings, entry['version'])
+        elif stype == 2:
+            inventory['baseboards'].append(decode_smbios_baseboard(f, strings))
+        elif stype == 3:
+            inventory['chassis'].append(decode_smbios_chassis(f, strings))
+        elif stype == 4:
+            inventory['processors'].append(decode_smbios_processor(f, strings))
+        elif stype == 17:
+            device = decode_smbios_memory_device(f, strings)
+            inventory['memory_devices'].append(device)
+            if device['size']:
+                inventory['memory_total'] += device['size']
+        elif stype == SMBIOS_END_OF_TABLE:
+            break
+    return inventory
+
+
+def parse_smbios_dump(path):
+    '''Decode a dmidecode --dump-bin file, see decode_smbios().'''
+    try:
+        with open(path, 'rb') as f:
+            entry_data = f.read(SMBIOS_DUMP_TABLE_OFFSET)
+            entry = decode_smbios_entry_point(entry_data)
+            table_data = b''
+            if entry is not None:
+                table_data = f.read(entry['table_length'])
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to read SMBIOS dump: ' + path)
+        sys.exc_info()
+        inventory = decode_smbios(b'', b'')
+        inventory['errors'] = ['unreadable']
+        return inventory
+    return decode_smbios(entry_data, table_data)
+
+
+def index_smbios_inventory(ptd, toolns):
+    '''Decode dmidecode.bin in ptd, and save smbios_inventory.json there.
+
+    Returns True if successful, False if not.
+    '''
+    path = os.path.join(ptd, SMBIOS_DUMP_FILENAME)
+    if not path_exists(path):
+        warning('No ' + SMBIOS_DUMP_FILENAME + ' to decode in: ' + ptd)
+        return False
+    inventory = parse_smbios_dump(path)
+    inventory['toolns'] = toolns
+    for e in inventory['errors']:
+        warning('SMBIOS: ' + e)
+    info('Decoded ' + str(inventory['structure_count']) + ' SMBIOS structure(s), ' +
+         str(len(inventory['memory_devices'])) + ' memory device(s)')
+    return save_json_file(os.path.join(ptd, SMBIOS_INVENTORY_FILENAME), inventory)
+
+
 #####################################################################
 
 # flashrom.py
@@ -4602,6 +6718,8 @@ def fwts(toolns, tool, prd, ptd, erc):
         rc = fwts_esrt(toolns, tool, prd, ptd, erc)
     elif toolns == 'fwts_acpi_tests':
         rc = fwts_acpi_tests(toolns, tool, prd, ptd, erc)
+    elif toolns == 'fwts_acpi_dump':
+        rc = fwts_acpi_dump(toolns, tool, prd, ptd, erc)
     elif toolns == 'fwts_uefi_tests':
         rc = fwts_uefi_tests(toolns, tool, prd, ptd, erc)
     else:
@@ -4714,6 +6832,25 @@ def fwts_acpi_tests(toolns, tool, prd, ptd, erc):
     cmd = [tool, '--acpitests']
     return spawn_process(cmd, ptd, erc, toolns)
 
+
+def fwts_acpi_dump(toolns, tool, prd, ptd, erc):
+    '''Call the FWTS --dump command, which creates acpidump.log.
+
+    acpidump.log is in acpidump's text format, so the tables are then
+    extracted from it with acpixtract, one <sig>.dat file per table, like
+    acpidump -b writes them.
+    '''
+    info('Executing ' + toolns + ' variation of tool: ' + tool)
+    cmd = [tool, '--dump']
+    rc = spawn_process(cmd, ptd, erc, toolns)
+    if rc != erc:
+        return rc
+    path = os.path.join(ptd, 'acpidump.log')
+    if not path_exists(path):
+        error(tool + ' did not create: ' + path)
+        return -1
+    return spawn_process(['acpixtract', '-a', path], ptd, 0, toolns + '.acpixtract')
+
 #####################################################################
 
 # lshw.py
@@ -4756,23 +6893,668 @@ def lspci_vvnn(toolns, tool, prd, ptd, erc):
 
 
 def lspci_xxx(toolns, tool, prd, ptd, erc):
-    '''Run 'lspci' command.'''
+    '''Run 'lspci' command.
+
+    The config space hex dumps are parsed as they are read, see
+    parse_lspci_xxx_line(), and saved like sysfs_pci's, in
+    pci_config.bin and pci_devices.json.
+    '''
     info('Executing ' + toolns + ' variation of tool: ' + tool)
     cmd = [tool, '-xxx']
-    return spawn_process(cmd, ptd, erc, toolns)
+    rc = spawn_process(cmd, ptd, erc, toolns)
+    parsed = app_state['tool_parsed'].get(toolns)
+    if (parsed is not None) and ('pci_records' in parsed['data']):
+        data = parsed.pop('data')
+        configs = []
+        for i, config in enumerate(data['pci_configs']):
+            data['pci_records'][i].update(get_pci_config_ids(config))
+            configs.append(bytes(config))
+        if not save_pci_snapshot(ptd, 'lspci -xxx', data['pci_records'], configs):
+            warning('Unable to save PCI config spaces parsed from: ' + toolns)
+    return rc
 
 
-#####################################################################
+def parse_lspci_xxx_line(state, line):
+    '''Collect config space bytes per device from an lspci -xxx output line.
 
-# intel_amt_discovery.py
+    Device lines ('00:1f.3 Audio device: ...') start a device, and hex
+    dump lines ('40: 01 00 ...') add bytes to its config space. BDFs are
+    given the domain, if lspci omitted it, to match sysfs names.
+    '''
+    data = state['data']
+    if 'pci_records' not in data:
+        data['pci_records'] = []
+        data['pci_configs'] = []
+    (head, sep, rest) = line.partition(': ')
+    if sep and (len(head) in (2, 3)) and (len(data['pci_configs']) > 0):
+        try:
+            offset = int(head, 16)
+            values = bytearray.fromhex(rest.strip())
+        except ValueError:
+            sys.exc_info()
+            return
+        config = data['pci_configs'][-1]
+        if offset == len(config):
+            config.extend(values)
+        return
+    if (line == '') or line[0].isspace():
+        return
+    bdf = line.split(' ', 1)[0]
+    if ('.' not in bdf) or (bdf.count(':') not in (1, 2)):
+        return
+    if bdf.count(':') == 1:
+        bdf = '0000:' + bdf
+    description = None
+    if ' ' in line:
+        description = line.split(' ', 1)[1]
+    data['pci_records'].append({'bdf': bdf, 'description': description})
+    data['pci_configs'].append(bytearray())
 
-# Detect Intel SA-00075 aka: CVE-2017-5689 AMT vulnerability
 
+#####################################################################
 
-def intel_amt_discovery(toolns, tool, prd, ptd, erc):
-    '''Run live command: 'INTEL-SA-00075-Discovery-Tool'.'''
-    if not os_is_linux():
-        error(tool + ' only works on Linux')
+# sysfs.py
+#
+# Collectors which read sysfs themselves, instead of spawning a tool
+# (tool 'sysfs' in TOOLS, so there is nothing to probe). They read from
+# --sysfs_root (default /sys), so they also run against a copy of another
+# host's sysfs, or a fixture tree.
+#
+# sysfs_pci reads each /sys/bus/pci/devices/<BDF>: IDs, class, driver,
+# BAR resources and config space. The config spaces are concatenated
+# into pci_config.bin, and pci_devices.json has one record per device,
+# with the offset and length of its config space in pci_config.bin.
+# Without root, the kernel only returns the first 64 bytes of config.
+#
+# sysfs_usb reads each /sys/bus/usb/devices/<port>: IDs, strings, speed,
+# raw descriptors and interface classes, into usb_devices.json. Devices
+# not in the tool's last run in the PD (see history.py) are reported as
+# findings, and the run as WARN, to catch unexpected new USB devices.
+# Without a USB bus in sysfs, the run is N/A.
+#
+# A collector which fails has an ERROR verdict, so its status is FAIL.
+
+PCI_CONFIG_FILENAME = 'pci_config.bin'
+PCI_DEVICES_FILENAME = 'pci_devices.json'
+PCI_CONFIG_MAX_BYTES = 4096
+PCI_ID_ATTRS = ('vendor', 'device', 'subsystem_vendor', 'subsystem_device', 'class', 'revision')
+USB_DEVICES_FILENAME = 'usb_devices.json'
+USB_DEVICE_ATTRS = ('idVendor', 'idProduct', 'bcdDevice', 'bDeviceClass', 'bDeviceSubClass',
+                    'bDeviceProtocol', 'manufacturer', 'product', 'serial', 'speed', 'version',
+                    'busnum', 'devnum', 'devpath', 'removable', 'authorized')
+USB_INTERFACE_ATTRS = ('bInterfaceNumber', 'bInterfaceClass', 'bInterfaceSubClass',
+                       'bInterfaceProtocol')
+USB_DESCRIPTORS_MAX_BYTES = 64 * 1024
+
+
+def sysfs(toolns, tool, prd, ptd, erc):
+    '''Entry point for different toolns values for tool name.'''
+    if toolns == 'sysfs_pci':
+        rc = sysfs_pci(toolns, tool, prd, ptd, erc)
+    elif toolns == 'sysfs_usb':
+        rc = sysfs_usb(toolns, tool, prd, ptd, erc)
+    else:
+        error(tool + ' resolver: no entry found for: ' + toolns)
+        return -1
+    if rc != 0:
+        # No process exit code to go by, status comes from the verdicts.
+        app_state['tool_parsed'][toolns] = {'verdicts': {toolns: 'ERROR'},
+                                            'findings': [], 'data': {}}
+    return rc
+
+
+def read_sysfs_attr(path):
+    '''Returns contents of sysfs attribute file path, stripped, or None.'''
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        sys.exc_info()
+        return None
+
+
+def read_pci_resources(dev_dir):
+    '''Returns list of the BARs/ROM in use, from a device's resource file.'''
+    resources = []
+    text = read_sysfs_attr(os.path.join(dev_dir, 'resource'))
+    if text is None:
+        return resources
+    for i, line in enumerate(text.splitlines()):
+        fields = line.split()
+        if len(fields) != 3:
+            continue
+        try:
+            if (int(fields[0], 16) == 0) and (int(fields[1], 16) == 0):
+                continue
+        except ValueError:
+            sys.exc_info()
+            continue
+        resources.append({'index': i, 'start': fields[0], 'end': fields[1], 'flags': fields[2]})
+    return resources
+
+
+def read_pci_device(dev_dir, bdf):
+    '''Read one PCI device directory.
+
+    Returns a tuple of (record, config), where record is a dict of the
+    device's attributes, and config the bytes of its config space.
+    '''
+    record = {'bdf': bdf}
+    for name in PCI_ID_ATTRS:
+        record[name] = read_sysfs_attr(os.path.join(dev_dir, name))
+    record['driver'] = None
+    driver = os.path.join(dev_dir, 'driver')
+    if os.path.islink(driver):
+        record['driver'] = os.path.basename(os.readlink(driver))
+    record['resources'] = read_pci_resources(dev_dir)
+    config = b''
+    try:
+        with open(os.path.join(dev_dir, 'config'), 'rb') as f:
+            config = f.read(PCI_CONFIG_MAX_BYTES)
+    except (IOError, OSError) as e:
+        warning('Unable to read config space of ' + bdf + ': ' + str(e))
+        sys.exc_info()
+    return (record, config)
+
+
+def get_pci_config_ids(config):
+    '''Returns dict of vendor, device, class and revision from config space.
+
+    Values are formatted like their sysfs attributes, None if config is
+    too short.
+    '''
+    ids = {'vendor': None, 'device': None, 'class': None, 'revision': None}
+    config = bytearray(config)
+    if len(config) >= 12:
+        ids['vendor'] = '0x%04x' % (config[0] | (config[1] << 8))
+        ids['device'] = '0x%04x' % (config[2] | (config[3] << 8))
+        ids['revision'] = '0x%02x' % config[8]
+        ids['class'] = '0x%06x' % (config[9] | (config[10] << 8) | (config[11] << 16))
+    return ids
+
+
+def save_pci_snapshot(ptd, source, records, configs):
+    '''Save PCI config spaces to pci_config.bin, and their index to pci_devices.json.
+
+    records -- list of device record dicts, in the same order as configs.
+               Each gets the config_offset and config_length of its config
+               space in pci_config.bin.
+    configs -- list of config space bytes.
+
+    Returns True if successful, False if not.
+    '''
+    offset = 0
+    path = os.path.join(ptd, PCI_CONFIG_FILENAME)
+    try:
+        with open(path, 'wb') as f:
+            for i, config in enumerate(configs):
+                f.write(config)
+                records[i]['config_offset'] = offset
+                records[i]['config_length'] = len(config)
+                offset += len(config)
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to save PCI config spaces: ' + path)
+        sys.exc_info()
+        return False
+    index = {
+        'source': source,
+        'count': len(records),
+        'config_bytes': offset,
+        'devices': records,
+    }
+    return save_json_file(os.path.join(ptd, PCI_DEVICES_FILENAME), index)
+
+
+def sysfs_pci(toolns, tool, prd, ptd, erc):
+    '''Read all PCI devices from sysfs, save a snapshot in ptd.
+
+    Returns 0 if successful, 1 if not.
+    '''
+    info('Executing ' + toolns + ' variation of tool: ' + tool)
+    devices_dir = os.path.join(app_state['sysfs_root'], 'bus', 'pci', 'devices')
+    try:
+        names = sorted(os.listdir(devices_dir))
+    except OSError as e:
+        critical(e, 'Unable to list PCI devices in: ' + devices_dir)
+        sys.exc_info()
+        return 1
+    records = []
+    configs = []
+    for bdf in names:
+        (record, config) = read_pci_device(os.path.join(devices_dir, bdf), bdf)
+        records.append(record)
+        configs.append(config)
+    if not save_pci_snapshot(ptd, devices_dir, records, configs):
+        return 1
+    log(toolns + ': ' + str(len(records)) + ' PCI device(s)')
+    return 0
+
+
+def read_usb_device(devices_dir, name, interfaces):
+    '''Read one USB device directory.
+
+    devices_dir -- /sys/bus/usb/devices, with one entry per device and
+                   per interface.
+    interfaces -- list of names of the device's interface entries.
+
+    Returns a dict of the device's attributes.
+    '''
+    dev_dir = os.path.join(devices_dir, name)
+    record = {'port': name}
+    for attr in USB_DEVICE_ATTRS:
+        record[attr] = read_sysfs_attr(os.path.join(dev_dir, attr))
+    # Raw device and configuration descriptors, as hex.
+    record['descriptors'] = None
+    try:
+        with open(os.path.join(dev_dir, 'descriptors'), 'rb') as f:
+            record['descriptors'] = binascii.hexlify(f.read(USB_DESCRIPTORS_MAX_BYTES)).decode('ascii')
+    except (IOError, OSError):
+        sys.exc_info()
+    record['interfaces'] = []
+    for iface in interfaces:
+        iface_dir = os.path.join(devices_dir, iface)
+        entry = {'name': iface, 'driver': None}
+        for attr in USB_INTERFACE_ATTRS:
+            entry[attr] = read_sysfs_attr(os.path.join(iface_dir, attr))
+        driver = os.path.join(iface_dir, 'driver')
+        if os.path.islink(driver):
+            entry['driver'] = os.path.basename(os.readlink(driver))
+        record['interfaces'].append(entry)
+    return record
+
+
+def get_usb_device_key(record):
+    '''Returns the identity of a USB device: vendor:product:serial.
+
+    Devices without a serial number are only told apart by count, see
+    find_new_usb_devices().
+    '''
+    return (str(record.get('idVendor')) + ':' + str(record.get('idProduct')) + ':' +
+            str(record.get('serial') or ''))
+
+
+def find_new_usb_devices(records, baseline):
+    '''Returns list of keys of devices in records but not in baseline.
+
+    A key present more times than in baseline (eg, a second identical
+    keyboard) is also new.
+    '''
+    seen = {}
+    for record in baseline:
+        key = get_usb_device_key(record)
+        seen[key] = seen.get(key, 0) + 1
+    new = []
+    for record in records:
+        key = get_usb_device_key(record)
+        if seen.get(key, 0) > 0:
+            seen[key] -= 1
+        else:
+            new.append(key)
+    return new
+
+
+def load_usb_baseline(toolns):
+    '''Returns (PRD name, device records) of toolns' last run in the PD.
+
+    Returns (None, None) if there is no last run, or it is unreadable.
+    '''
+    pd = app_state['output_dir']
+    last_run = load_tool_history(pd).get(toolns, {}).get('last_run')
+    if last_run is None:
+        return (None, None)
+    path = os.path.join(pd, last_run, toolns, USB_DEVICES_FILENAME)
+    try:
+        with open(path, 'r') as f:
+            return (last_run, json.load(f)['devices'])
+    except (IOError, OSError, ValueError, KeyError) as e:
+        warning('No USB baseline, unable to load: ' + path + ': ' + str(e))
+        sys.exc_info()
+    return (None, None)
+
+
+def sysfs_usb(toolns, tool, prd, ptd, erc):
+    '''Read all USB devices from sysfs, save them in ptd, report new ones.
+
+    Returns 0 if successful, 1 if not.
+    '''
+    info('Executing ' + toolns + ' variation of tool: ' + tool)
+    devices_dir = os.path.join(app_state['sysfs_root'], 'bus', 'usb', 'devices')
+    if not os.path.isdir(os.path.join(app_state['sysfs_root'], 'bus', 'usb')):
+        warning('No USB bus in sysfs: ' + devices_dir)
+        app_state['tool_parsed'][toolns] = {'verdicts': {'usb_bus': 'NOT_APPLICABLE'},
+                                            'findings': [], 'data': {}}
+        return 0
+    try:
+        names = sorted(os.listdir(devices_dir))
+    except OSError as e:
+        critical(e, 'Unable to list USB devices in: ' + devices_dir)
+        sys.exc_info()
+        return 1
+    # Interfaces are named <port>:<config>.<interface>, eg 1-1.2:1.0.
+    interfaces = {}
+    for name in names:
+        if ':' in name:
+            port = name.split(':', 1)[0]
+            if port not in interfaces:
+                interfaces[port] = []
+            interfaces[port].append(name)
+    records = []
+    for name in names:
+        if ':' not in name:
+            records.append(read_usb_device(devices_dir, name, interfaces.get(name, [])))
+    (baseline_prd, baseline) = load_usb_baseline(toolns)
+    new = []
+    if baseline is not None:
+        new = find_new_usb_devices(records, baseline)
+    index = {
+        'source': devices_dir,
+        'count': len(records),
+        'baseline': baseline_prd,
+        'new': new,
+        'devices': records,
+    }
+    if not save_json_file(os.path.join(ptd, USB_DEVICES_FILENAME), index):
+        return 1
+    parsed = {'verdicts': {}, 'findings': [], 'data': {}}
+    if len(new) > 0:
+        parsed['verdicts']['new_usb_devices'] = 'WARNING'
+        for key in new[0:OUTPUT_PARSER_MAX_FINDINGS]:
+            warning('New USB device since ' + baseline_prd + ': ' + key)
+            parsed['findings'].append('new USB device: ' + key)
+    app_state['tool_parsed'][toolns] = parsed
+    log(toolns + ': ' + str(len(records)) + ' USB device(s), ' + str(len(new)) + ' new')
+    return 0
+
+
+#####################################################################
+
+# pci_diff.py
+#
+# --diff_pci A B compares the PCI config spaces of two runs. A and B are
+# PRDs (or sysfs_pci/lspci_xxx PTDs) with a pci_config.bin snapshot.
+# Devices are matched by BDF. Each device's config space is compared as
+# one slice of the snapshot, and only the config spaces which differ are
+# compared a register (dword) at a time, reporting the registers which
+# changed. If one side has less of the config space (eg, non-root sysfs
+# reads only get 64 bytes), only the common part is compared.
+
+PCI_DIFF_MAX_REGISTERS = 32  # changed registers listed per device
+
+
+def find_pci_snapshot_dir(path):
+    '''Returns dir of a PCI snapshot, given a PRD or PTD, or None.'''
+    for d in (path, os.path.join(path, 'sysfs_pci'), os.path.join(path, 'lspci_xxx')):
+        if (path_exists(os.path.join(d, PCI_DEVICES_FILENAME)) and
+                path_exists(os.path.join(d, PCI_CONFIG_FILENAME))):
+            return d
+    return None
+
+
+def load_pci_snapshot(snapshot_dir):
+    '''Load a PCI snapshot.
+
+    Returns a tuple of (devices, blob), where devices is a dict of
+    {BDF: record}, or (None, None) if unreadable.
+    '''
+    try:
+        with open(os.path.join(snapshot_dir, PCI_DEVICES_FILENAME), 'r') as f:
+            index = json.load(f)
+        with open(os.path.join(snapshot_dir, PCI_CONFIG_FILENAME), 'rb') as f:
+            blob = bytearray(f.read())
+        devices = {}
+        for record in index['devices']:
+            devices[record['bdf']] = record
+    except (IOError, OSError, ValueError, KeyError) as e:
+        critical(e, 'Unable to load PCI snapshot: ' + snapshot_dir)
+        sys.exc_info()
+        return (None, None)
+    return (devices, blob)
+
+
+def get_pci_config(record, blob):
+    '''Returns the config space of a device record, from its snapshot blob.'''
+    offset = record.get('config_offset', 0)
+    return blob[offset:offset + record.get('config_length', 0)]
+
+
+def diff_pci_registers(config_a, config_b):
+    '''Returns list of (offset, value_a, value_b) of the dwords which differ.'''
+    changed = []
+    length = min(len(config_a), len(config_b))
+    for offset in range(0, length - (length % 4), 4):
+        a = config_a[offset:offset + 4]
+        b = config_b[offset:offset + 4]
+        if a != b:
+            value_a = a[0] | (a[1] << 8) | (a[2] << 16) | (a[3] << 24)
+            value_b = b[0] | (b[1] << 8) | (b[2] << 16) | (b[3] << 24)
+            changed.append((offset, value_a, value_b))
+    return changed
+
+
+def diff_pci(path_a, path_b):
+    '''Compare PCI config spaces of two runs, for --diff_pci.
+
+    Returns 0 if no devices differ, 1 if any do, 2 if unable to compare.
+    '''
+    start = monotonic_seconds()
+    snapshots = []
+    for path in (path_a, path_b):
+        snapshot_dir = find_pci_snapshot_dir(path)
+        if snapshot_dir is None:
+            error('No PCI snapshot (sysfs_pci or lspci_xxx output) found in: ' + path)
+            return 2
+        (devices, blob) = load_pci_snapshot(snapshot_dir)
+        if devices is None:
+            return 2
+        snapshots.append((devices, blob))
+    (devices_a, blob_a) = snapshots[0]
+    (devices_b, blob_b) = snapshots[1]
+    unchanged = 0
+    changed = 0
+    removed = 0
+    added = 0
+    for bdf in sorted(devices_a):
+        if bdf not in devices_b:
+            removed += 1
+            log('removed   ' + bdf + ' (' + str(devices_a[bdf].get('vendor')) + ':' +
+                str(devices_a[bdf].get('device')) + ')')
+            continue
+        config_a = get_pci_config(devices_a[bdf], blob_a)
+        config_b = get_pci_config(devices_b[bdf], blob_b)
+        length = min(len(config_a), len(config_b))
+        if config_a[0:length] == config_b[0:length]:
+            unchanged += 1
+            continue
+        changed += 1
+        registers = diff_pci_registers(config_a, config_b)
+        log('changed   ' + bdf + ': ' + str(len(registers)) + ' register(s)')
+        for (offset, value_a, value_b) in registers[0:PCI_DIFF_MAX_REGISTERS]:
+            log('          0x%03x: %08x -> %08x' % (offset, value_a, value_b))
+        if len(registers) > PCI_DIFF_MAX_REGISTERS:
+            log('          ... ' + str(len(registers) - PCI_DIFF_MAX_REGISTERS) + ' more')
+    for bdf in sorted(devices_b):
+        if bdf not in devices_a:
+            added += 1
+            log('added     ' + bdf + ' (' + str(devices_b[bdf].get('vendor')) + ':' +
+                str(devices_b[bdf].get('device')) + ')')
+    log('PCI diff: %d unchanged, %d changed, %d removed, %d added, in %.3fs' %
+        (unchanged, changed, removed, added, monotonic_seconds() - start))
+    if changed or removed or added:
+        return 1
+    return 0
+
+
+#####################################################################
+
+# fingerprint.py
+#
+# A cheap fingerprint of the hardware and firmware, computed once per run
+# and saved in results.json, so runs on the same board with the same
+# firmware can be recognised (eg, to reuse cached results). It is built
+# only from file reads, nothing is spawned:
+#   smbios -- BIOS vendor/version/date, system UUID, system and board,
+#             from the SMBIOS tables in sysfs, see decode_smbios(), else
+#             from /sys/class/dmi/id. The UUID is only readable by root.
+#   cpu -- CPU vendor, family/model/stepping and microcode revision, of
+#          the first CPU in /proc/cpuinfo.
+#   pci -- count and SHA256 of the sorted list of PCI devices (BDF, IDs,
+#          class and revision), from sysfs.
+# sha256 is the hash of all of the above. sysfs is read from --sysfs_root.
+
+PROC_CPUINFO = '/proc/cpuinfo'
+DMI_ID_ATTRS = (
+    ('bios_vendor', 'bios_vendor'),
+    ('bios_version', 'bios_version'),
+    ('bios_date', 'bios_date'),
+    ('system_uuid', 'product_uuid'),
+    ('system_vendor', 'sys_vendor'),
+    ('system_product', 'product_name'),
+    ('board_vendor', 'board_vendor'),
+    ('board_product', 'board_name'),
+    ('board_version', 'board_version'),
+)
+CPUINFO_FIELDS = (
+    ('vendor', 'vendor_id'),
+    ('family', 'cpu family'),
+    ('model', 'model'),
+    ('stepping', 'stepping'),
+    ('microcode', 'microcode'),
+)
+
+
+def get_smbios_fingerprint(sysfs_root):
+    '''Returns dict of the SMBIOS fields of the fingerprint.'''
+    smbios = {}
+    tables_dir = os.path.join(sysfs_root, 'firmware', 'dmi', 'tables')
+    try:
+        with open(os.path.join(tables_dir, 'smbios_entry_point'), 'rb') as f:
+            entry_data = f.read()
+        with open(os.path.join(tables_dir, 'DMI'), 'rb') as f:
+            table_data = f.read()
+        inventory = decode_smbios(entry_data, table_data)
+    except (IOError, OSError):
+        sys.exc_info()
+        inventory = None
+    if (inventory is not None) and (inventory['bios'] is not None):
+        system = inventory['system'] or {}
+        board = {}
+        if len(inventory['baseboards']) > 0:
+            board = inventory['baseboards'][0]
+        smbios['bios_vendor'] = inventory['bios']['vendor']
+        smbios['bios_version'] = inventory['bios']['version']
+        smbios['bios_date'] = inventory['bios']['release_date']
+        smbios['system_uuid'] = system.get('uuid')
+        smbios['system_vendor'] = system.get('manufacturer')
+        smbios['system_product'] = system.get('product')
+        smbios['board_vendor'] = board.get('manufacturer')
+        smbios['board_product'] = board.get('product')
+        smbios['board_version'] = board.get('version')
+        return smbios
+    dmi_dir = os.path.join(sysfs_root, 'class', 'dmi', 'id')
+    for (key, attr) in DMI_ID_ATTRS:
+        smbios[key] = read_sysfs_attr(os.path.join(dmi_dir, attr))
+    if smbios['system_uuid'] is not None:
+        smbios['system_uuid'] = smbios['system_uuid'].upper()
+    return smbios
+
+
+def get_cpu_fingerprint():
+    '''Returns dict of the CPU fields of the fingerprint, from /proc/cpuinfo.'''
+    cpu = {}
+    for (key, name) in CPUINFO_FIELDS:
+        cpu[key] = None
+    try:
+        with open(PROC_CPUINFO, 'r') as f:
+            for line in f:
+                if line.strip() == '':
+                    break  # end of first CPU
+                (name, sep, value) = line.partition(':')
+                name = name.strip()
+                for (key, field) in CPUINFO_FIELDS:
+                    if name == field:
+                        cpu[key] = value.strip()
+    except (IOError, OSError):
+        sys.exc_info()
+    return cpu
+
+
+def get_pci_fingerprint(sysfs_root):
+    '''Returns dict of count and SHA256 of the PCI device list.'''
+    import hashlib
+    devices_dir = os.path.join(sysfs_root, 'bus', 'pci', 'devices')
+    lines = []
+    try:
+        names = sorted(os.listdir(devices_dir))
+    except OSError:
+        sys.exc_info()
+        names = []
+    for bdf in names:
+        fields = [bdf]
+        for attr in ('vendor', 'device', 'class', 'revision'):
+            fields.append(str(read_sysfs_attr(os.path.join(devices_dir, bdf, attr))))
+        lines.append(' '.join(fields))
+    h = hashlib.sha256()
+    h.update('\n'.join(lines).encode('utf-8'))
+    return {'count': len(lines), 'sha256': h.hexdigest()}
+
+
+def get_usb_fingerprint(sysfs_root):
+    '''Returns dict of count and SHA256 of the USB device list.
+
+    Not part of the fingerprint, devices come and go, but tools listing
+    them can't reuse cached output if it changed, see cache.py.
+    '''
+    import hashlib
+    devices_dir = os.path.join(sysfs_root, 'bus', 'usb', 'devices')
+    lines = []
+    try:
+        names = sorted(os.listdir(devices_dir))
+    except OSError:
+        sys.exc_info()
+        names = []
+    for name in names:
+        if ':' in name:
+            continue  # interface, see sysfs_usb()
+        fields = [name]
+        for attr in ('idVendor', 'idProduct', 'bcdDevice', 'serial'):
+            fields.append(str(read_sysfs_attr(os.path.join(devices_dir, name, attr))))
+        lines.append(' '.join(fields))
+    h = hashlib.sha256()
+    h.update('\n'.join(lines).encode('utf-8'))
+    return {'count': len(lines), 'sha256': h.hexdigest()}
+
+
+def get_fingerprint():
+    '''Returns the fingerprint dict of this host, computed once per run.'''
+    import hashlib
+    if app_state['fingerprint'] is not None:
+        return app_state['fingerprint']
+    start = monotonic_seconds()
+    sysfs_root = app_state['sysfs_root']
+    fingerprint = {
+        'smbios': get_smbios_fingerprint(sysfs_root),
+        'cpu': get_cpu_fingerprint(),
+        'pci': get_pci_fingerprint(sysfs_root),
+    }
+    buf = json.dumps(fingerprint, sort_keys=True, separators=(',', ':'))
+    fingerprint['sha256'] = hashlib.sha256(buf.encode('utf-8')).hexdigest()
+    app_state['fingerprint'] = fingerprint
+    add_phase_time('fingerprint', start)
+    debug('Fingerprint: ' + fingerprint['sha256'])
+    return fingerprint
+
+
+#####################################################################
+
+# intel_amt_discovery.py
+
+# Detect Intel SA-00075 aka: CVE-2017-5689 AMT vulnerability
+
+
+def intel_amt_discovery(toolns, tool, prd, ptd, erc):
+    '''Run live command: 'INTEL-SA-00075-Discovery-Tool'.'''
+    if not os_is_linux():
+        error(tool + ' only works on Linux')
         return -1  # XXX generate exception
     info('Executing ' + toolns + ' variation of tool: ' + tool)
     cmd = [tool]
@@ -4875,7 +7657,7 @@ def create_manifest_file(path):
             # For each file, write one line to manifest file
             for f in files:
                 debug('make_manifest: current file = ' + f)
-                joined = os.path.join(path, f)
+                joined = os.path.join(root, f)
                 debug('make_manifest: current joined file = ' + joined)
                 hash_buf = return_hash_str_of_file(joined)
                 if is_none_or_null(hash_buf):
@@ -4883,7 +7665,8 @@ def create_manifest_file(path):
                     m.close()
                     return False
                 debug('make_manifest: hash string: ' + hash_buf)
-                manifest_line = hash_buf + ' ' + f + os.linesep
+                # Files in subdirectories are listed relative to path.
+                manifest_line = hash_buf + ' ' + os.path.relpath(joined, path) + os.linesep
                 if is_none_or_null(manifest_line):
                     error('Manifest record line is null!')
                 debug('make_manifest: manifest line: ' + manifest_line)
@@ -4904,11 +7687,2726 @@ def create_manifest_file(path):
 
 #####################################################################
 
+# schedule.py
+#
+# Tools declare the artifacts (files) they create in their PTD, and the
+# artifacts they need as input, in TOOLS 'produces' and 'consumes'. When
+# a selected tool consumes an artifact, a tool producing it is added to
+# the meta_profile if needed. The meta_profile is then run in waves: a
+# tool runs in the first wave after all selected producers of its inputs
+# have run, and its inputs are linked into its PTD before it runs. Within
+# a wave, live tools run one at a time; offline tools only read their
+# inputs, so up to --jobs of them run concurrently.
+#
+# Some artifacts can be produced by several tools. Unless --corroborate,
+# only the cheapest selected producer is run, though a tool selected with
+# --tool is always run. Cost is estimated from the tool's history in the
+# PD (seconds and bytes of previous runs), plus penalties for needing
+# root and for exclusive hardware access, see tool_cost(). Producers of
+# an artifact must write it in the same format: the ACPI tables (one .dat
+# file per table) come from acpidump -b, or are derived by acpixtract from
+# FWTS's acpidump.log. CHIPSEC's ACPI output has a format of its own, so
+# it is a separate artifact, acpi_tables.bin. The other rom.bin producers
+# (FlashROM, Pawn) are not in TOOLS yet, so chipsec_spi_dump is the only
+# one.
+#
+# An artifact can also come from a previous run, with --artifact NAME=PATH
+# (eg, --artifact acpidump.out=<PD>/<PRD>), so offline tools can be
+# re-run without the live tool, or on another host's data. Its producer
+# is then not added.
+
+# Artifacts which are the producer's whole PTD, not one file of that name
+# in it (eg, acpidump -b writes one <signature>.dat file per ACPI table).
+DIRECTORY_ARTIFACTS = ['acpi_tables']
+
+COST_DEFAULT_SECONDS = 10.0  # runtime of tool with no history
+COST_BYTES_PER_SECOND = 50 * 1024 * 1024  # cost of output, as seconds
+COST_ROOT_SECONDS = 5.0  # penalty for needing root
+COST_EXCLUSIVE_SECONDS = 30.0  # penalty for exclusive hardware access
+
+
+def get_artifact_producers():
+    '''Returns dict of {artifact: [toolns, ...]}, of TOOLS producing it.'''
+    producers = {}
+    for t in TOOLS:
+        for a in t.get('produces', []):
+            if a not in producers:
+                producers[a] = []
+            producers[a].append(t['name'])
+    return producers
+
+
+def start_artifacts():
+    '''Reset the artifacts, at start of run, to those given with --artifact.
+
+    Returns True if successful, False if any --artifact was invalid.
+    '''
+    app_state['artifacts'] = {}
+    status = True
+    for spec in app_state['user_artifacts']:
+        (name, sep, path) = spec.partition('=')
+        if (not sep) or is_none_or_null(name) or is_none_or_null(path):
+            error('Invalid --artifact, expected NAME=PATH: ' + spec)
+            status = False
+            continue
+        if name not in get_artifact_producers():
+            error('Unknown artifact: ' + name)
+            status = False
+            continue
+        found = resolve_artifact_path(name, path)
+        if found is None:
+            error('Artifact ' + name + ' not found in: ' + path)
+            status = False
+            continue
+        info('Using artifact ' + name + ': ' + found)
+        app_state['artifacts'][name] = found
+    return status
+
+
+def resolve_artifact_path(name, path):
+    '''Returns absolute path of artifact name given by --artifact, or None.
+
+    path may be the artifact itself, or a PTD or PRD containing it. For
+    directory artifacts (eg, acpi_tables), the PTD of a producer is used.
+    '''
+    path = os.path.abspath(path)
+    if name in DIRECTORY_ARTIFACTS:
+        if not dir_exists(path):
+            return None
+        for p in get_artifact_producers()[name]:
+            if dir_exists(os.path.join(path, p)):
+                return os.path.join(path, p)
+        return path
+    if os.path.isfile(path):
+        return path
+    if not dir_exists(path):
+        return None
+    if os.path.isfile(os.path.join(path, name)):
+        return os.path.join(path, name)
+    for d in sorted(os.listdir(path)):
+        candidate = os.path.join(path, d, name)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def add_artifact_producers(selected, origins):
+    '''Add producers of artifacts consumed by selected tools, if needed.
+
+    Artifacts given with --artifact need no producer. Selected tools
+    consuming an artifact no available tool produces are removed.
+
+    selected -- list of selected toolns, updated in place.
+    origins -- dict of {toolns: [origin, ...]}, updated in place.
+
+    Returns count of tools removed.
+    '''
+    producers = get_artifact_producers()
+    history = None
+    removed = 0
+    i = 0
+    while i < len(selected):
+        toolns = selected[i]
+        i += 1
+        for a in get_tool_entry(toolns).get('consumes', []):
+            if a in app_state['artifacts']:
+                continue
+            found = False
+            available = []
+            for p in producers.get(a, []):
+                if p in origins:
+                    found = True
+                    break
+                if tool_available(p):
+                    available.append(p)
+            if found:
+                continue
+            if len(available) == 0:
+                warning('Skipping ' + toolns + ', no available tool produces ' + a)
+                i -= 1
+                selected.remove(toolns)
+                del origins[toolns]
+                removed += 1
+                break
+            if history is None:
+                history = load_planning_history()
+            p = cheapest_tool(available, history)
+            info('Adding ' + p + ', to produce ' + a + ' for ' + toolns)
+            add_to_selection(p, 'artifact:' + a + ' for ' + toolns, selected, origins)
+    return removed
+
+
+def select_artifact_producers(selected, origins):
+    '''Remove all but the cheapest selected producer of each artifact.
+
+    A producer is only removed if every artifact it produces is also
+    produced by another remaining tool, and it was not selected with
+    --tool. Does nothing if --corroborate.
+
+    selected -- list of selected toolns, updated in place.
+    origins -- dict of {toolns: [origin, ...]}, updated in place.
+
+    Returns count of tools removed.
+    '''
+    if app_state['corroborate']:
+        return 0
+    producers = get_artifact_producers()
+    history = None
+    removed = 0
+    for a in sorted(producers.keys()):
+        candidates = []
+        for p in producers[a]:
+            if p in origins:
+                candidates.append(p)
+        if len(candidates) < 2:
+            continue
+        if history is None:
+            history = load_planning_history()
+        best = cheapest_tool(candidates, history)
+        for p in candidates:
+            if (p == best) or (not produced_elsewhere(p, selected)):
+                continue
+            if 'tool' in origins[p]:
+                debug('Running ' + p + ', selected with --tool, though ' + best +
+                      ' also produces ' + a)
+                continue
+            warning('Not running ' + p + ', ' + a + ' is produced by cheaper ' + best +
+                    ' (use --corroborate to run both)')
+            origins[best].append('instead of:' + p)
+            del origins[p]
+            selected.remove(p)
+            removed += 1
+    return removed
+
+
+def produced_elsewhere(toolns, selected):
+    '''Returns True if all artifacts toolns produces have another producer.'''
+    for a in get_tool_entry(toolns).get('produces', []):
+        found = False
+        for other in selected:
+            if (other != toolns) and (a in get_tool_entry(other).get('produces', [])):
+                found = True
+                break
+        if not found:
+            return False
+    return True
+
+
+def load_planning_history():
+    '''Returns the tool history of the PD, for estimating costs.'''
+    if not get_parent_directory_name():
+        return {}
+    return load_tool_history(app_state['output_dir'])
+
+
+def tool_cost(toolns, history):
+    '''Estimate the cost of running toolns, in (weighted) seconds.
+
+    history -- dict of per-tool history, see load_tool_history().
+    '''
+    entry = get_tool_entry(toolns)
+    past = history.get(toolns, {})
+    cost = past.get('seconds', COST_DEFAULT_SECONDS)
+    cost += past.get('max_bytes', HISTORY_DEFAULT_TOOL_BYTES) / COST_BYTES_PER_SECOND
+    if entry.get('root', True):
+        cost += COST_ROOT_SECONDS
+    if entry.get('access') != 'shared':
+        cost += COST_EXCLUSIVE_SECONDS
+    return cost
+
+
+def cheapest_tool(toolns_list, history):
+    '''Returns the toolns in toolns_list with the lowest tool_cost().'''
+    best = None
+    best_cost = None
+    for toolns in toolns_list:
+        cost = tool_cost(toolns, history)
+        debug('Estimated cost of ' + toolns + ': ' + str(round(cost, 1)))
+        if (best_cost is None) or (cost < best_cost):
+            best = toolns
+            best_cost = cost
+    return best
+
+
+def schedule_waves(toolns_list):
+    '''Split toolns_list into waves, ordered by artifact dependencies.
+
+    Returns a tuple of (status, waves), where:
+    status -- True if all tools were scheduled, False if some were not
+              (due to a dependency cycle).
+    waves -- list of lists of toolns, each in toolns_list order.
+    '''
+    produced_by = {}
+    for toolns in toolns_list:
+        for a in get_tool_entry(toolns).get('produces', []):
+            if a not in produced_by:
+                produced_by[a] = []
+            produced_by[a].append(toolns)
+    done = {}
+    waves = []
+    remaining = toolns_list
+    while len(remaining) > 0:
+        wave = []
+        waiting = []
+        for toolns in remaining:
+            if inputs_scheduled(toolns, produced_by, done):
+                wave.append(toolns)
+            else:
+                waiting.append(toolns)
+        if len(wave) == 0:
+            error('Artifact dependency cycle, not running: ' + ', '.join(waiting))
+            return (False, waves)
+        for toolns in wave:
+            done[toolns] = True
+        debug('Wave ' + str(len(waves)) + ': ' + ', '.join(wave))
+        waves.append(wave)
+        remaining = waiting
+    return (True, waves)
+
+
+def inputs_scheduled(toolns, produced_by, done):
+    '''Returns True if all producers of toolns' inputs are in done.'''
+    for a in get_tool_entry(toolns).get('consumes', []):
+        for p in produced_by.get(a, []):
+            if (p != toolns) and (p not in done):
+                return False
+    return True
+
+
+def tool_inputs_available(toolns):
+    '''Returns True if all artifacts toolns consumes were produced.'''
+    for a in get_tool_entry(toolns).get('consumes', []):
+        if a not in app_state['artifacts']:
+            error('Artifact ' + a + ' unavailable, needed by ' + toolns)
+            return False
+    return True
+
+
+def link_tool_inputs(toolns, ptd):
+    '''Hard link (or copy) the artifacts toolns consumes into its PTD.
+
+    Consumers run in their own PTD, so any files they generate next to
+    their input go there, not into the producer's PTD.
+
+    Returns True if successful, False if not.
+    '''
+    import shutil
+    for a in get_tool_entry(toolns).get('consumes', []):
+        src = app_state['artifacts'][a]
+        if a in DIRECTORY_ARTIFACTS:
+            # Consumer reads the producer's PTD, via app_state['artifacts'].
+            continue
+        dst = os.path.join(ptd, a)
+        try:
+            os.link(src, dst)
+            continue
+        except OSError:
+            sys.exc_info()
+        try:
+            shutil.copyfile(src, dst)
+        except (IOError, OSError) as e:
+            critical(e, 'Unable to copy ' + src + ' to ' + dst)
+            sys.exc_info()
+            return False
+        debug('Copied input artifact: ' + dst)
+    return True
+
+
+def get_tool_input(ptd, name):
+    '''Returns absolute path of input artifact name in ptd, or None.'''
+    path = os.path.abspath(os.path.join(ptd, name))
+    if not path_exists(path):
+        return None
+    return path
+
+
+def register_tool_artifacts(toolns, ptd):
+    '''Record the artifacts toolns produced, for use by consumers.'''
+    for a in get_tool_entry(toolns).get('produces', []):
+        path = os.path.join(ptd, a)
+        if a in DIRECTORY_ARTIFACTS:
+            app_state['artifacts'][a] = ptd
+        elif os.path.isfile(path):
+            app_state['artifacts'][a] = path
+            debug('Artifact ' + a + ' produced by ' + toolns + ': ' + path)
+        else:
+            warning(toolns + ' did not produce artifact: ' + a)
+
+
+def run_tools_concurrently(pd, prd, toolns_list, jobs):
+    '''Run tools in up to jobs threads, see run_tool().
+
+    Returns True if all tools were run successfully, False if not.
+    '''
+    work = queue.Queue()
+    for toolns in toolns_list:
+        work.put(toolns)
+    results = {}
+    threads = []
+    for i in range(min(jobs, len(toolns_list))):
+        t = threading.Thread(target=run_tools_worker, args=(pd, prd, work, results))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    status = True
+    for toolns in toolns_list:
+        if not results.get(toolns, False):
+            status = False
+    return status
+
+
+def run_tools_worker(pd, prd, work, results):
+    '''Thread body of run_tools_concurrently(), run tools until none left.'''
+    while True:
+        try:
+            toolns = work.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            results[toolns] = run_tool(pd, prd, toolns)
+        except Exception as e:
+            critical(e, 'Unexpected exception running tool: ' + toolns)
+            sys.exc_info()
+            results[toolns] = False
+
+#####################################################################
+
+# selfprofile.py
+#
+# --self_profile wraps all of main() with a profiler, to tell if a slow
+# run is due to fwaudit or a tool. The option is parsed ahead of main(),
+# since main() parses the rest. Output is saved in the PRD (or the PD,
+# if no PRD was created), with a sidecar hash, for attaching to bug
+# reports. In a run, the profiler is stopped and saved before the PRD is
+# published, so work after that (eg, history) is not profiled:
+#   cpu -- cProfile, saved as fwaudit.pstats (view with python -m pstats).
+#   memory -- tracemalloc, top allocations saved to fwaudit.memory.txt.
+#     Python 3 only, it is not offered where tracemalloc is unavailable.
+# Only the main thread is profiled by cProfile.
+
+SELF_PROFILE_CPU_FILENAME = 'fwaudit.pstats'
+SELF_PROFILE_MEMORY_FILENAME = 'fwaudit.memory.txt'
+SELF_PROFILE_TOP_COUNT = 25  # number of allocation sites to report
+SELF_PROFILE_FRAMES = 10  # stack frames tracemalloc records per allocation
+
+
+def get_self_profile_modes():
+    '''Returns tuple of --self_profile values this Python supports.'''
+    if sys.version_info < (3, 4):
+        return ('cpu',)  # no tracemalloc
+    return ('cpu', 'memory')
+
+
+def get_self_profile_mode():
+    '''Returns --self_profile value, parsed ahead of parse_args(), or None.'''
+    p = argparse.ArgumentParser(add_help=False)
+    p.add_argument('--self_profile', choices=get_self_profile_modes(), default=None)
+    (args, _) = p.parse_known_args()
+    return args.self_profile
+
+
+def self_profile_main():
+    '''Run main(), under the profiler selected by --self_profile, if any.
+
+    Returns exit status of main().
+    '''
+    mode = get_self_profile_mode()
+    if mode is None:
+        return main()
+    if not start_self_profile(mode):
+        return 1
+    rc = 1
+    try:
+        rc = main()
+    finally:
+        # Unless run_audit() already saved it, before publishing the PRD.
+        if not finish_self_profile():
+            rc = 1
+    return rc
+
+
+def start_self_profile(mode):
+    '''Start the --self_profile profiler.
+
+    Returns True if successful, False if not.
+    '''
+    profiler = None
+    if mode == 'cpu':
+        try:
+            import cProfile
+        except ImportError:
+            sys.exc_info()
+            error('CPU self-profiling needs the cProfile module')
+            return False
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        import tracemalloc
+        tracemalloc.start(SELF_PROFILE_FRAMES)
+    app_state['self_profiler'] = (mode, profiler)
+    return True
+
+
+def finish_self_profile():
+    '''Stop the --self_profile profiler, if running, and save its output.
+
+    Returns True if successful (or not profiling), False if not.
+    '''
+    if app_state['self_profiler'] is None:
+        return True
+    (mode, profiler) = app_state['self_profiler']
+    app_state['self_profiler'] = None
+    if mode == 'cpu':
+        profiler.disable()
+        path = get_self_profile_path(SELF_PROFILE_CPU_FILENAME)
+        if path is None:
+            return True
+        try:
+            profiler.dump_stats(path)
+        except (IOError, OSError) as e:
+            critical(e, 'Unable to save CPU profile: ' + path)
+            sys.exc_info()
+            return False
+        finish_self_profile_file(path)
+        return True
+    import tracemalloc
+    try:
+        snapshot = tracemalloc.take_snapshot()
+        (current, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    path = get_self_profile_path(SELF_PROFILE_MEMORY_FILENAME)
+    if path is None:
+        return True
+    lines = ['current: ' + format_bytes(current) + ', peak: ' + format_bytes(peak),
+             'top ' + str(SELF_PROFILE_TOP_COUNT) + ' allocation sites:']
+    for site in snapshot.statistics('lineno')[:SELF_PROFILE_TOP_COUNT]:
+        lines.append(str(site))
+    try:
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to save memory profile: ' + path)
+        sys.exc_info()
+        return False
+    finish_self_profile_file(path)
+    return True
+
+
+def get_self_profile_path(filename):
+    '''Returns path to save self-profile output to, or None if no dir.'''
+    for d in (app_state['per_run_directory'], app_state['output_dir']):
+        if (not is_none_or_null(d)) and dir_exists(d):
+            return os.path.join(d, filename)
+    warning('No output directory, not saving self-profile: ' + filename)
+    return None
+
+
+def finish_self_profile_file(path):
+    '''Create sidecar hash of self-profile output, and chown both if sudo.'''
+    if app_state['hash_mode']:
+        create_sidecar_hash_file(path)
+    if app_state['sudo_based_usage']:
+        (_, new_uid, new_gid) = get_sudo_user_group_mode()
+        change_file_owner_group(path, new_uid, new_gid)
+        if path_exists(path + '.sha256'):
+            change_file_owner_group(path + '.sha256', new_uid, new_gid)
+    info('Saved self-profile: ' + path)
+
+#####################################################################
+
+# timings.py
+#
+# Time spent in each phase of fwaudit itself (parsing arguments, setting
+# up directories, saving stdio, hashing, manifests, chown, etc.), using
+# a monotonic clock. Phases which run once per tool are summed, and some
+# phases include others (eg, post_process_ptd includes hash when there
+# is no post-processor), so phases are a breakdown, not a partition.
+# Overhead is total run time less time spent in tool processes. Saved to
+# timings.json in the PRD, and shown if --timings.
+
+TIMINGS_FILENAME = 'timings.json'
+TIMINGS_LOCK = threading.Lock()
+
+
+def monotonic_seconds():
+    '''Returns monotonic clock seconds, or wall clock on Python 2.'''
+    if hasattr(time, 'monotonic'):
+        return time.monotonic()
+    return time.time()
+
+
+def add_phase_time(phase, start):
+    '''Add the seconds since start (from monotonic_seconds()) to phase.'''
+    elapsed = monotonic_seconds() - start
+    TIMINGS_LOCK.acquire()
+    try:
+        app_state['timings'][phase] = app_state['timings'].get(phase, 0.0) + elapsed
+    finally:
+        TIMINGS_LOCK.release()
+
+
+def add_hashed_bytes(count):
+    '''Add count to the number of bytes hashed.'''
+    TIMINGS_LOCK.acquire()
+    try:
+        app_state['hashed_bytes'] += count
+    finally:
+        TIMINGS_LOCK.release()
+
+
+def merge_phase_times(reply):
+    '''Add timings of another process (eg, post-processor) to ours.
+
+    reply -- dict with 'phases' and 'hashed_bytes' of the other process.
+    '''
+    if not isinstance(reply, dict):
+        return
+    timings = reply.get('phases', {})
+    TIMINGS_LOCK.acquire()
+    try:
+        for phase in timings:
+            app_state['timings'][phase] = app_state['timings'].get(phase, 0.0) + timings[phase]
+        app_state['hashed_bytes'] += reply.get('hashed_bytes', 0)
+    finally:
+        TIMINGS_LOCK.release()
+
+
+def get_timings():
+    '''Returns dict of time spent in tools, in fwaudit, and in each phase.'''
+    total = monotonic_seconds() - app_state['start_time']
+    # Prefer lifetime of the tool's child process, if known, see rusage.
+    tool_seconds = 0.0
+    for toolns in app_state['tool_seconds']:
+        usage = app_state['tool_rusage'].get(toolns)
+        if usage is not None:
+            tool_seconds += usage['wall_seconds']
+        else:
+            tool_seconds += app_state['tool_seconds'][toolns]
+    overhead = max(0.0, total - tool_seconds)
+    timings = {
+        'total_seconds': total,
+        'tool_seconds': tool_seconds,
+        'overhead_seconds': overhead,
+        'tool_count': len(app_state['tool_seconds']),
+        'hashed_bytes': app_state['hashed_bytes'],
+        'phases': app_state['timings'],
+    }
+    return timings
+
+
+def finish_timings(prd):
+    '''Save timings.json to the PRD, before it is published.
+
+    Phases after that (eg, history) are only in the --timings report.
+
+    Returns True if successful, False if not.
+    '''
+    timings = get_timings()
+    if is_none_or_null(prd) or not dir_exists(prd):
+        return False
+    path = os.path.join(prd, TIMINGS_FILENAME)
+    if not save_json_file(path, timings):
+        return False
+    if app_state['hash_mode']:
+        if not create_sidecar_hash_file(path):
+            return False
+        if app_state['sudo_based_usage']:
+            (_, new_uid, new_gid) = get_sudo_user_group_mode()
+            change_file_owner_group(path + '.sha256', new_uid, new_gid)
+    return True
+
+
+def show_timings(timings):
+    '''Show phase timings report, for --timings.'''
+    total = timings['total_seconds']
+    if total <= 0.0:
+        total = 1.0
+    phases = []
+    for phase in timings['phases']:
+        phases.append((timings['phases'][phase], phase))
+    phases.sort(reverse=True)
+    log('%-24s %10s %7s' % ('phase', 'seconds', 'share'))
+    for (seconds, phase) in phases:
+        log('%-24s %10.3f %6.1f%%' % (phase, seconds, 100.0 * seconds / total))
+    log('%-24s %10.3f %6.1f%%' % ('(tools)', timings['tool_seconds'],
+                                   100.0 * timings['tool_seconds'] / total))
+    log('fwaudit overhead: %.3fs (%.1f%%) of %.3fs, %d tool(s)' %
+        (timings['overhead_seconds'], 100.0 * timings['overhead_seconds'] / total,
+         timings['total_seconds'], timings['tool_count']))
+
+#####################################################################
+
+# results.py
+#
+# One results record per tool run, saved to results.json in the PRD at
+# the end of the run. Each record has the tool's status and, for spawned
+# tools, the resource usage of its child process (see record_rusage()):
+# wall/user/sys seconds, peak memory, block I/O and context switches.
+# results.json also has the run's hardware/firmware fingerprint.
+
+RESULTS_FILENAME = 'results.json'
+
+
+def start_results():
+    '''Reset the results records, at start of run.'''
+    app_state['results'] = []
+    app_state['tool_rusage'] = {}
+    app_state['tool_parsed'] = {}
+
+
+def add_results_record(tool, ptd, toolns, rc, erc, status):
+    '''Add the results record of one tool run, and return it.'''
+    record = {
+        'toolns': toolns,
+        'tool': tool,
+        'ptd': ptd,
+        'rc': rc,
+        'expected_rc': erc,
+        'status': status,
+        'rusage': app_state['tool_rusage'].get(toolns),
+        'verdicts': None,
+        'findings': None,
+    }
+    parsed = app_state['tool_parsed'].get(toolns)
+    if parsed is not None:
+        record['verdicts'] = parsed['verdicts']
+        record['findings'] = parsed['findings']
+    app_state['results'].append(record)
+    return record
+
+
+def finish_results(prd):
+    '''Save results.json to the PRD, and show the summary table.
+
+    Returns True if successful, False if not.
+    '''
+    if is_none_or_null(prd):
+        error('PRD unspecified, cannot save results')
+        return False
+    results = {
+        'run_id': app_state['run_id'],
+        'fingerprint': app_state['fingerprint'],
+        'tools': app_state['results'],
+    }
+    buf = json.dumps(results, indent=1, sort_keys=True, separators=(',', ': '))
+    write_derived_file(buf.encode('utf-8'), os.path.join(prd, RESULTS_FILENAME))
+    show_results_summary()
+    return True
+
+
+def show_results_summary():
+    '''Show a table of tool status and resource usage, slowest tool first.'''
+    order = []
+    for record in app_state['results']:
+        usage = record['rusage']
+        wall = -1.0
+        if usage is not None:
+            wall = usage['wall_seconds']
+        order.append((wall, record['toolns'], record))
+    order.sort(reverse=True)
+    log('%-36s %-6s %8s %8s %8s %10s %8s %8s %8s' %
+        ('tool', 'status', 'wall', 'user', 'sys', 'max_rss', 'blk_in', 'blk_out', 'ctx_sw'))
+    for (_, toolns, record) in order:
+        usage = record['rusage']
+        if usage is None:
+            log('%-36s %-6s %8s' % (toolns, record['status'], '-'))
+            continue
+        log('%-36s %-6s %8.2f %8.2f %8.2f %10s %8d %8d %8d' %
+            (toolns, record['status'], usage['wall_seconds'], usage['user_seconds'],
+             usage['sys_seconds'], format_bytes(usage['max_rss']), usage['block_in'],
+             usage['block_out'], usage['voluntary_switches'] + usage['involuntary_switches']))
+
+#####################################################################
+
+# probe.py
+#
+# Before any directory is created, the binaries (and, for CHIPSEC, the
+# Python modules) the selected tools need are checked, each only once per
+# meta_profile. Tools which cannot run are removed and reported up front,
+# rather than failing in spawn_process() after their PTD was created.
+#
+# Results are cached in the PD, keyed by PATH. Cached binary lookups are
+# reused while the mtimes of the PATH directories and of each binary are
+# unchanged. Only successful Python module probes are cached, keyed by
+# the Python binary and its mtime; failed ones are always re-probed.
+
+PROBE_CACHE_FILENAME = 'fwaudit.probe.json'
+
+# Run as: python -c PYTHON_MODULE_PROBE <module>, exits 0 if importable.
+PYTHON_MODULE_PROBE = '\n'.join([
+    'import sys',
+    'try:',
+    '    from importlib.util import find_spec',
+    'except ImportError:',
+    '    from pkgutil import find_loader as find_spec',
+    'sys.exit(find_spec(sys.argv[1]) is None)'])
+
+
+def get_tool_requirements(toolns):
+    '''Returns a tuple of (binaries, modules) that toolns needs to run.
+
+    binaries -- list of executable names, looked up in PATH.
+    modules -- list of Python modules, importable by 'python' in PATH.
+    '''
+    tool = get_tool_entry(toolns)['tool']
+    if (tool == 'chipsec_main') or (tool == 'chipsec_util'):
+        return (['python'], [tool])
+    if tool == 'sysfs':
+        return ([], [])
+    if toolns == 'fwts_acpi_dump':
+        return ([tool, 'acpixtract'], [])
+    return ([tool], [])
+
+
+def get_path_dirs():
+    '''Returns list of directories in PATH.'''
+    dirs = []
+    for d in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        if not is_none_or_null(d):
+            dirs.append(d)
+    return dirs
+
+
+def file_mtime(path):
+    '''Returns mtime of path, or None if it does not exist.'''
+    if path is None:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        sys.exc_info()
+        return None
+
+
+def find_executable(name, dirs):
+    '''Returns path of executable name in one of dirs, or None.'''
+    for d in dirs:
+        path = os.path.join(d, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def load_probe_cache(dirs):
+    '''Load the probe cache from the PD.
+
+    Binary lookups are dropped if PATH, or any PATH directory, changed.
+
+    Returns the cache dict.
+    '''
+    fresh = {
+        'path': os.environ.get('PATH', ''),
+        'dirs': {},
+        'binaries': {},
+        'modules': {},
+    }
+    for d in dirs:
+        fresh['dirs'][d] = file_mtime(d)
+    if not get_parent_directory_name():
+        return fresh
+    path = os.path.join(app_state['output_dir'], PROBE_CACHE_FILENAME)
+    if not path_exists(path):
+        return fresh
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        warning('Ignoring unreadable probe cache: ' + path)
+        sys.exc_info()
+        return fresh
+    if not isinstance(cache, dict):
+        warning('Ignoring invalid probe cache: ' + path)
+        return fresh
+    if isinstance(cache.get('modules'), dict):
+        fresh['modules'] = cache['modules']
+    if (cache.get('path') != fresh['path']) or (cache.get('dirs') != fresh['dirs']):
+        debug('PATH changed, ignoring cached binary lookups')
+        app_state['probe_cache_dirty'] = True
+        return fresh
+    if isinstance(cache.get('binaries'), dict):
+        fresh['binaries'] = cache['binaries']
+    return fresh
+
+
+def save_probe_cache(pd):
+    '''Save the probe cache to the PD, if it changed and the PD exists.
+
+    Returns True if successful, False if not.
+    '''
+    if (app_state['probe_cache'] is None) or (not app_state['probe_cache_dirty']):
+        return True
+    if is_none_or_null(pd) or not dir_exists(pd):
+        return True
+    app_state['probe_cache_dirty'] = False
+    return save_json_file(os.path.join(pd, PROBE_CACHE_FILENAME), app_state['probe_cache'])
+
+
+def probe_binary(name, dirs, cache):
+    '''Returns path of executable name in PATH, or None, using cache.'''
+    entry = cache['binaries'].get(name)
+    if entry is not None:
+        if entry['path'] is None:
+            return None
+        if file_mtime(entry['path']) == entry['mtime']:
+            return entry['path']
+    path = find_executable(name, dirs)
+    cache['binaries'][name] = {'path': path, 'mtime': file_mtime(path)}
+    app_state['probe_cache_dirty'] = True
+    return path
+
+
+def probe_python_module(python, module, cache):
+    '''Returns True if module is importable by python, using cache.'''
+    import subprocess
+    key = python + ' ' + module
+    mtime = file_mtime(python)
+    if (key in cache['modules']) and (cache['modules'][key] == mtime):
+        return True
+    try:
+        with open(os.devnull, 'w') as devnull:
+            rc = subprocess.call([python, '-c', PYTHON_MODULE_PROBE, module],
+                                 stdout=devnull, stderr=devnull)
+    except OSError as e:
+        critical(e, 'Unable to run ' + python)
+        sys.exc_info()
+        return False
+    if rc != 0:
+        return False
+    cache['modules'][key] = mtime
+    app_state['probe_cache_dirty'] = True
+    return True
+
+
+def probe_tools(toolns_list):
+    '''Check which tools of toolns_list can run.
+
+    Each binary and module is only probed once. Results are saved in
+    app_state['tool_availability'].
+
+    Returns count of tools which cannot run.
+    '''
+    dirs = get_path_dirs()
+    if app_state['probe_cache'] is None:
+        app_state['probe_cache'] = load_probe_cache(dirs)
+    cache = app_state['probe_cache']
+    results = app_state['tool_availability']
+    missing = 0
+    for toolns in toolns_list:
+        if toolns not in results:
+            (binaries, modules) = get_tool_requirements(toolns)
+            reason = None
+            for b in binaries:
+                if probe_binary(b, dirs, cache) is None:
+                    reason = b + ' not found in PATH'
+                    break
+            if reason is None:
+                for m in modules:
+                    python = probe_binary('python', dirs, cache)
+                    if (python is None) or (not probe_python_module(python, m, cache)):
+                        reason = 'Python module ' + m + ' not found'
+                        break
+            results[toolns] = reason
+        if results[toolns] is not None:
+            missing += 1
+    return missing
+
+
+def tool_available(toolns):
+    '''Returns True if toolns can run, probing it if needed.'''
+    if toolns not in app_state['tool_availability']:
+        probe_tools([toolns])
+    return app_state['tool_availability'][toolns] is None
+
+
+def prune_unavailable_tools(selected, origins):
+    '''Remove the tools which cannot run from the selection, reporting each.
+
+    selected -- list of selected toolns, updated in place.
+    origins -- dict of {toolns: [origin, ...]}, updated in place.
+
+    With --plan, nothing is removed: the plan is often made on another
+    host than the run, so unavailable tools are only marked in the plan.
+
+    Returns count of tools removed.
+    '''
+    if probe_tools(selected) == 0:
+        return 0
+    if app_state['plan_mode']:
+        return 0
+    removed = 0
+    for toolns in list(selected):
+        reason = app_state['tool_availability'][toolns]
+        if reason is None:
+            continue
+        warning('Skipping unavailable tool ' + toolns + ': ' + reason)
+        selected.remove(toolns)
+        del origins[toolns]
+        removed += 1
+    return removed
+
+#####################################################################
+
+# plan.py
+#
+# --plan: build the meta_profile and schedule it, then show the schedule
+# and its estimated cost, without running anything. Estimates come from
+# the tool history in the PD (see history.py); tools without history
+# use the COST_DEFAULT_SECONDS and HISTORY_DEFAULT_TOOL_BYTES defaults.
+# Tools which can't run on this host (eg, binary not installed) are still
+# planned, and marked unavailable, since the plan may be for another host.
+# Nothing is written, not even the probe cache.
+
+
+def show_plan():
+    '''Show the execution plan of the selected tools, for --plan.
+
+    Returns 0 if successful, 1 if not.
+    '''
+    (status, tool_count, _) = build_meta_profile(verbose=False)
+    if (status is False) or (tool_count == 0):
+        error('Unable to build tool selection, nothing to plan')
+        return 1
+    history = load_planning_history()
+    (status, waves) = schedule_waves(app_state['meta_profile'])
+    if not status:
+        warning('Some tools have unresolvable artifact dependencies')
+    jobs = app_state['jobs']
+    estimates = {}
+    for toolns in app_state['meta_profile']:
+        estimates[toolns] = tool_estimate(toolns, history)
+    log('Plan for ' + str(tool_count) + ' tool(s), in ' + str(len(waves)) + ' wave(s), PD: ' +
+        str(app_state['output_dir']))
+    total_seconds = 0.0
+    total_bytes = 0
+    peak_rss = None
+    unavailable = 0
+    for i, wave in enumerate(waves):
+        log('Wave ' + str(i) + ':')
+        for toolns in wave:
+            (seconds, nbytes, rss, known) = estimates[toolns]
+            entry = get_tool_entry(toolns)
+            how = 'sequential'
+            if entry['mode'] == 'offline':
+                how = 'parallel'
+            msg = '  ' + toolns + ': ' + how + ', ' + str(round(seconds, 1)) + 's, ' + format_bytes(nbytes)
+            if rss is not None:
+                msg += ', peak memory ' + format_bytes(rss)
+            if not known:
+                msg += ' (no history)'
+            if app_state['tool_availability'].get(toolns) is not None:
+                msg += ' (unavailable here: ' + app_state['tool_availability'][toolns] + ')'
+                unavailable += 1
+            log(msg)
+        total_seconds += estimate_wave_seconds(wave, estimates, jobs)
+        wave_rss = estimate_wave_rss(wave, estimates, jobs)
+        if (wave_rss is not None) and ((peak_rss is None) or (wave_rss > peak_rss)):
+            peak_rss = wave_rss
+        for toolns in wave:
+            total_bytes += estimates[toolns][1]
+    (path_seconds, path) = critical_path(app_state['meta_profile'], estimates)
+    log('Estimated time: ' + str(round(total_seconds, 1)) + 's')
+    log('Estimated disk: ' + format_bytes(total_bytes))
+    log('Critical path: ' + ' -> '.join(path) + ' (' + str(round(path_seconds, 1)) + 's)')
+    if peak_rss is None:
+        log('Estimated peak memory: unknown (no history)')
+    else:
+        log('Estimated peak memory: ' + format_bytes(peak_rss))
+    if unavailable > 0:
+        warning(str(unavailable) + ' tool(s) unavailable on this host, see above')
+    return 0
+
+
+def tool_estimate(toolns, history):
+    '''Estimate the cost of a tool run, from its history.
+
+    Returns a tuple of (seconds, bytes, max_rss, known), where max_rss is
+    None if unknown, and known is False if the tool has no history.
+    '''
+    past = history.get(toolns, {})
+    known = toolns in history
+    seconds = past.get('seconds', COST_DEFAULT_SECONDS)
+    nbytes = past.get('max_bytes', HISTORY_DEFAULT_TOOL_BYTES)
+    return (seconds, nbytes, past.get('max_rss'), known)
+
+
+def estimate_wave_seconds(wave, estimates, jobs):
+    '''Estimate wall-clock seconds of a wave, as run by run_meta_profile().
+
+    Live tools run one at a time. Offline tools run in up to jobs slots,
+    each starting in the first free slot.
+    '''
+    seconds = 0.0
+    slots = []
+    for toolns in wave:
+        if get_tool_entry(toolns)['mode'] != 'offline':
+            seconds += estimates[toolns][0]
+            continue
+        if len(slots) < jobs:
+            slots.append(estimates[toolns][0])
+        else:
+            first = slots.index(min(slots))
+            slots[first] += estimates[toolns][0]
+    if len(slots) > 0:
+        seconds += max(slots)
+    return seconds
+
+
+def estimate_wave_rss(wave, estimates, jobs):
+    '''Estimate peak memory (bytes) of a wave's tools, or None if unknown.
+
+    Live tools run alone; up to jobs offline tools may run at once.
+    '''
+    peak = None
+    offline = []
+    for toolns in wave:
+        rss = estimates[toolns][2]
+        if rss is None:
+            continue
+        if get_tool_entry(toolns)['mode'] == 'offline':
+            offline.append(rss)
+        elif (peak is None) or (rss > peak):
+            peak = rss
+    if len(offline) > 0:
+        offline.sort(reverse=True)
+        concurrent = sum(offline[:jobs])
+        if (peak is None) or (concurrent > peak):
+            peak = concurrent
+    return peak
+
+
+def critical_path(toolns_list, estimates):
+    '''Find the longest chain of artifact dependencies, by estimated time.
+
+    Returns a tuple of (seconds, path), where path is a list of toolns.
+    '''
+    produced_by = {}
+    for toolns in toolns_list:
+        for a in get_tool_entry(toolns).get('produces', []):
+            if a not in produced_by:
+                produced_by[a] = []
+            produced_by[a].append(toolns)
+    finish = {}
+    previous = {}
+    best = None
+    # Producers always come first in schedule order, see schedule_waves().
+    (_, waves) = schedule_waves(toolns_list)
+    for wave in waves:
+        for toolns in wave:
+            start = 0.0
+            previous[toolns] = None
+            for a in get_tool_entry(toolns).get('consumes', []):
+                for p in produced_by.get(a, []):
+                    if (p in finish) and (finish[p] > start):
+                        start = finish[p]
+                        previous[toolns] = p
+            finish[toolns] = start + estimates[toolns][0]
+            if (best is None) or (finish[toolns] > finish[best]):
+                best = toolns
+    path = []
+    toolns = best
+    while toolns is not None:
+        path.insert(0, toolns)
+        toolns = previous[toolns]
+    if best is None:
+        return (0.0, path)
+    return (finish[best], path)
+
+
+def format_bytes(nbytes):
+    '''Returns nbytes as a human-readable string, eg '1.5 MiB'.'''
+    value = float(nbytes)
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024.0:
+            return str(round(value, 1)) + ' ' + unit
+        value = value / 1024.0
+    return str(round(value, 1)) + ' TiB'
+
+#####################################################################
+
+# privsep.py
+#
+# Split-privilege post-processing, for the Unix sudo case.
+#
+# Only the tools need root. Everything derived from their output (stdio
+# logs, sidecar hashes, manifests, etc.) is generated by a forked child
+# process that has dropped privileges to SUDO_UID/SUDO_GID, so those
+# files are owned by the sudo user as they are created.
+#
+# The privileged parent sends the child requests over a pipe. Each request
+# is a single line of JSON (with an 'op' key, and a 'sizes' list), followed
+# by the raw bytes of zero or more payloads, one per entry in 'sizes'.
+#
+# Supported ops:
+#   log -- write payload[0] to file 'path'.
+#   write -- same as log, for other derived files (eg, results.json), and
+#            create its sidecar hash file, if 'hash'.
+#   finish_ptd -- create sidecar hashes and manifest for directory 'ptd'.
+#   publish -- publish 'staged' run directory to 'final', see staging.py.
+#   exit -- stop processing requests, exit child.
+#
+# On exit, the child writes its phase timings (see timings.py), as JSON,
+# to a second pipe, back to the parent.
+#
+# Files that the tools themselves create in a PTD (eg, rom.bin) are still
+# created by root; the parent chowns just those, right after each tool
+# exits and before the child is asked to hash them.
+
+# Serializes requests from tools run concurrently, see schedule.py.
+POST_PROCESSOR_LOCK = threading.Lock()
+
+
+def post_processor_running():
+    '''Returns True if the unprivileged post-processor child is running.'''
+    return app_state['post_processor_fd'] is not None
+
+
+def start_post_processor():
+    '''Fork the unprivileged post-processor child, if using sudo.
+
+    Only used on Unix, in the sudo case, unless --nosplit_privs was given.
+    In all other cases, post-processing happens in-process, and this
+    function does nothing.
+
+    Returns True if successful (or not needed), False if not.
+    '''
+    if not app_state['split_privs']:
+        debug('Split-privilege post-processing disabled')
+        return True
+    if not app_state['sudo_based_usage']:
+        debug('Not using sudo, post-processing in-process')
+        return True
+    if not os_is_unix():
+        debug('Split-privilege post-processing is Unix-only')
+        app_state['split_privs'] = False
+        return True
+    (_, new_uid, new_gid) = get_sudo_user_group_mode()
+    # Load the codec before forking; after dropping privileges the child
+    # may not be able to read the Python library directory (eg, in ~root).
+    b''.decode('utf-8')
+    try:
+        (read_fd, write_fd) = os.pipe()
+        (reply_read_fd, reply_write_fd) = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+    except OSError as e:
+        critical(e, 'Unable to fork post-processor')
+        sys.exc_info()
+        return False
+    if pid == 0:
+        # Child: never returns to caller.
+        status = 1
+        # Only time spent in the child is reported back to the parent.
+        app_state['timings'] = {}
+        app_state['hashed_bytes'] = 0
+        try:
+            os.close(write_fd)
+            os.close(reply_read_fd)
+            if drop_privileges(new_uid, new_gid):
+                status = post_processor_loop(read_fd)
+            reply = {'phases': app_state['timings'],
+                     'hashed_bytes': app_state['hashed_bytes']}
+            write_all(reply_write_fd, json.dumps(reply).encode('utf-8'))
+            os.close(reply_write_fd)
+        except KeyboardInterrupt:
+            sys.exc_info()
+        except:
+            output('[ERROR] Unexpected exception in post-processor!')
+            sys.exc_info()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+    os.close(read_fd)
+    os.close(reply_write_fd)
+    app_state['post_processor_pid'] = pid
+    app_state['post_processor_fd'] = write_fd
+    app_state['post_processor_reply_fd'] = reply_read_fd
+    debug('Started post-processor, pid=' + str(pid) + ', uid=' + str(new_uid))
+    return True
+
+
+def stop_post_processor():
+    '''Ask the post-processor child to exit, and wait for it.
+
+    Returns True if child exited successfully (or was never started),
+    False if not.
+    '''
+    if not post_processor_running():
+        return True
+    pid = app_state['post_processor_pid']
+    post_processor_send('exit', {}, [])
+    try:
+        os.close(app_state['post_processor_fd'])
+    except OSError:
+        sys.exc_info()
+    app_state['post_processor_fd'] = None
+    app_state['post_processor_pid'] = None
+    # The child replies with its timings, as JSON, before exiting.
+    reply = os.fdopen(app_state['post_processor_reply_fd'], 'rb')
+    app_state['post_processor_reply_fd'] = None
+    try:
+        merge_phase_times(json.loads(reply.read().decode('utf-8')))
+    except ValueError:
+        warning('No timings received from post-processor')
+        sys.exc_info()
+    reply.close()
+    try:
+        (_, status) = os.waitpid(pid, 0)
+    except OSError as e:
+        critical(e, 'Unable to wait for post-processor')
+        sys.exc_info()
+        return False
+    if (not os.WIFEXITED(status)) or (os.WEXITSTATUS(status) != 0):
+        error('Post-processor failed, status: ' + str(status))
+        return False
+    debug('Post-processor exited successfully')
+    return True
+
+
+def drop_privileges(new_uid, new_gid):
+    '''Permanently drop root privileges to new_uid/new_gid.
+
+    Returns True if successful, False if not.
+    '''
+    if is_none_or_nonint(new_uid) or is_none_or_nonint(new_gid):
+        error('Invalid UID/GID to drop privileges to')
+        return False
+    try:
+        os.setgroups([])
+        os.setgid(new_gid)
+        os.setuid(new_uid)
+    except OSError as e:
+        critical(e, 'Unable to drop privileges')
+        sys.exc_info()
+        return False
+    if (os.getuid() != new_uid) or (os.geteuid() != new_uid):
+        error('Privileges were not dropped, UID=' + str(os.getuid()))
+        return False
+    return True
+
+
+def write_all(fd, buf):
+    '''Write all of buf to file descriptor fd.'''
+    view = memoryview(buf)
+    while len(view) > 0:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def post_processor_send(op, fields, payloads):
+    '''Send one request to the post-processor child.
+
+    op -- name of operation, see privsep.py comments.
+    fields -- dict of op-specific arguments, must be JSON-serializable.
+    payloads -- list of byte strings sent after the request line.
+
+    Returns True if successful, False if not.
+    '''
+    fd = app_state['post_processor_fd']
+    if fd is None:
+        error('Post-processor is not running')
+        return False
+    header = dict(fields)
+    header['op'] = op
+    header['sizes'] = []
+    bufs = []
+    for p in payloads:
+        if p is None:
+            p = b''
+        if not isinstance(p, bytes):
+            p = p.encode('utf-8')
+        header['sizes'].append(len(p))
+        bufs.append(p)
+    POST_PROCESSOR_LOCK.acquire()
+    try:
+        write_all(fd, (json.dumps(header) + '\n').encode('utf-8'))
+        for b in bufs:
+            write_all(fd, b)
+    except OSError as e:
+        critical(e, 'Unable to send request to post-processor')
+        sys.exc_info()
+        return False
+    finally:
+        POST_PROCESSOR_LOCK.release()
+    return True
+
+
+def post_processor_loop(fd):
+    '''Main loop of the post-processor child, run after dropping privileges.
+
+    Returns 0 if all requests succeeded, 1 if any failed.
+    '''
+    status = 0
+    f = os.fdopen(fd, 'rb')
+    while True:
+        line = f.readline()
+        if not line:
+            debug('Post-processor: pipe closed')
+            break
+        header = json.loads(line.decode('utf-8'))
+        payloads = []
+        for size in header['sizes']:
+            payloads.append(f.read(size))
+        op = header['op']
+        if op == 'exit':
+            break
+        elif op == 'log':
+            write_stdio_file(payloads[0], header['path'])
+        elif op == 'write':
+            write_stdio_file(payloads[0], header['path'])
+            if header.get('hash') and not create_sidecar_hash_file(header['path']):
+                status = 1
+        elif op == 'finish_ptd':
+            if not finish_per_tool_directory(header['ptd'], header['toolns']):
+                status = 1
+        elif op == 'publish':
+            if not publish_staged_run(header['staged'], header['final']):
+                status = 1
+        else:
+            error('Post-processor: unknown op: ' + op)
+            status = 1
+    f.close()
+    return status
+
+
+def post_process_per_tool_directory(ptd, toolns):
+    '''Generate derived files for a PTD, after its tool has exited.
+
+    If the unprivileged post-processor is running, chown the files the
+    tool created, then ask the post-processor to do the rest. Otherwise,
+    do it in-process.
+
+    Returns True if successful, False if not.
+    '''
+    if not post_processor_running():
+        return finish_per_tool_directory(ptd, toolns)
+    start = monotonic_seconds()
+    status = chown_tool_artifacts(ptd)
+    add_phase_time('chown_tool_artifacts', start)
+    if not status:
+        error('Unable to chown files generated by: ' + toolns)
+        return False
+    return post_processor_send('finish_ptd', {'ptd': ptd, 'toolns': toolns}, [])
+
+
+# Functions generating files derived from a tool's output, run before
+# the PTD is hashed. Keyed by toolns, called as hook(ptd, toolns). They
+# run in the post-processor, if any, so untrusted tool output is not
+# parsed as root. A failing hook does not fail the PTD.
+POST_PROCESS_HOOKS = {
+    'acpidump': index_acpi_tables,
+    'acpixtract': index_acpi_tables,
+    'fwts_acpi_dump': index_acpi_tables,
+    'acpixtract_batch': index_acpixtract_batch,
+    'dmidecode_dump': index_smbios_inventory,
+}
+
+
+def finish_per_tool_directory(ptd, toolns):
+    '''Run post-process hook, then create sidecar hash files and manifest.
+
+    Returns True if successful, False if not.
+    '''
+    if toolns in POST_PROCESS_HOOKS:
+        start = monotonic_seconds()
+        if not POST_PROCESS_HOOKS[toolns](ptd, toolns):
+            warning('Post-process hook failed for: ' + toolns)
+        add_phase_time('post_process_hooks', start)
+    if app_state['hash_mode']:
+        start = monotonic_seconds()
+        status = create_sidecar_hash_files(ptd)
+        add_phase_time('hash', start)
+        if not status:
+            error('Unable to create side-car hash file(s) in PTD directory: ' + ptd)
+            return False
+    if app_state['manifest_mode']:
+        debug('***** MANIFEST MODE:.....')
+        start = monotonic_seconds()
+        status = create_manifest_file(ptd)
+        add_phase_time('manifest', start)
+        if not status:
+            error('Unable to create PTD manifest file in directory: ' + ptd)
+            return False
+    return True
+
+
+def chown_tool_artifacts(ptd):
+    '''Chown the files a root-run tool created in its PTD to the sudo user.
+
+    Returns True if successful, False if not.
+    '''
+    (_, new_uid, new_gid) = get_sudo_user_group_mode()
+    status = True
+    for root, dirs, files in os.walk(ptd):
+        for name in dirs + files:
+            if not set_owner(os.path.join(root, name), new_uid, new_gid):
+                status = False
+    return status
+
+#####################################################################
+
+# lock.py
+#
+# Concurrent fwaudit runs sharing a PD coordinate via a lock file in the
+# PD. Runs which only use 'shared' access tools (see TOOLS) take a shared
+# lock, and run in parallel with each other. Runs which use any
+# 'exclusive' access tool take an exclusive lock, so they never run at
+# the same time as any other run in that PD.
+
+RUN_LOCK_FILENAME = 'fwaudit.lock'
+
+
+def run_needs_exclusive_access():
+    '''Returns True if any tool in the meta_profile needs exclusive access.'''
+    for toolns in app_state['meta_profile']:
+        entry = get_tool_entry(toolns)
+        if (entry is None) or (entry.get('access') != 'shared'):
+            return True
+    return False
+
+
+def lock_file(path, exclusive):
+    '''Open and lock path, waiting for other holders if needed.
+
+    Returns the open file, which holds the lock until closed, or None if
+    locking failed. If locking is unsupported on this OS, returns None.
+    '''
+    if not FCNTL_AVAILABLE:
+        warning('File locking unavailable, not coordinating with other runs')
+        return None
+    if exclusive:
+        lock_op = fcntl.LOCK_EX
+    else:
+        lock_op = fcntl.LOCK_SH
+    try:
+        f = open(path, 'a')
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to open lock file: ' + path)
+        sys.exc_info()
+        return None
+    try:
+        fcntl.flock(f.fileno(), lock_op | fcntl.LOCK_NB)
+    except (IOError, OSError) as e:
+        if e.errno not in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK):
+            critical(e, 'Unable to lock file: ' + path)
+            sys.exc_info()
+            f.close()
+            return None
+        log('Waiting for other fwaudit run(s) to finish, lock: ' + path)
+        try:
+            fcntl.flock(f.fileno(), lock_op)
+        except (IOError, OSError) as e:
+            critical(e, 'Unable to lock file: ' + path)
+            sys.exc_info()
+            f.close()
+            return None
+    return f
+
+
+def acquire_run_lock(pd, exclusive):
+    '''Take the PD run lock, shared or exclusive, for the rest of this run.
+
+    Returns True if successful (or locking unsupported), False if not.
+    '''
+    path = os.path.join(pd, RUN_LOCK_FILENAME)
+    if exclusive:
+        debug('Taking exclusive run lock: ' + path)
+    else:
+        debug('Taking shared run lock: ' + path)
+    if not FCNTL_AVAILABLE:
+        warning('File locking unavailable, not coordinating with other runs')
+        return True
+    f = lock_file(path, exclusive)
+    if f is None:
+        return False
+    if app_state['sudo_based_usage']:
+        (_, new_uid, new_gid) = get_sudo_user_group_mode()
+        change_file_owner_group(path, new_uid, new_gid)
+    app_state['run_lock'] = f
+    return True
+
+
+def release_run_lock():
+    '''Release the PD run lock, if held.'''
+    f = app_state['run_lock']
+    if f is None:
+        return
+    app_state['run_lock'] = None
+    try:
+        f.close()
+    except (IOError, OSError):
+        sys.exc_info()
+
+#####################################################################
+
+# staging.py
+#
+# Optional staging of a run, via --staging_dir (eg, /dev/shm).
+#
+# Tools run, and hashes/manifests are generated, in a PRD under the
+# staging directory. Once the run is complete, the PRD is copied into the
+# PD under a hidden '.<name>.partial' name, then renamed to its final name,
+# so a PRD in the PD is never half-written. A crash leaves only the staged
+# copy (or a stale .partial), never an incomplete-but-complete-looking run.
+
+STAGING_SUBDIR = 'fwaudit.staging'
+STAGING_SPACE_MARGIN = 2  # require this many times the estimated run size
+
+
+def setup_staging_directory(pd, new_uid, new_gid):
+    '''Check the staging area, and create our subdirectory in it.
+
+    Staging is only used if the staging area has enough free space for
+    the run, estimated from the per-tool history in the PD.
+
+    Returns the directory to create the PRD in, or None if staging
+    can't be used.
+    '''
+    staging = app_state['staging_dir']
+    if not dir_exists(staging):
+        error('Staging directory does not exist: ' + staging)
+        return None
+    needed = estimate_run_bytes(load_tool_history(pd), app_state['meta_profile'])
+    needed = needed * STAGING_SPACE_MARGIN
+    available = free_disk_bytes(staging)
+    if available is None:
+        warning('Unable to determine free space of staging directory: ' + staging)
+        return None
+    debug('Staging: needed=' + str(needed) + ', available=' + str(available))
+    if available < needed:
+        warning('Insufficient space in staging directory: need ' + str(needed) +
+                ' bytes, have ' + str(available))
+        return None
+    sdir = os.path.join(staging, STAGING_SUBDIR)
+    try:
+        if not os.path.lexists(sdir):
+            # Root-run tools write fixed names in here, keep others out.
+            os.mkdir(sdir, 0o700)
+            os.chmod(sdir, 0o700)
+            change_file_owner_group(sdir, new_uid, new_gid)
+        st = os.lstat(sdir)
+    except OSError as e:
+        critical(e, 'Unable to create staging directory: ' + sdir)
+        sys.exc_info()
+        return None
+    # Shared areas like /dev/shm are world-writable, don't trust just any dir.
+    if not stat.S_ISDIR(st.st_mode):
+        error('Staging path is not a directory: ' + sdir)
+        return None
+    if (st.st_uid != os.getuid()) and (st.st_uid != new_uid):
+        error('Staging directory has unexpected owner: ' + sdir)
+        return None
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        error('Staging directory is group- or world-writable: ' + sdir)
+        return None
+    return sdir
+
+
+def free_disk_bytes(path):
+    '''Returns free bytes available to users on path's filesystem, or None.'''
+    try:
+        st = os.statvfs(path)
+    except (OSError, AttributeError):
+        sys.exc_info()
+        return None
+    return st.f_bavail * st.f_frsize
+
+
+def publish_staged_run(staged, final):
+    '''Publish a completed, staged PRD into the PD.
+
+    Copies staged to a hidden '.partial' directory next to final, then
+    atomically renames it to final, then removes the staged copy.
+
+    Returns True if successful, False if not.
+    '''
+    import shutil
+    if os.path.lexists(final):
+        error('Not overwriting existing per-run directory: ' + final)
+        return False
+    pd = os.path.dirname(final)
+    run_bytes = dir_size_bytes(staged)
+    available = free_disk_bytes(pd)
+    if (available is not None) and (available < run_bytes):
+        error('Insufficient space to publish run: need ' + str(run_bytes) +
+              ' bytes, have ' + str(available))
+        return False
+    partial = os.path.join(pd, '.' + os.path.basename(final) + '.partial')
+    try:
+        if os.path.lexists(partial):
+            warning('Removing stale partial run: ' + partial)
+            shutil.rmtree(partial)
+        shutil.copytree(staged, partial, symlinks=True)
+        os.rename(partial, final)
+    except (OSError, IOError) as e:
+        critical(e, 'Unable to publish staged run: ' + staged)
+        sys.exc_info()
+        return False
+    except shutil.Error as e:
+        error('Unable to publish staged run: ' + str(e))
+        sys.exc_info()
+        return False
+    try:
+        shutil.rmtree(staged)
+    except OSError:
+        warning('Unable to remove staged run: ' + staged)
+        sys.exc_info()
+    info('Published run to: ' + final)
+    return True
+
+
+def request_publish_staged_run():
+    '''If the run was staged, publish it, via the post-processor if running.
+
+    Returns True if successful (or nothing to do), False if not.
+    '''
+    final = app_state['published_prd']
+    if final is None:
+        return True
+    staged = app_state['per_run_directory']
+    if post_processor_running():
+        return post_processor_send('publish', {'staged': staged, 'final': final}, [])
+    return publish_staged_run(staged, final)
+
+
+def finish_publish_staged_run():
+    '''After publishing, point app_state at the published PRD.
+
+    Returns True if the run was published (or not staged), False if not.
+    '''
+    final = app_state['published_prd']
+    if final is None:
+        return True
+    if not dir_exists(final):
+        error('Run was not published, results left in: ' + app_state['per_run_directory'])
+        return False
+    app_state['per_run_directory'] = final
+    return True
+
+#####################################################################
+
+# cache.py
+#
+# --incremental reuses the output of a previous run of a 'cacheable' tool
+# (see TOOLS), rather than running it again, if nothing it depends on
+# changed. The cache key is the SHA256 of: the toolns, its command (TOOLS
+# desc and args), the SHA256 of each binary it runs (kept in the probe
+# cache, while the binary's mtime is unchanged), and the hardware/firmware
+# fingerprint, see fingerprint.py. For CHIPSEC, whose binary is python,
+# it also includes the SHA256 of the files of the chipsec package, so an
+# upgrade is noticed. Tools whose output depends on other devices (eg,
+# lsusb) also key on them, see TOOLS 'cache_inputs'.
+#
+# Entries are in the PD, as cache/<key>/: entry.json (status, verdicts,
+# findings and run of origin) and ptd/, hard links to the files the tool
+# created (before hashing and post-processing). Only PASSed runs are
+# stored. On a hit, the files are hard linked (or copied) into the new
+# PTD, the tool's status is CACHED, and post-processing runs as usual.
+# Entries unused for --cache_max_age days are removed at end of run, then
+# the least recently used ones, until all fit in --cache_max_size.
+
+CACHE_DIRNAME = 'cache'
+CACHE_ENTRY_FILENAME = 'entry.json'
+CACHE_FILES_DIRNAME = 'ptd'
+
+# Packages a Python module tool runs code from, besides the module itself.
+CACHE_MODULE_PACKAGES = {
+    'chipsec_main': ['chipsec'],
+    'chipsec_util': ['chipsec'],
+}
+
+# Prints the file of each module named in argv, or '' if not found,
+# without importing it.
+PYTHON_MODULE_LOCATE = '\n'.join([
+    'import sys',
+    'try:',
+    '    from importlib.util import find_spec',
+    '    def locate(name):',
+    '        spec = find_spec(name)',
+    '        return spec and spec.origin',
+    'except ImportError:',
+    '    from pkgutil import find_loader',
+    '    def locate(name):',
+    '        loader = find_loader(name)',
+    '        return loader and loader.get_filename()',
+    'for name in sys.argv[1:]:',
+    '    print(locate(name) or "")'])
+
+
+def get_binary_digest(name):
+    '''Returns SHA256 of executable name in PATH, or None if not found.
+
+    Digests are kept in the probe cache, until the binary's mtime changes.
+    '''
+    dirs = get_path_dirs()
+    if app_state['probe_cache'] is None:
+        app_state['probe_cache'] = load_probe_cache(dirs)
+    cache = app_state['probe_cache']
+    path = probe_binary(name, dirs, cache)
+    if path is None:
+        return None
+    entry = cache['binaries'][name]
+    if entry.get('sha256') is None:
+        entry['sha256'] = return_hash_str_of_file(path)
+        app_state['probe_cache_dirty'] = True
+    return entry['sha256']
+
+
+def get_module_digest(module):
+    '''Returns SHA256 of the files of a Python module, or None if not found.
+
+    The module is looked up by 'python' in PATH. For a package, all files
+    under its directory are included, except compiled ones.
+    '''
+    import hashlib
+    import subprocess
+    if module in app_state['module_digests']:
+        return app_state['module_digests'][module]
+    try:
+        out = subprocess.check_output(['python', '-c', PYTHON_MODULE_LOCATE, module])
+    except (OSError, subprocess.CalledProcessError) as e:
+        critical(e, 'Unable to locate Python module: ' + module)
+        sys.exc_info()
+        return None
+    path = out.decode('utf-8', 'replace').strip()
+    if is_none_or_null(path) or (not os.path.isfile(path)):
+        debug('Python module not found: ' + module)
+        return None
+    files = [path]
+    if os.path.basename(path).startswith('__init__.'):
+        files = []
+        top = os.path.dirname(path)
+        for root, dirs, names in os.walk(top):
+            dirs.sort()
+            if '__pycache__' in dirs:
+                dirs.remove('__pycache__')
+            for name in sorted(names):
+                if not (name.endswith('.pyc') or name.endswith('.pyo')):
+                    files.append(os.path.join(root, name))
+        top = os.path.dirname(top)
+    else:
+        top = os.path.dirname(path)
+    h = hashlib.sha256()
+    for f in files:
+        digest = return_hash_str_of_file(f)
+        if digest is None:
+            return None
+        h.update((os.path.relpath(f, top) + ' ' + digest + '\n').encode('utf-8'))
+    app_state['module_digests'][module] = h.hexdigest()
+    debug('Digest of Python module ' + module + ': ' + h.hexdigest())
+    return app_state['module_digests'][module]
+
+
+def get_cache_input(name):
+    '''Returns SHA256 of a TOOLS 'cache_inputs' input, or None if unknown.'''
+    if name == 'usb':
+        return get_usb_fingerprint(app_state['sysfs_root'])['sha256']
+    error('Unknown cache input: ' + name)
+    return None
+
+
+def get_cache_key(toolns):
+    '''Returns cache key of toolns for this run, or None if not cacheable.'''
+    import hashlib
+    entry = get_tool_entry(toolns)
+    if (not app_state['incremental']) or (not entry.get('cacheable', False)):
+        return None
+    if toolns in app_state['cache_keys']:
+        return app_state['cache_keys'][toolns]
+    (binaries, modules) = get_tool_requirements(toolns)
+    digests = {}
+    for name in binaries:
+        digests[name] = get_binary_digest(name)
+        if digests[name] is None:
+            return None
+    module_digests = {}
+    for module in modules:
+        for name in [module] + CACHE_MODULE_PACKAGES.get(module, []):
+            module_digests[name] = get_module_digest(name)
+            if module_digests[name] is None:
+                return None
+    others = {}
+    for name in entry.get('cache_inputs', []):
+        others[name] = get_cache_input(name)
+        if others[name] is None:
+            return None
+    inputs = {
+        'fwaudit': __version__,
+        'toolns': toolns,
+        'command': entry.get('desc'),
+        'args': entry.get('args'),
+        'binaries': digests,
+        'modules': module_digests,
+        'inputs': others,
+        'fingerprint': get_fingerprint()['sha256'],
+    }
+    buf = json.dumps(inputs, sort_keys=True, separators=(',', ':'))
+    key = hashlib.sha256(buf.encode('utf-8')).hexdigest()
+    app_state['cache_keys'][toolns] = key
+    debug('Cache key of ' + toolns + ': ' + key)
+    return key
+
+
+def link_tree(src, dst):
+    '''Hard link (or copy) all files under src into dst, creating subdirs.
+
+    Returns True if successful, False if not.
+    '''
+    import shutil
+    try:
+        for root, dirs, files in os.walk(src):
+            target = os.path.join(dst, os.path.relpath(root, src))
+            if not os.path.isdir(target):
+                os.makedirs(target)
+            for name in files:
+                if os.path.lexists(os.path.join(target, name)):
+                    continue  # eg, a linked input artifact
+                try:
+                    os.link(os.path.join(root, name), os.path.join(target, name))
+                except OSError:
+                    sys.exc_info()
+                    shutil.copy2(os.path.join(root, name), os.path.join(target, name))
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to link ' + src + ' to ' + dst)
+        sys.exc_info()
+        return False
+    return True
+
+
+def restore_cached_tool(pd, ptd, toolns):
+    '''If the output of toolns is cached, link it into ptd, instead of running it.
+
+    Adds the results record (status CACHED) of toolns.
+
+    Returns True if restored from the cache, False if toolns must be run.
+    '''
+    key = get_cache_key(toolns)
+    if key is None:
+        return False
+    entry_dir = os.path.join(pd, CACHE_DIRNAME, key)
+    try:
+        with open(os.path.join(entry_dir, CACHE_ENTRY_FILENAME), 'r') as f:
+            entry = json.load(f)
+    except (IOError, OSError, ValueError):
+        sys.exc_info()
+        debug('Cache miss: ' + toolns)
+        return False
+    if not link_tree(os.path.join(entry_dir, CACHE_FILES_DIRNAME), ptd):
+        warning('Unable to use cached output, running tool: ' + toolns)
+        return False
+    try:
+        os.utime(entry_dir, None)  # for least recently used eviction
+    except OSError:
+        sys.exc_info()
+    (tool, erc) = get_tool_info(toolns)
+    app_state['tool_parsed'][toolns] = {
+        'verdicts': entry.get('verdicts') or {},
+        'findings': entry.get('findings') or [],
+        'data': {},
+    }
+    record = add_results_record(tool, ptd, toolns, 0, erc, 'CACHED')
+    record['cached_from'] = entry.get('run_id')
+    info('Cache hit: ' + toolns + ', from run ' + str(entry.get('run_id')))
+    return True
+
+
+def store_cached_tool(pd, ptd, toolns):
+    '''Save the output of toolns in the cache, if it is cacheable and PASSed.
+
+    Returns True if stored, False if not.
+    '''
+    import shutil
+    key = get_cache_key(toolns)
+    if key is None:
+        return False
+    record = None
+    for r in reversed(app_state['results']):
+        if r['toolns'] == toolns:
+            record = r
+            break
+    if (record is None) or (record['status'] != 'PASS') or (record['rc'] != record['expected_rc']):
+        return False
+    cache_dir = os.path.join(pd, CACHE_DIRNAME)
+    entry_dir = os.path.join(cache_dir, key)
+    tmp_dir = entry_dir + '.tmp.' + str(os.getpid())
+    try:
+        if not os.path.isdir(cache_dir):
+            os.mkdir(cache_dir)
+            (new_dir_mode, new_uid, new_gid) = get_sudo_user_group_mode()
+            change_file_owner_group(cache_dir, new_uid, new_gid)
+        os.mkdir(tmp_dir)
+    except OSError as e:
+        critical(e, 'Unable to create cache entry: ' + tmp_dir)
+        sys.exc_info()
+        return False
+    entry = {
+        'toolns': toolns,
+        'run_id': app_state['run_id'],
+        'rc': record['rc'],
+        'verdicts': record['verdicts'],
+        'findings': record['findings'],
+        'fingerprint': app_state['fingerprint']['sha256'],
+    }
+    status = link_tree(ptd, os.path.join(tmp_dir, CACHE_FILES_DIRNAME))
+    if status:
+        status = save_json_file(os.path.join(tmp_dir, CACHE_ENTRY_FILENAME), entry)
+    if status:
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Eg, another run stored the same entry first.
+            sys.exc_info()
+            status = False
+    if not status:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+    if app_state['sudo_based_usage']:
+        chown_tool_artifacts(entry_dir)
+    debug('Cached output of ' + toolns + ': ' + entry_dir)
+    return True
+
+
+def evict_cache(pd):
+    '''Remove cache entries unused for --cache_max_age days, then the least
+    recently used ones, until the cache is no bigger than --cache_max_size.
+
+    Returns count of entries removed.
+    '''
+    import shutil
+    cache_dir = os.path.join(pd, CACHE_DIRNAME)
+    if not os.path.isdir(cache_dir):
+        return 0
+    oldest = time.time() - (app_state['cache_max_age'] * 24 * 60 * 60)
+    entries = []
+    removed = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            sys.exc_info()
+            continue
+        # Also removes stale partial entries (<key>.tmp.<pid>).
+        if mtime < oldest:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+            continue
+        if '.tmp.' not in name:
+            entries.append((mtime, path, dir_size_bytes(path)))
+    entries.sort()
+    total = 0
+    for (mtime, path, size) in entries:
+        total += size
+    for (mtime, path, size) in entries:
+        if total <= app_state['cache_max_bytes']:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    if removed > 0:
+        info('Removed ' + str(removed) + ' cache entries, ' + format_bytes(total) + ' left')
+    return removed
+
+
+#####################################################################
+
+# history.py
+#
+# Per-tool history, kept in the PD, across runs. One entry per toolns:
+#   bytes -- size of the PTD in the last run.
+#   max_bytes -- largest PTD size seen.
+#   seconds -- wall-clock time of the tool in the last run.
+#   max_rss -- peak memory (bytes) of the tool in the last run, if known.
+#   runs -- number of runs recorded.
+#   last_run -- name of PRD of the last run.
+
+HISTORY_FILENAME = 'fwaudit.history.json'
+HISTORY_DEFAULT_TOOL_BYTES = 16 * 1024 * 1024  # estimate for a never-run tool
+
+
+def load_tool_history(pd):
+    '''Load the per-tool history from the PD.
+
+    Returns a dict of {toolns: entry}, empty if no (valid) history.
+    '''
+    if is_none_or_null(pd):
+        return {}
+    path = os.path.join(pd, HISTORY_FILENAME)
+    if not path_exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            history = json.load(f)
+    except (IOError, OSError, ValueError):
+        warning('Ignoring unreadable history file: ' + path)
+        sys.exc_info()
+        return {}
+    if not isinstance(history, dict):
+        warning('Ignoring invalid history file: ' + path)
+        return {}
+    return history
+
+
+def save_tool_history(pd, history):
+    '''Atomically replace the per-tool history in the PD.
+
+    Returns True if successful, False if not.
+    '''
+    return save_json_file(os.path.join(pd, HISTORY_FILENAME), history)
+
+
+def save_json_file(path, data):
+    '''Atomically replace path with data, as JSON, owned by the sudo user.
+
+    Returns True if successful, False if not.
+    '''
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(data, indent=1, sort_keys=True,
+                               separators=(',', ': ')))
+        if app_state['sudo_based_usage']:
+            (_, new_uid, new_gid) = get_sudo_user_group_mode()
+            change_file_owner_group(tmp_path, new_uid, new_gid)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to save file: ' + path)
+        sys.exc_info()
+        return False
+    return True
+
+
+def dir_size_bytes(path):
+    '''Returns total size in bytes of all files under path.'''
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                sys.exc_info()
+    return total
+
+
+def estimate_run_bytes(history, toolns_list):
+    '''Estimate the disk space a run of toolns_list will use, from history.'''
+    total = 0
+    for toolns in toolns_list:
+        entry = history.get(toolns)
+        if (entry is None) or ('max_bytes' not in entry):
+            total += HISTORY_DEFAULT_TOOL_BYTES
+        else:
+            total += entry['max_bytes']
+    return total
+
+
+def record_run_history(pd, prd):
+    '''Update the per-tool history in the PD with the results of this run.
+
+    Returns True if successful, False if not.
+    '''
+    if is_none_or_null(pd) or is_none_or_null(prd):
+        error('PD or PRD unspecified, cannot record history')
+        return False
+    # Concurrent shared-lock runs may also be updating the history.
+    lock_path = os.path.join(pd, HISTORY_FILENAME + '.lock')
+    history_lock = lock_file(lock_path, True)
+    if (history_lock is not None) and app_state['sudo_based_usage']:
+        (_, new_uid, new_gid) = get_sudo_user_group_mode()
+        change_file_owner_group(lock_path, new_uid, new_gid)
+    history = load_tool_history(pd)
+    for toolns in app_state['tool_seconds']:
+        ptd = os.path.join(prd, toolns)
+        if not dir_exists(ptd):
+            continue
+        entry = history.get(toolns, {})
+        entry['bytes'] = dir_size_bytes(ptd)
+        entry['max_bytes'] = max(entry['bytes'], entry.get('max_bytes', 0))
+        entry['seconds'] = app_state['tool_seconds'][toolns]
+        if toolns in app_state['tool_rusage']:
+            entry['max_rss'] = app_state['tool_rusage'][toolns]['max_rss']
+        entry['runs'] = entry.get('runs', 0) + 1
+        entry['last_run'] = os.path.basename(prd)
+        history[toolns] = entry
+    status = save_tool_history(pd, history)
+    if history_lock is not None:
+        history_lock.close()
+    return status
+
+#####################################################################
+
+
+# parsers.py
+#
+# Streaming parsers for tool output. A parser sees each chunk of a tool's
+# stdout as read_pipe() reads it, splits it into lines, and keeps only
+# what it extracts, so there is no second read of the log file, and
+# output discarded past --output_limit is still parsed. OUTPUT_PARSERS
+# maps toolns (or TOOLS 'tool' names, for all of a tool's toolns) to
+# line parser functions, which take (state, line) and update
+# state['verdicts'] and state['findings'], or keep anything else they
+# extract in state['data']. The results are saved in
+# app_state['tool_parsed'][toolns]; verdicts and findings are added to
+# the tool's results record, data is for the tool's function to use.
+
+OUTPUT_PARSER_MAX_LINE = 64 * 1024
+OUTPUT_PARSER_MAX_FINDINGS = 100
+
+# chipsec_main prints verdicts as '[+] PASSED: ...', '[-] FAILED: ...',
+# etc., both per module and in the summary, where the message is the
+# module name.
+CHIPSEC_VERDICTS = {
+    'PASSED': 'PASSED',
+    'FAILED': 'FAILED',
+    'WARNING': 'WARNING',
+    'NOT APPLICABLE': 'NOT_APPLICABLE',
+    'NOT IMPLEMENTED': 'NOT_IMPLEMENTED',
+    'SKIPPED': 'NOT_APPLICABLE',
+    'INFORMATION': 'INFORMATION',
+    'ERROR': 'ERROR',
+}
+CHIPSEC_MODULE_PREFIX = 'chipsec.modules.'
+
+
+def parse_chipsec_main_line(state, line):
+    '''Extract module verdicts and findings from a chipsec_main output line.'''
+    if line.startswith('[*] running module: '):
+        state['module'] = line[len('[*] running module: '):].strip()
+        if state['module'].startswith(CHIPSEC_MODULE_PREFIX):
+            state['module'] = state['module'][len(CHIPSEC_MODULE_PREFIX):]
+        return
+    if line.startswith('[CHIPSEC]') and ('SUMMARY' in line):
+        state['module'] = None
+        state['in_summary'] = True
+        return
+    if (len(line) < 4) or (line[0] != '[') or (line[2] != ']'):
+        return
+    text = line[4:].strip()
+    for word in CHIPSEC_VERDICTS:
+        if text.startswith(word + ':'):
+            message = text[len(word) + 1:].strip()
+            verdict = CHIPSEC_VERDICTS[word]
+            if state['in_summary']:
+                # Summary lines name the module, and are authoritative.
+                module = message
+                if module.startswith(CHIPSEC_MODULE_PREFIX):
+                    module = module[len(CHIPSEC_MODULE_PREFIX):]
+                state['verdicts'][module] = verdict
+            elif state['module'] is not None:
+                state['verdicts'][state['module']] = verdict
+                add_parsed_finding(state, verdict + ': ' + message)
+            return
+    if state['in_summary'] or (state['module'] is None):
+        return
+    if line[1] in ('-', '!'):
+        add_parsed_finding(state, text)
+
+
+OUTPUT_PARSERS = {
+    'chipsec_main': parse_chipsec_main_line,
+    'lspci_xxx': parse_lspci_xxx_line,
+}
+
+
+def new_output_parser(toolns):
+    '''Returns parser state for toolns's stdout, or None if no parser.'''
+    entry = get_tool_entry(toolns)
+    if entry is None:
+        return None
+    key = toolns
+    if key not in OUTPUT_PARSERS:
+        key = entry['tool']
+    if key not in OUTPUT_PARSERS:
+        return None
+    return {
+        'parse_line': OUTPUT_PARSERS[key],
+        'partial': b'',  # start of incomplete last line
+        'skip_line': False,  # skipping rest of an over-long line
+        'module': None,
+        'in_summary': False,
+        'verdicts': {},
+        'findings': [],
+        'data': {},
+    }
+
+
+def add_parsed_finding(state, finding):
+    '''Add finding to state, up to OUTPUT_PARSER_MAX_FINDINGS.'''
+    if len(state['findings']) < OUTPUT_PARSER_MAX_FINDINGS:
+        state['findings'].append(finding)
+
+
+def feed_output_parser(state, chunk):
+    '''Pass each complete line in chunk to the parser.'''
+    lines = (state['partial'] + chunk).split(b'\n')
+    state['partial'] = lines.pop()
+    for line in lines:
+        if state['skip_line']:
+            state['skip_line'] = False
+            continue
+        state['parse_line'](state, line.rstrip(b'\r').decode('utf-8', 'replace'))
+    if len(state['partial']) > OUTPUT_PARSER_MAX_LINE:
+        state['partial'] = b''
+        state['skip_line'] = True
+
+
+def finish_output_parser(toolns, state):
+    '''Parse any unterminated last line, and save results for toolns.'''
+    if (state['partial'] != b'') and not state['skip_line']:
+        state['parse_line'](state, state['partial'].rstrip(b'\r').decode('utf-8', 'replace'))
+    state['partial'] = b''
+    app_state['tool_parsed'][toolns] = {
+        'verdicts': state['verdicts'],
+        'findings': state['findings'],
+        'data': state['data'],
+    }
+
+
+def get_verdict_status(verdicts):
+    '''Returns PASS, WARN, FAIL or N/A for dict of parsed verdicts, or None.
+
+    N/A if all verdicts are NOT_APPLICABLE.
+    '''
+    if not verdicts:
+        return None
+    status = 'PASS'
+    applicable = False
+    for module in verdicts:
+        if verdicts[module] != 'NOT_APPLICABLE':
+            applicable = True
+    if not applicable:
+        return 'N/A'
+    for module in verdicts:
+        if verdicts[module] in ('FAILED', 'ERROR'):
+            return 'FAIL'
+        if verdicts[module] == 'WARNING':
+            status = 'WARN'
+    return status
+
+#####################################################################
+
+
+# benchmark.py
+#
+# --benchmark runs the selected tools (by default, every tool in TOOLS)
+# end to end, against synthetic stand-ins for the real tool binaries, so
+# the cost of fwaudit itself can be measured on any Unix system, without
+# root or the real tools. The stand-ins are shell scripts generated into
+# a temporary bin dir, which is put first in PATH. A fake 'python' takes
+# the place of chipsec_main/chipsec_util (run as 'python -m <module>').
+#
+# Each stand-in writes 'stdout' bytes to stdout, creates 'files' files of
+# 'file_size' bytes (plus any missing *.bin/*.rom file named in its args,
+# eg rom.bin), sleeps 'seconds', and exits with 'rc'. The --benchmark
+# spec sets these, for all tools or per binary, eg:
+#     stdout=1M,files=8,file_size=4M,fwts.seconds=2,lspci.rc=1
+#
+# 'stress=<size>' (eg, stress=4G) first feeds that much output from one
+# stand-in through spawn_process(), and fails unless fwaudit's peak RSS
+# stays within --output_spill (for stdout and stderr) plus some slack.
+#
+# 'startup=<runs>' times that many runs of 'fwaudit --version' (and of
+# --list_tools, --list_profiles), and reports the median of each, to
+# track interpreter startup and import cost. 0 skips this.
+#
+# Results and timings go to --output_dir, if given, else to a temporary
+# directory which is deleted after the run.
+
+BENCHMARK_FILENAME = 'benchmark.json'
+BENCHMARK_DEFAULT_SPEC = 'stdout=64K,files=2,file_size=256K,seconds=0,rc=0,startup=5'
+BENCHMARK_SPEC_KEYS = ('stdout', 'files', 'file_size', 'seconds', 'rc', 'stress', 'startup')
+BENCHMARK_STARTUP_OPTIONS = ('--version', '--list_tools', '--list_profiles')
+BENCHMARK_STRESS_TOOL = 'fwaudit_stress'
+BENCHMARK_STRESS_SLACK_BYTES = 16 * 1024 * 1024
+
+
+def parse_size(s):
+    '''Returns byte count of s (eg, '512', '64K', '4M', '1G'), or None.'''
+    if is_none_or_null(s):
+        return None
+    multiplier = 1
+    suffix = s[-1].upper()
+    if suffix == 'K':
+        multiplier = 1024
+    elif suffix == 'M':
+        multiplier = 1024 * 1024
+    elif suffix == 'G':
+        multiplier = 1024 * 1024 * 1024
+    if multiplier != 1:
+        s = s[:-1]
+    try:
+        value = int(s)
+    except ValueError:
+        sys.exc_info()
+        return None
+    if value < 0:
+        return None
+    return value * multiplier
+
+
+def parse_benchmark_spec(spec):
+    '''Parse a --benchmark spec, of comma-separated [binary.]key=value.
+
+    Returns a tuple of (status, settings), where settings is a dict of
+    {binary: {key: value}}, with defaults for all binaries under '*'.
+    '''
+    settings = {'*': {}}
+    for item in (BENCHMARK_DEFAULT_SPEC + ',' + spec).split(','):
+        item = item.strip()
+        if item == '':
+            continue
+        if '=' not in item:
+            error('Invalid --benchmark setting, expected key=value: ' + item)
+            return (False, None)
+        (key, value) = item.split('=', 1)
+        binary = '*'
+        if '.' in key:
+            (binary, key) = key.rsplit('.', 1)
+        if key not in BENCHMARK_SPEC_KEYS:
+            error('Invalid --benchmark key: ' + key)
+            return (False, None)
+        if key == 'seconds':
+            try:
+                parsed = float(value)
+            except ValueError:
+                sys.exc_info()
+                parsed = -1.0
+            if parsed < 0.0:
+                parsed = None
+        elif key == 'rc':
+            try:
+                parsed = int(value)
+            except ValueError:
+                sys.exc_info()
+                parsed = -1
+            if (parsed < 0) or (parsed > 255):
+                parsed = None
+        else:
+            parsed = parse_size(value)
+        if parsed is None:
+            error('Invalid --benchmark value for ' + key + ': ' + value)
+            return (False, None)
+        if binary not in settings:
+            settings[binary] = {}
+        settings[binary][key] = parsed
+    return (True, settings)
+
+
+def get_benchmark_settings(settings, binary):
+    '''Returns dict of stand-in settings for binary, defaults overridden.'''
+    result = {}
+    for key in settings['*']:
+        result[key] = settings['*'][key]
+    if binary in settings:
+        for key in settings[binary]:
+            result[key] = settings[binary][key]
+    return result
+
+
+def get_benchmark_binaries():
+    '''Returns sorted list of the binaries needed by all TOOLS.'''
+    binaries = []
+    for t in TOOLS:
+        (tool_binaries, _) = get_tool_requirements(t['name'])
+        for binary in tool_binaries:
+            if binary not in binaries:
+                binaries.append(binary)
+    binaries.sort()
+    return binaries
+
+
+def create_benchmark_tool(bin_dir, binary, config):
+    '''Write an executable stand-in for binary into bin_dir.
+
+    Returns True if successful, False if not.
+    '''
+    lines = [
+        '#!/bin/sh',
+        '# fwaudit --benchmark stand-in for: ' + binary,
+        '# The module probe (python -c <probe> <module>) always succeeds.',
+        'if [ "$1" = "-c" ]; then',
+        '    exit 0',
+        'fi',
+        'echo "' + binary + ' $*" >&2',
+    ]
+    if config['seconds'] > 0.0:
+        lines.append('sleep ' + str(config['seconds']))
+    if binary == 'python':
+        # Enough chipsec_main output for parse_chipsec_main_line().
+        verdict = '[+] PASSED'
+        if config['rc'] != 0:
+            verdict = '[-] FAILED'
+        lines.extend([
+            'if [ "$3" = "chipsec_main" ]; then',
+            '    echo "[*] running module: chipsec.modules.$5"',
+            '    echo "' + verdict + ': benchmark stand-in"',
+            '    echo "[CHIPSEC] ***  SUMMARY  ***"',
+            '    echo "' + verdict + ': chipsec.modules.$5"',
+            'fi',
+        ])
+    if config['stdout'] > 0:
+        lines.append('head -c ' + str(config['stdout']) + " /dev/zero | tr '\\000' 'x'")
+    lines.extend([
+        'i=0',
+        'while [ $i -lt ' + str(config['files']) + ' ]; do',
+        '    head -c ' + str(config['file_size']) + ' /dev/zero > benchmark_$i.bin',
+        '    i=$((i + 1))',
+        'done',
+        '# Create any missing output file named in args, eg rom.bin, acpidump.out.',
+        'for arg in "$@"; do',
+        '    case "$arg" in',
+        '    *.bin|*.rom|*.out)',
+        '        [ -e "$arg" ] || head -c ' + str(config['file_size']) + ' /dev/zero > "$arg"',
+        '        ;;',
+        '    esac',
+        'done',
+        'exit ' + str(config['rc']),
+    ])
+    path = os.path.join(bin_dir, binary)
+    try:
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.chmod(path, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to create benchmark stand-in: ' + path)
+        sys.exc_info()
+        return False
+    return True
+
+
+def get_peak_rss():
+    '''Returns peak RSS of fwaudit itself, in bytes, or None if unknown.'''
+    try:
+        import resource
+    except ImportError:
+        sys.exc_info()
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux and FreeBSD report KiB, macOS reports bytes.
+    if os_is_macos():
+        return max_rss
+    return max_rss * 1024
+
+
+def run_benchmark():
+    '''Run the selected tools against synthetic stand-ins, for --benchmark.
+
+    Returns 0 if successful, 1 if not, as main()'s exit status.
+    '''
+    import shutil
+    import tempfile
+    if not os_is_unix():
+        error('--benchmark is only supported on Unix')
+        return 1
+    (status, settings) = parse_benchmark_spec(app_state['benchmark_spec'])
+    if not status:
+        return 1
+    if is_user_root() and (os.getenv('SUDO_UID') is not None):
+        app_state['sudo_based_usage'] = True
+    if (is_none_or_null(app_state['user_profiles']) and
+       is_none_or_null(app_state['user_tools'])):
+        tools = []
+        for t in TOOLS:
+            tools.append(t['name'])
+        app_state['user_tools'] = tools
+    try:
+        temp_dir = tempfile.mkdtemp(prefix='fwaudit.benchmark.')
+        bin_dir = os.path.join(temp_dir, 'bin')
+        os.mkdir(bin_dir)
+    except (IOError, OSError) as e:
+        critical(e, 'Unable to create benchmark directory')
+        sys.exc_info()
+        return 1
+    tool_status = 1
+    try:
+        for binary in get_benchmark_binaries():
+            if not create_benchmark_tool(bin_dir, binary, get_benchmark_settings(settings, binary)):
+                return 1
+        os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+        if not app_state['output_dir_specified']:
+            app_state['output_dir'] = os.path.join(temp_dir, 'output')
+        info('Benchmark stand-ins: ' + bin_dir)
+
+        startup = run_startup_benchmark(settings['*']['startup'])
+
+        stress = None
+        if 'stress' in settings['*']:
+            stress = run_stress_benchmark(temp_dir, bin_dir, settings['*']['stress'])
+            if not stress['passed']:
+                return 1
+
+        app_state['benchmark'] = {
+            'start': monotonic_seconds(),
+            'start_times': os.times(),
+            'startup': startup,
+            'stress': stress,
+            'report': None,
+        }
+        tool_status = run_audit()
+        # Unless no tools ran, run_audit() made the report, see finish_benchmark().
+        show_benchmark_report(get_benchmark_report())
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return tool_status
+
+
+def get_benchmark_report():
+    '''Returns the --benchmark report, made on first call, at end of run.'''
+    state = app_state['benchmark']
+    if state['report'] is not None:
+        return state['report']
+    wall_seconds = monotonic_seconds() - state['start']
+    start_times = state['start_times']
+    end_times = os.times()
+    hash_seconds = app_state['timings'].get('hash', 0.0)
+    report = {
+        'spec': (BENCHMARK_DEFAULT_SPEC + ',' + app_state['benchmark_spec']).strip(','),
+        'tool_count': len(app_state['tool_seconds']),
+        'wall_seconds': wall_seconds,
+        'cpu_seconds': (end_times[0] - start_times[0]) + (end_times[1] - start_times[1]),
+        'tool_cpu_seconds': (end_times[2] - start_times[2]) + (end_times[3] - start_times[3]),
+        'peak_rss': get_peak_rss(),
+        'hashed_bytes': app_state['hashed_bytes'],
+        'hash_seconds': hash_seconds,
+        'hashed_bytes_per_second': None,
+        'stress': state['stress'],
+        'startup': state['startup'],
+    }
+    if hash_seconds > 0.0:
+        report['hashed_bytes_per_second'] = app_state['hashed_bytes'] / hash_seconds
+    state['report'] = report
+    return report
+
+
+def finish_benchmark(prd):
+    '''Make the --benchmark report, and save it to the PRD, before it is published.
+
+    Returns True if successful (or not saved), False if not.
+    '''
+    report = get_benchmark_report()
+    if not app_state['output_dir_specified']:
+        return True
+    return save_benchmark_report(report, prd)
+
+
+def run_startup_benchmark(runs):
+    '''Time runs of fwaudit with each of BENCHMARK_STARTUP_OPTIONS.
+
+    Returns dict of {option: median seconds}, empty if runs is 0.
+    '''
+    import subprocess
+    result = {}
+    if runs < 1:
+        return result
+    script = os.path.abspath(__file__)
+    for option in BENCHMARK_STARTUP_OPTIONS:
+        samples = []
+        for _ in range(runs):
+            start = monotonic_seconds()
+            try:
+                with open(os.devnull, 'w') as devnull:
+                    subprocess.call([sys.executable, script, option],
+                                    stdout=devnull, stderr=devnull)
+            except OSError as e:
+                critical(e, 'Unable to run: ' + script)
+                sys.exc_info()
+                return result
+            samples.append(monotonic_seconds() - start)
+        samples.sort()
+        result[option] = samples[len(samples) // 2]
+        log('Startup: %-16s %.3fs (median of %d)' % (option, result[option], runs))
+    return result
+
+
+def run_stress_benchmark(temp_dir, bin_dir, size):
+    '''Feed size bytes of output through spawn_process(), checking peak RSS.
+
+    Returns a dict of stress results, with 'passed' False if the stand-in
+    failed, or fwaudit's peak RSS grew past the ceiling.
+    '''
+    ceiling = (2 * app_state['output_spill_bytes']) + BENCHMARK_STRESS_SLACK_BYTES
+    result = {
+        'output_bytes': size,
+        'rss_growth': None,
+        'rss_ceiling': ceiling,
+        'wall_seconds': None,
+        'passed': False,
+    }
+    config = {'stdout': size, 'files': 0, 'file_size': 0, 'seconds': 0.0, 'rc': 0}
+    if not create_benchmark_tool(bin_dir, BENCHMARK_STRESS_TOOL, config):
+        return result
+    ptd = os.path.join(temp_dir, 'stress')
+    try:
+        os.mkdir(ptd)
+    except OSError as e:
+        critical(e, 'Unable to create stress directory: ' + ptd)
+        sys.exc_info()
+        return result
+    log('Stress: feeding ' + format_bytes(size) + ' of output through spawn_process()..')
+    # Stress hashing is not part of the tool run's hash rate.
+    hashed_bytes = app_state['hashed_bytes']
+    rss_before = get_peak_rss()
+    start = monotonic_seconds()
+    rc = spawn_process([BENCHMARK_STRESS_TOOL], ptd, 0, BENCHMARK_STRESS_TOOL,
+                       show_stdio=False, log_stdio=True, hash_stdio=True)
+    (stdout_file, _) = get_stdio_log_paths(ptd, BENCHMARK_STRESS_TOOL)
+    if path_exists(stdout_file):
+        return_hash_str_of_file(stdout_file)
+    result['wall_seconds'] = monotonic_seconds() - start
+    rss_after = get_peak_rss()
+    app_state['hashed_bytes'] = hashed_bytes
+    if rc != 0:
+        error('Stress stand-in failed, rc=' + str(rc))
+        return result
+    if (rss_before is None) or (rss_after is None):
+        warning('Peak RSS unavailable, not checking memory ceiling')
+    else:
+        result['rss_growth'] = rss_after - rss_before
+        log('Stress: peak RSS grew ' + format_bytes(result['rss_growth']) +
+            ' (ceiling ' + format_bytes(ceiling) + ') in %.3fs' % result['wall_seconds'])
+        if result['rss_growth'] > ceiling:
+            error('Stress: peak RSS grew past the ceiling, output is not bounded')
+            return result
+    result['passed'] = True
+    return result
+
+
+def show_benchmark_report(report):
+    '''Show --benchmark results.'''
+    log('Benchmark: ' + str(report['tool_count']) + ' tool(s), spec: ' + report['spec'])
+    log('%-24s %.3fs' % ('wall time', report['wall_seconds']))
+    log('%-24s %.3fs' % ('fwaudit CPU', report['cpu_seconds']))
+    log('%-24s %.3fs' % ('tool CPU', report['tool_cpu_seconds']))
+    if report['peak_rss'] is not None:
+        log('%-24s %s' % ('fwaudit peak RSS', format_bytes(report['peak_rss'])))
+    rate = 'n/a'
+    if report['hashed_bytes_per_second'] is not None:
+        rate = format_bytes(report['hashed_bytes_per_second']) + '/s'
+    log('%-24s %s in %.3fs, %s' % ('hashed', format_bytes(report['hashed_bytes']),
+                                   report['hash_seconds'], rate))
+
+
+def save_benchmark_report(report, prd):
+    '''Save benchmark.json to the PRD, and chown it if sudo.'''
+    if is_none_or_null(prd) or not dir_exists(prd):
+        warning('No per-run directory, not saving ' + BENCHMARK_FILENAME)
+        return False
+    path = os.path.join(prd, BENCHMARK_FILENAME)
+    if not save_json_file(path, report):
+        return False
+    info('Saved benchmark results: ' + path)
+    return True
+
+#####################################################################
+
 
 # The initial main entry point, which calls main().
 if __name__ == '__main__':
     try:
-        sys.exit(main())
+        sys.exit(self_profile_main())
     except KeyboardInterrupt:
         sys.exc_info()
         print('[ERROR] Received KeyboardInterrupt exception in __main__!')